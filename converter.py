@@ -1,5 +1,8 @@
 """"""
 from copy import copy
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Iterable, List
 
 from vnpy.trader.engine import MainEngine
 from vnpy.trader.object import (
@@ -12,6 +15,22 @@ from vnpy.trader.object import (
 from vnpy.trader.constant import (Direction, Offset, Exchange)
 
 
+class ConvertPolicy(Enum):
+    SKIP = "不转换"
+    SHFE = "平今平昨"
+    NORMAL = "普通"
+
+
+@dataclass
+class SimulationStep:
+    """
+    Result of one simulated order request.
+    """
+    req: OrderRequest
+    child_reqs: List[OrderRequest]     # empty if convert failed, e.g. position not enough
+    frozen: Dict[str, int]              # frozen volumes of holding after child orders sent
+
+
 class OffsetConverter:
     """"""
 
@@ -19,6 +38,34 @@ class OffsetConverter:
         """"""
         self.main_engine = main_engine
         self.holdings = {}
+        self.policies = {}  # vt_symbol: ConvertPolicy
+
+    def update_contract(self, contract: ContractData):
+        """
+        Build convert policy of contract, call it when contract is pushed or refreshed.
+        """
+        # Only contracts with long-short position mode requires convert
+        if contract.net_position:
+            policy = ConvertPolicy.SKIP
+        elif contract.exchange in [Exchange.SHFE, Exchange.INE]:
+            policy = ConvertPolicy.SHFE
+        else:
+            policy = ConvertPolicy.NORMAL
+
+        self.policies[contract.vt_symbol] = policy
+        return policy
+
+    def get_convert_policy(self, vt_symbol: str):
+        """"""
+        policy = self.policies.get(vt_symbol, None)
+        if policy:
+            return policy
+
+        # Contract not received yet is not cached, so it's looked up again next time.
+        contract = self.main_engine.get_contract(vt_symbol)
+        if not contract:
+            return ConvertPolicy.SKIP
+        return self.update_contract(contract)
 
     def update_position(self, position: PositionData):
         """"""
@@ -52,6 +99,45 @@ class OffsetConverter:
         holding = self.get_position_holding(req.vt_symbol)
         holding.update_order_request(req, vt_orderid)
 
+    def load_positions(self, positions: List[PositionData], reset: bool = True):
+        """
+        Load positions of query snapshot in one pass, e.g. after reconnect.
+        If reset, position of holdings not in snapshot is cleared.
+        """
+        if reset:
+            for holding in self.holdings.values():
+                holding.clear_position()
+
+        for position in positions:
+            if not self.is_convert_required(position.vt_symbol):
+                continue
+
+            holding = self.get_position_holding(position.vt_symbol)
+            holding.update_position(position)
+
+        # Frozen of close orders depends on today position
+        for holding in self.holdings.values():
+            holding.calculate_frozen()
+
+    def load_orders(self, orders: List[OrderData], reset: bool = True):
+        """
+        Load active orders of query snapshot in one pass, frozen is calculated once per holding.
+        If reset, active orders not in snapshot are dropped.
+        """
+        if reset:
+            for holding in self.holdings.values():
+                holding.clear_orders()
+
+        for order in orders:
+            if not order.is_active() or not self.is_convert_required(order.vt_symbol):
+                continue
+
+            holding = self.get_position_holding(order.vt_symbol)
+            holding.load_order(order)
+
+        for holding in self.holdings.values():
+            holding.calculate_frozen()
+
     def get_position_holding(self, vt_symbol: str):
         """"""
         holding = self.holdings.get(vt_symbol, None)
@@ -63,36 +149,82 @@ class OffsetConverter:
 
     def convert_order_request(self, req: OrderRequest, lock: bool):
         """"""
-        if not self.is_convert_required(req.vt_symbol):
+        policy = self.get_convert_policy(req.vt_symbol)
+        if policy == ConvertPolicy.SKIP:
             return [req]
 
         holding = self.get_position_holding(req.vt_symbol)
 
         if lock:
             return holding.convert_order_request_lock(req)
-        elif req.exchange in [Exchange.SHFE, Exchange.INE]:
+        elif policy == ConvertPolicy.SHFE:
             return holding.convert_order_request_shfe(req)
         else:
             return [req]
 
+    def simulate_order_requests(self, reqs: List[OrderRequest], lock_symbols: Iterable[str] = ()):
+        """
+        Convert reqs one by one as if each child order is sent before next req,
+        without changing any holding. Return list of SimulationStep.
+
+        Holdings are copied on first touch of each symbol, so the cost is
+        proportional to symbols in reqs instead of all holdings.
+        """
+        lock_symbols = set(lock_symbols)
+        sim_holdings = {}   # vt_symbol: copied PositionHolding
+        steps = []
+
+        for i, req in enumerate(reqs):
+            vt_symbol = req.vt_symbol
+            policy = self.get_convert_policy(vt_symbol)
+            if policy == ConvertPolicy.SKIP:
+                steps.append(SimulationStep(req, [copy(req)], {}))
+                continue
+
+            holding = sim_holdings.get(vt_symbol, None)
+            if not holding:
+                holding = self.holdings.get(vt_symbol, None)
+                if holding:
+                    holding = holding.copy()
+                else:
+                    holding = PositionHolding(self.main_engine.get_contract(vt_symbol))
+                sim_holdings[vt_symbol] = holding
+
+            req = copy(req)
+            if vt_symbol in lock_symbols:
+                child_reqs = holding.convert_order_request_lock(req)
+            elif policy == ConvertPolicy.SHFE:
+                child_reqs = holding.convert_order_request_shfe(req)
+            else:
+                child_reqs = [req]
+
+            for j, child_req in enumerate(child_reqs):
+                holding.update_order_request(child_req, f"SIMULATION.{i}_{j}")
+
+            steps.append(SimulationStep(req, child_reqs, holding.get_frozen()))
+
+        return steps
+
     def is_convert_required(self, vt_symbol: str):
         """
         Check if the contract needs offset convert.
         """
-        contract = self.main_engine.get_contract(vt_symbol)
-
-        # Only contracts with long-short position mode requires convert
-        if not contract:
-            return False
-        elif contract.net_position:
-            return False
-        else:
-            return True
+        return self.get_convert_policy(vt_symbol) != ConvertPolicy.SKIP
 
 
 class PositionHolding:
     """"""
 
+    # No instance dict, holdings of thousands of contracts take much less memory.
+    __slots__ = (
+        "vt_symbol", "exchange",
+        "active_orders", "order_frozens", "close_frozens", "close_counts",
+        "long_pos", "long_yd", "long_td",
+        "short_pos", "short_yd", "short_td",
+        "long_pos_frozen", "long_yd_frozen", "long_td_frozen",
+        "short_pos_frozen", "short_yd_frozen", "short_td_frozen"
+    )
+
     def __init__(self, contract: ContractData):
         """"""
         self.vt_symbol = contract.vt_symbol
@@ -100,6 +232,15 @@ class PositionHolding:
 
         self.active_orders = {}
 
+        # Frozen volume of active close orders, kept incrementally
+        self.order_frozens = {}     # vt_orderid: ((direction, offset), frozen)
+        self.close_frozens = {
+            (direction, offset): 0
+            for direction in (Direction.LONG, Direction.SHORT)
+            for offset in (Offset.CLOSETODAY, Offset.CLOSEYESTERDAY, Offset.CLOSE)
+        }
+        self.close_counts = dict.fromkeys(self.close_frozens, 0)     # count of active orders
+
         self.long_pos = 0
         self.long_yd = 0
         self.long_td = 0
@@ -116,6 +257,54 @@ class PositionHolding:
         self.short_yd_frozen = 0
         self.short_td_frozen = 0
 
+    def copy(self):
+        """
+        Copy position, active orders and frozen sums for simulation.
+        Orders themselves are shared, they are never changed by holding.
+        """
+        holding = copy(self)
+        holding.active_orders = self.active_orders.copy()
+        holding.order_frozens = self.order_frozens.copy()
+        holding.close_frozens = self.close_frozens.copy()
+        holding.close_counts = self.close_counts.copy()
+        return holding
+
+    def get_frozen(self):
+        """"""
+        return {
+            "long_pos_frozen": self.long_pos_frozen,
+            "long_yd_frozen": self.long_yd_frozen,
+            "long_td_frozen": self.long_td_frozen,
+            "short_pos_frozen": self.short_pos_frozen,
+            "short_yd_frozen": self.short_yd_frozen,
+            "short_td_frozen": self.short_td_frozen
+        }
+
+    def clear_position(self):
+        """"""
+        self.long_pos = 0
+        self.long_yd = 0
+        self.long_td = 0
+
+        self.short_pos = 0
+        self.short_yd = 0
+        self.short_td = 0
+
+    def clear_orders(self):
+        """"""
+        self.active_orders.clear()
+        self.order_frozens.clear()
+        for key in self.close_frozens:
+            self.close_frozens[key] = 0
+            self.close_counts[key] = 0
+
+    def load_order(self, order: OrderData):
+        """
+        Add active order without recalculating frozen, call calculate_frozen() after all loaded.
+        """
+        self.active_orders[order.vt_orderid] = order
+        self.update_frozen(order)
+
     def update_position(self, position: PositionData):
         """"""
         if position.direction == Direction.LONG:
@@ -135,6 +324,7 @@ class PositionHolding:
             if order.vt_orderid in self.active_orders:
                 self.active_orders.pop(order.vt_orderid)
 
+        self.update_frozen(order)
         self.calculate_frozen()
 
     def update_order_request(self, req: OrderRequest, vt_orderid: str):
@@ -182,8 +372,103 @@ class PositionHolding:
         self.long_pos = self.long_td + self.long_yd
         self.short_pos = self.short_td + self.short_yd
 
+    def update_frozen(self, order: OrderData):
+        """
+        Apply change of remaining volume of one order to frozen sums.
+        """
+        old = self.order_frozens.pop(order.vt_orderid, None)
+        if old:
+            key, frozen = old
+            self.close_frozens[key] -= frozen
+            self.close_counts[key] -= 1
+
+        # Ignore position open orders
+        if not order.is_active() or order.offset == Offset.OPEN:
+            return
+
+        key = (order.direction, order.offset)
+        if key not in self.close_frozens:
+            return
+
+        frozen = order.volume - order.traded
+        self.close_frozens[key] += frozen
+        self.close_counts[key] += 1
+        self.order_frozens[order.vt_orderid] = (key, frozen)
+
     def calculate_frozen(self):
-        """"""
+        """
+        Calculate frozen position from frozen sums of close orders, same result as calculate_frozen_full.
+        """
+        self.short_td_frozen, self.short_yd_frozen = self.split_frozen(Direction.LONG, self.short_td)
+        self.long_td_frozen, self.long_yd_frozen = self.split_frozen(Direction.SHORT, self.long_td)
+
+        self.long_pos_frozen = self.long_td_frozen + self.long_yd_frozen
+        self.short_pos_frozen = self.short_td_frozen + self.short_yd_frozen
+
+    def split_frozen(self, direction: Direction, td: int):
+        """
+        Return (td_frozen, yd_frozen) of opposite position frozen by orders of direction.
+
+        Close order freezes today position first and clips it to td, the part exceeding td
+        is frozen in yesterday position. Close today orders are never clipped, so result
+        depends on sequence of orders only if both kinds exist and td is exceeded,
+        only then active orders are walked.
+        """
+        td_frozen = self.close_frozens[(direction, Offset.CLOSETODAY)]
+        yd_frozen = self.close_frozens[(direction, Offset.CLOSEYESTERDAY)]
+        if not self.close_counts[(direction, Offset.CLOSE)]:
+            return td_frozen, yd_frozen
+
+        total = td_frozen + self.close_frozens[(direction, Offset.CLOSE)]
+        if not td_frozen:
+            td_frozen = min(total, td)
+        elif total > td:
+            td_frozen = self.walk_td_frozen(direction, td)
+        else:
+            td_frozen = total
+
+        return td_frozen, yd_frozen + total - td_frozen
+
+    def walk_td_frozen(self, direction: Direction, td: int):
+        """
+        Today position frozen by close today and close orders of direction, in sequence of orders.
+        """
+        td_frozen = 0
+        for order in self.active_orders.values():
+            if order.direction != direction:
+                continue
+
+            if order.offset == Offset.CLOSETODAY:
+                td_frozen += order.volume - order.traded
+            elif order.offset == Offset.CLOSE:
+                td_frozen = min(td_frozen + order.volume - order.traded, td)
+        return td_frozen
+
+    def check_frozen(self):
+        """
+        Self-check incremental frozen against full calculation of active orders.
+        Return dict of mismatched fields: {name: (incremental, full)}.
+        """
+        names = [
+            "long_pos_frozen", "long_yd_frozen", "long_td_frozen",
+            "short_pos_frozen", "short_yd_frozen", "short_td_frozen"
+        ]
+        self.calculate_frozen()
+        incremental = {name: getattr(self, name) for name in names}
+
+        self.calculate_frozen_full()
+        full = {name: getattr(self, name) for name in names}
+
+        self.calculate_frozen()
+        return {
+            name: (incremental[name], full[name])
+            for name in names if incremental[name] != full[name]
+        }
+
+    def calculate_frozen_full(self):
+        """
+        Calculate frozen position by walking all active orders, used as reference.
+        """
         self.long_pos_frozen = 0
         self.long_yd_frozen = 0
         self.long_td_frozen = 0
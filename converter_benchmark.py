@@ -0,0 +1,146 @@
+"""
+Micro-benchmark of frozen position calculation in PositionHolding.
+
+Compare incremental calculate_frozen with full scan of active orders
+(calculate_frozen_full) in a sweep of order updates, and self-check results.
+
+python converter_benchmark.py [active order count] [update count]
+"""
+import sys
+import random
+from copy import copy
+from time import perf_counter
+
+from vnpy.trader.object import ContractData, OrderData, PositionData
+from vnpy.trader.constant import Direction, Offset, Exchange, Product, Status
+
+from converter import PositionHolding
+
+
+class FullScanHolding(PositionHolding):
+    """
+    Holding recalculating frozen by walking all active orders on every update.
+    """
+
+    def calculate_frozen(self):
+        """"""
+        self.calculate_frozen_full()
+
+
+def create_holding(full: bool = False, volume: int = 1_000_000, yd_volume: int = 500_000):
+    """"""
+    contract = ContractData(
+        gateway_name="BENCH",
+        symbol="rb2010",
+        exchange=Exchange.SHFE,
+        name="rb2010",
+        product=Product.FUTURES,
+        size=10,
+        pricetick=1
+    )
+    holding_class = FullScanHolding if full else PositionHolding
+    holding = holding_class(contract)
+
+    for direction in (Direction.LONG, Direction.SHORT):
+        position = PositionData(
+            gateway_name="BENCH",
+            symbol="rb2010",
+            exchange=Exchange.SHFE,
+            direction=direction,
+            volume=volume,
+            yd_volume=yd_volume
+        )
+        holding.update_position(position)
+    return holding
+
+
+def create_orders(count: int):
+    """"""
+    offsets = [Offset.OPEN, Offset.CLOSETODAY, Offset.CLOSEYESTERDAY, Offset.CLOSE]
+    orders = []
+    for i in range(count):
+        order = OrderData(
+            gateway_name="BENCH",
+            symbol="rb2010",
+            exchange=Exchange.SHFE,
+            orderid=str(i),
+            direction=random.choice([Direction.LONG, Direction.SHORT]),
+            offset=random.choice(offsets),
+            price=3500,
+            volume=random.randint(1, 10),
+            status=Status.NOTTRADED
+        )
+        orders.append(order)
+    return orders
+
+
+def create_updates(orders: list, count: int):
+    """
+    Random partial fill, fill and cancel of active orders.
+    """
+    updates = []
+    for i in range(count):
+        order = random.choice(orders)
+        update = copy(order)
+        update.traded = random.randint(0, order.volume)
+        if update.traded == order.volume:
+            update.status = Status.ALLTRADED
+        elif random.random() < 0.1:
+            update.status = Status.CANCELLED
+        else:
+            update.status = Status.PARTTRADED
+        updates.append(update)
+    return updates
+
+
+def run(holding: PositionHolding, orders: list, updates: list):
+    """"""
+    for order in orders:
+        holding.update_order(order)
+
+    start = perf_counter()
+    for order in updates:
+        holding.update_order(order)
+    return perf_counter() - start
+
+
+def main():
+    """"""
+    order_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    update_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    random.seed(0)
+    orders = create_orders(order_count)
+    updates = create_updates(orders, update_count)
+
+    full_holding = create_holding(full=True)
+    full_cost = run(full_holding, orders, updates)
+
+    holding = create_holding()
+    cost = run(holding, orders, updates)
+
+    print(f"active orders: {order_count}, updates: {update_count}")
+    print(f"full scan:   {full_cost:.4f}s, {full_cost / update_count * 1e6:.2f}us per update")
+    print(f"incremental: {cost:.4f}s, {cost / update_count * 1e6:.2f}us per update")
+    print(f"speedup: {full_cost / cost:.1f}x")
+
+    # Small position makes close orders exceed today position, so sequence of orders matters.
+    for volume, yd_volume in ((1_000_000, 500_000), (2000, 1000), (100, 50)):
+        mismatched = check(orders, updates, volume, yd_volume)
+        print(f"self-check position {volume}/{yd_volume}: {'OK' if not mismatched else mismatched}")
+
+
+def check(orders: list, updates: list, volume: int, yd_volume: int):
+    """
+    Check incremental frozen against full scan after every update, with all offsets.
+    """
+    holding = create_holding(volume=volume, yd_volume=yd_volume)
+    for order in orders + updates:
+        holding.update_order(order)
+        mismatched = holding.check_frozen()
+        if mismatched:
+            return mismatched
+
+
+if __name__ == "__main__":
+    main()
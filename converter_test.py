@@ -0,0 +1,233 @@
+"""
+Unit tests of offset converter.
+
+python -m unittest converter_test
+"""
+import random
+import unittest
+
+from vnpy.trader.object import ContractData, OrderData, OrderRequest, PositionData
+from vnpy.trader.constant import Direction, Offset, Exchange, OrderType, Product, Status
+
+from converter import OffsetConverter, PositionHolding
+
+
+def create_contract(symbol: str = "rb2010", exchange: Exchange = Exchange.SHFE):
+    """"""
+    return ContractData(
+        gateway_name="TEST",
+        symbol=symbol,
+        exchange=exchange,
+        name=symbol,
+        product=Product.FUTURES,
+        size=10,
+        pricetick=1
+    )
+
+
+def create_position(
+    direction: Direction,
+    volume: int,
+    yd_volume: int,
+    symbol: str = "rb2010",
+    exchange: Exchange = Exchange.SHFE
+):
+    """"""
+    return PositionData(
+        gateway_name="TEST",
+        symbol=symbol,
+        exchange=exchange,
+        direction=direction,
+        volume=volume,
+        yd_volume=yd_volume
+    )
+
+
+def create_req(
+    direction: Direction,
+    offset: Offset,
+    volume: int,
+    symbol: str = "rb2010",
+    exchange: Exchange = Exchange.SHFE
+):
+    """"""
+    return OrderRequest(
+        symbol=symbol,
+        exchange=exchange,
+        direction=direction,
+        type=OrderType.LIMIT,
+        volume=volume,
+        price=3500,
+        offset=offset
+    )
+
+
+class FakeMainEngine:
+    """"""
+
+    def __init__(self):
+        """"""
+        self.contracts = {}
+
+    def get_contract(self, vt_symbol: str):
+        """"""
+        return self.contracts.get(vt_symbol, None)
+
+
+class TestFrozen(unittest.TestCase):
+
+    def setUp(self):
+        """"""
+        self.random = random.Random(20200601)
+        self.order_count = 0
+
+    def create_order(self, offsets: list):
+        """"""
+        self.order_count += 1
+        return OrderData(
+            gateway_name="TEST",
+            symbol="rb2010",
+            exchange=Exchange.SHFE,
+            orderid=str(self.order_count),
+            direction=self.random.choice([Direction.LONG, Direction.SHORT]),
+            offset=self.random.choice(offsets),
+            price=3500,
+            volume=self.random.randint(1, 30),
+            status=Status.NOTTRADED
+        )
+
+    def update_random_order(self, holding: PositionHolding, orders: list):
+        """
+        Fill or cancel part of an active order.
+        """
+        order = self.random.choice(orders)
+        if self.random.random() < 0.3:
+            order.status = Status.CANCELLED
+        else:
+            order.traded = min(order.volume, order.traded + self.random.randint(1, 10))
+            order.status = Status.ALLTRADED if order.traded == order.volume else Status.PARTTRADED
+        holding.update_order(order)
+
+        if not order.is_active():
+            orders.remove(order)
+
+    def check_random_orders(self, offsets: list, td: int, yd: int):
+        """"""
+        holding = PositionHolding(create_contract())
+        for direction in (Direction.LONG, Direction.SHORT):
+            holding.update_position(create_position(direction, td + yd, yd))
+
+        orders = []
+        for _ in range(300):
+            if orders and self.random.random() < 0.4:
+                self.update_random_order(holding, orders)
+            else:
+                order = self.create_order(offsets)
+                orders.append(order)
+                holding.update_order(order)
+
+            self.assertEqual(holding.check_frozen(), {})
+
+    def test_all_offsets(self):
+        offsets = [Offset.OPEN, Offset.CLOSETODAY, Offset.CLOSEYESTERDAY, Offset.CLOSE]
+        for td, yd in [(0, 0), (5, 5), (20, 100), (100, 20), (1000, 1000)]:
+            self.check_random_orders(offsets, td, yd)
+
+    def test_close_and_close_today(self):
+        offsets = [Offset.CLOSETODAY, Offset.CLOSE]
+        for td, yd in [(0, 10), (10, 10), (50, 0), (200, 200)]:
+            self.check_random_orders(offsets, td, yd)
+
+    def test_load_orders(self):
+        holding = PositionHolding(create_contract())
+        holding.update_position(create_position(Direction.LONG, 30, 10))
+
+        offsets = [Offset.CLOSETODAY, Offset.CLOSE, Offset.CLOSEYESTERDAY]
+        for _ in range(50):
+            holding.load_order(self.create_order(offsets))
+        holding.calculate_frozen()
+        self.assertEqual(holding.check_frozen(), {})
+
+        holding.clear_orders()
+        holding.calculate_frozen()
+        self.assertEqual(holding.long_pos_frozen, 0)
+        self.assertEqual(holding.short_pos_frozen, 0)
+
+
+class TestSimulation(unittest.TestCase):
+
+    def setUp(self):
+        """"""
+        self.main_engine = FakeMainEngine()
+        for symbol, exchange in [("rb2010", Exchange.SHFE), ("IF2006", Exchange.CFFEX), ("sc2010", Exchange.INE)]:
+            contract = create_contract(symbol, exchange)
+            self.main_engine.contracts[contract.vt_symbol] = contract
+        self.main_engine.contracts["sc2010.INE"].net_position = True
+
+        self.converter = self.create_converter()
+
+    def create_converter(self):
+        """"""
+        converter = OffsetConverter(self.main_engine)
+        converter.load_positions([
+            create_position(Direction.LONG, 8, 5),
+            create_position(Direction.SHORT, 4, 4),
+            create_position(Direction.LONG, 3, 1, "IF2006", Exchange.CFFEX)
+        ])
+        return converter
+
+    @staticmethod
+    def get_child_reqs(reqs: list):
+        """"""
+        return [(req.vt_symbol, req.direction, req.offset, req.volume) for req in reqs]
+
+    def test_match_sending_in_sequence(self):
+        reqs = [
+            create_req(Direction.SHORT, Offset.CLOSE, 2),
+            create_req(Direction.SHORT, Offset.CLOSE, 4),
+            create_req(Direction.SHORT, Offset.CLOSE, 3),
+            create_req(Direction.LONG, Offset.CLOSE, 3),
+            create_req(Direction.LONG, Offset.OPEN, 1),
+            create_req(Direction.SHORT, Offset.CLOSE, 2, "IF2006", Exchange.CFFEX),
+            create_req(Direction.SHORT, Offset.CLOSE, 1, "IF2006", Exchange.CFFEX),
+            create_req(Direction.LONG, Offset.OPEN, 1, "sc2010", Exchange.INE)
+        ]
+        lock_symbols = ["IF2006.CFFEX"]
+        steps = self.converter.simulate_order_requests(reqs, lock_symbols)
+
+        # Convert and freeze every child order as if sent one by one
+        converter = self.create_converter()
+        for i, (req, step) in enumerate(zip(reqs, steps)):
+            child_reqs = converter.convert_order_request(req, req.vt_symbol in lock_symbols)
+            self.assertEqual(self.get_child_reqs(step.child_reqs), self.get_child_reqs(child_reqs))
+
+            for j, child_req in enumerate(child_reqs):
+                converter.update_order_request(child_req, f"TEST.{i}_{j}")
+            if step.frozen:
+                self.assertEqual(step.frozen, converter.get_position_holding(req.vt_symbol).get_frozen())
+
+        self.assertEqual(
+            self.get_child_reqs(steps[1].child_reqs),
+            [
+                ("rb2010.SHFE", Direction.SHORT, Offset.CLOSETODAY, 1),
+                ("rb2010.SHFE", Direction.SHORT, Offset.CLOSEYESTERDAY, 3)
+            ]
+        )
+        # Position not enough after previous orders
+        self.assertEqual(steps[2].child_reqs, [])
+        self.assertEqual(steps[7].frozen, {})
+
+    def test_state_unchanged(self):
+        holding = self.converter.get_position_holding("rb2010.SHFE")
+        before = (holding.get_frozen(), dict(holding.active_orders), dict(holding.close_frozens))
+
+        reqs = [create_req(Direction.SHORT, Offset.CLOSE, 5), create_req(Direction.LONG, Offset.CLOSE, 1, "ag2012")]
+        self.converter.simulate_order_requests(reqs)
+
+        self.assertEqual((holding.get_frozen(), holding.active_orders, holding.close_frozens), before)
+        self.assertEqual(set(self.converter.holdings), {"rb2010.SHFE", "IF2006.CFFEX"})
+        self.assertEqual(reqs[0].offset, Offset.CLOSE)
+
+
+if __name__ == "__main__":
+    unittest.main()
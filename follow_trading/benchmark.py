@@ -0,0 +1,506 @@
+"""
+Latency benchmark of follow trading pipeline.
+
+Source trades (synthetic, or replayed from trade files of FollowEngine or a trade csv)
+are pushed to FollowEngine event handlers with an in-process main engine and fake
+target gateway, which fills every order at once. Report latency from source trade
+to first target order, throughput and memory allocated per trade.
+
+python -m follow_trading.benchmark [-n 10000] [--symbols 10] [--trade-date 20200601] [--trade-file trades.csv]
+"""
+import argparse
+import os
+import random
+import shutil
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+
+import pandas as pd
+
+from vnpy.event import Event
+from vnpy.trader.utility import get_file_path, get_folder_path
+from vnpy.trader.constant import Direction, Offset, Exchange, Product, Status
+from vnpy.trader.event import EVENT_TICK, EVENT_ORDER, EVENT_TRADE, EVENT_TIMER
+from vnpy.trader.object import (
+    ContractData,
+    OrderRequest,
+    CancelRequest,
+    SubscribeRequest,
+    TickData,
+    TradeData
+)
+
+from .engine import FollowEngine
+from .sink import TradeSink, TradeRole, read_trades
+
+
+BENCH_TRADE_FOLDER = "follow_benchmark_trade"
+SOURCE_GATEWAY_NAME = "BENCH_SOURCE"
+TARGET_GATEWAY_NAME = "BENCH_TARGET"
+
+
+class BenchEventEngine:
+    """
+    Event engine without thread, events put by follow engine (logs and pos snapshot) are counted only.
+    """
+
+    def __init__(self):
+        """"""
+        self.count = 0
+
+    def register(self, type: str, handler):
+        """"""
+        pass
+
+    def unregister(self, type: str, handler):
+        """"""
+        pass
+
+    def put(self, event: Event):
+        """"""
+        self.count += 1
+
+
+class BenchGateway:
+    """
+    Fake target gateway, every order is filled at once.
+    Order and trade pushes are kept in events and fed to follow engine by benchmark.
+    """
+
+    def __init__(self):
+        """"""
+        self.gateway_name = TARGET_GATEWAY_NAME
+        self.orderid = 0
+        self.tradeid = 0
+        self.orders = {}
+        self.events = []
+
+        self.first_send_time = 0
+
+    def send_order(self, req: OrderRequest):
+        """"""
+        if not self.first_send_time:
+            self.first_send_time = perf_counter()
+
+        self.orderid += 1
+        order = req.create_order_data(str(self.orderid), self.gateway_name)
+        order.status = Status.NOTTRADED
+        self.orders[order.vt_orderid] = order
+        self.events.append(Event(EVENT_ORDER, order))
+
+        filled = req.create_order_data(str(self.orderid), self.gateway_name)
+        filled.traded = filled.volume
+        filled.status = Status.ALLTRADED
+        self.orders[order.vt_orderid] = filled
+        self.events.append(Event(EVENT_ORDER, filled))
+
+        self.tradeid += 1
+        trade = TradeData(
+            gateway_name=self.gateway_name,
+            symbol=req.symbol,
+            exchange=req.exchange,
+            orderid=order.orderid,
+            tradeid=str(self.tradeid),
+            direction=req.direction,
+            offset=req.offset,
+            price=req.price,
+            volume=req.volume,
+            time=datetime.now().strftime("%H:%M:%S")
+        )
+        self.events.append(Event(EVENT_TRADE, trade))
+        return order.vt_orderid
+
+    def send_orders(self, reqs: list):
+        """"""
+        return [self.send_order(req) for req in reqs]
+
+    def cancel_order(self, req: CancelRequest):
+        """"""
+        pass
+
+
+class BenchMainEngine:
+    """
+    In-process stand-in of MainEngine used by FollowEngine.
+    """
+
+    def __init__(self, contracts: list):
+        """"""
+        self.contracts = {contract.vt_symbol: contract for contract in contracts}
+        self.gateway = BenchGateway()
+
+    def get_contract(self, vt_symbol: str):
+        """"""
+        return self.contracts.get(vt_symbol, None)
+
+    def get_all_contracts(self):
+        """"""
+        return list(self.contracts.values())
+
+    def get_gateway(self, gateway_name: str):
+        """"""
+        if gateway_name == TARGET_GATEWAY_NAME:
+            return self.gateway
+
+    def get_all_trades(self):
+        """"""
+        return []
+
+    def get_all_accounts(self):
+        """"""
+        return []
+
+    def get_all_positions(self):
+        """"""
+        return []
+
+    def get_order(self, vt_orderid: str):
+        """"""
+        return self.gateway.orders.get(vt_orderid, None)
+
+    def get_all_active_orders(self, vt_symbol: str = ""):
+        """"""
+        return []
+
+    def subscribe(self, req: SubscribeRequest, gateway_name: str):
+        """"""
+        pass
+
+    def send_order(self, req: OrderRequest, gateway_name: str):
+        """"""
+        return self.gateway.send_order(req)
+
+    def cancel_order(self, req: CancelRequest, gateway_name: str):
+        """"""
+        self.gateway.cancel_order(req)
+
+
+class BenchFollowEngine(FollowEngine):
+    """
+    Follow engine using its own setting and data files.
+    """
+    setting_filename = "follow_benchmark_setting.json"
+    data_filename = "follow_benchmark_data.json"
+    tradeids_filename = "follow_benchmark_tradeids.json"
+
+
+def remove_bench_files():
+    """"""
+    for filename in [
+        BenchFollowEngine.setting_filename,
+        BenchFollowEngine.data_filename,
+        BenchFollowEngine.tradeids_filename
+    ]:
+        path = get_file_path(filename)
+        for p in [path, path.with_suffix(".journal"), path.with_suffix(".tmp")]:
+            if p.exists():
+                os.remove(p)
+
+    shutil.rmtree(get_folder_path(BENCH_TRADE_FOLDER), ignore_errors=True)
+
+
+def create_contract(symbol: str, exchange: Exchange):
+    """"""
+    return ContractData(
+        gateway_name=SOURCE_GATEWAY_NAME,
+        symbol=symbol,
+        exchange=exchange,
+        name=symbol,
+        product=Product.FUTURES,
+        size=10,
+        pricetick=1
+    )
+
+
+def create_tick(contract: ContractData, price: float):
+    """"""
+    return TickData(
+        gateway_name=SOURCE_GATEWAY_NAME,
+        symbol=contract.symbol,
+        exchange=contract.exchange,
+        datetime=datetime.now(),
+        last_price=price,
+        limit_up=price * 1.1,
+        limit_down=price * 0.9,
+        bid_price_1=price - 1,
+        ask_price_1=price + 1,
+        bid_volume_1=10,
+        ask_volume_1=10
+    )
+
+
+def create_synthetic_trades(count: int, symbol_count: int):
+    """
+    Open and close long position of random symbols in turn, so close orders always have position.
+    Return (contracts, trades), time of trade is set when it's pushed.
+    """
+    contracts = [create_contract(f"rb{2001 + i}", Exchange.SHFE) for i in range(symbol_count)]
+
+    trades = []
+    pos = {contract.vt_symbol: 0 for contract in contracts}
+    for i in range(count):
+        contract = random.choice(contracts)
+        if pos[contract.vt_symbol]:
+            direction, offset = Direction.SHORT, Offset.CLOSE
+            volume = pos[contract.vt_symbol]
+            pos[contract.vt_symbol] = 0
+        else:
+            direction, offset = Direction.LONG, Offset.OPEN
+            volume = random.randint(1, 5)
+            pos[contract.vt_symbol] = volume
+
+        trade = TradeData(
+            gateway_name=SOURCE_GATEWAY_NAME,
+            symbol=contract.symbol,
+            exchange=contract.exchange,
+            orderid=str(i),
+            tradeid=str(i),
+            direction=direction,
+            offset=offset,
+            price=3500,
+            volume=volume,
+            time=""
+        )
+        trades.append(trade)
+    return contracts, trades
+
+
+def load_recorded_trades(trade_file: str = "", gateway_name: str = "", trade_date: str = ""):
+    """
+    Load source trades from trade csv (columns of TradeData), or from trade files of trade_date
+    written by FollowEngine. Return (contracts, trades), trades of other gateway are skipped
+    if gateway_name given.
+    """
+    if trade_file:
+        df = pd.read_csv(trade_file, dtype={"symbol": str, "orderid": str, "tradeid": str})
+    else:
+        data = read_trades(trade_date, trade_date)
+        # pyarrow table, or list of dict if pyarrow not installed
+        df = data.to_pandas() if hasattr(data, "to_pandas") else pd.DataFrame(data)
+        if not df.empty:
+            df = df[df["role"] == TradeRole.SOURCE.value]
+
+    if gateway_name and not df.empty:
+        df = df[df["gateway_name"] == gateway_name]
+
+    contracts = {}
+    trades = []
+    for i, row in enumerate(df.itertuples()):
+        exchange = Exchange(row.exchange)
+        contract = contracts.get((row.symbol, exchange), None)
+        if not contract:
+            contract = create_contract(row.symbol, exchange)
+            contracts[(row.symbol, exchange)] = contract
+
+        trade = TradeData(
+            gateway_name=SOURCE_GATEWAY_NAME,
+            symbol=row.symbol,
+            exchange=exchange,
+            orderid=str(row.orderid),
+            tradeid=f"{i}_{row.tradeid}",
+            direction=Direction(row.direction),
+            offset=Offset(row.offset),
+            price=float(row.price),
+            volume=float(row.volume),
+            time=""
+        )
+        trades.append(trade)
+    return list(contracts.values()), trades
+
+
+class FollowBenchmark:
+    """"""
+
+    def __init__(
+        self,
+        contracts: list,
+        tick_interval: int = 5,
+        timer_interval: int = 100,
+        metrics_enabled: bool = False
+    ):
+        """
+        Push tick of symbol every tick_interval trades and timer event every timer_interval trades.
+        """
+        self.contracts = {contract.vt_symbol: contract for contract in contracts}
+        self.tick_interval = tick_interval
+        self.timer_interval = timer_interval
+
+        remove_bench_files()
+
+        self.main_engine = BenchMainEngine(contracts)
+        self.event_engine = BenchEventEngine()
+        self.gateway = self.main_engine.gateway
+
+        self.engine = BenchFollowEngine(self.main_engine, self.event_engine)
+        self.engine.source_gateway_name = SOURCE_GATEWAY_NAME
+        self.engine.target_gateway_name = TARGET_GATEWAY_NAME
+        self.engine.filter_trade_timeout = 3600
+        # Trade file and follow data of the day must not be touched by benchmark.
+        self.engine.is_trade_saved = True
+        self.engine.metrics_enabled = metrics_enabled
+        self.engine.trade_sink = TradeSink(BENCH_TRADE_FOLDER)
+        self.engine.init_engine()
+        self.engine.start()
+
+        for contract in contracts:
+            self.push_tick(contract.vt_symbol)
+
+        self.latencies = []
+        self.handle_times = []
+
+    def close(self):
+        """"""
+        self.engine.is_active = False
+        self.engine.data_store.stop()
+        self.engine.trade_sink.stop()
+        for target in self.engine.targets.values():
+            target.executor.shutdown()
+        remove_bench_files()
+
+    def push_tick(self, vt_symbol: str):
+        """"""
+        tick = create_tick(self.contracts[vt_symbol], 3500)
+        self.engine.process_tick_event(Event(EVENT_TICK, tick))
+
+    def push_gateway_events(self):
+        """"""
+        events = self.gateway.events
+        self.gateway.events = []
+        for event in events:
+            if event.type == EVENT_ORDER:
+                self.engine.process_order_event(event)
+            else:
+                self.engine.process_trade_event(event)
+
+    def run(self, trades: list):
+        """"""
+        now_time = datetime.now().strftime("%H:%M:%S")
+        for i, trade in enumerate(trades):
+            if i % self.tick_interval == 0:
+                self.push_tick(trade.vt_symbol)
+            if i % self.timer_interval == 0:
+                self.engine.process_timer_event(Event(EVENT_TIMER))
+
+            trade.time = now_time
+            event = Event(EVENT_TRADE, trade)
+
+            self.gateway.first_send_time = 0
+            start = perf_counter()
+            self.engine.process_trade_event(event)
+            end = perf_counter()
+
+            if self.gateway.first_send_time:
+                self.latencies.append(self.gateway.first_send_time - start)
+            self.handle_times.append(end - start)
+
+            self.push_gateway_events()
+
+
+def percentile(values: list, q: float):
+    """"""
+    if not values:
+        return 0
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * q))
+    return values[index]
+
+
+def run_benchmark(
+    contracts: list,
+    trades: list,
+    tick_interval: int,
+    timer_interval: int,
+    metrics_enabled: bool = False
+):
+    """"""
+    bench = FollowBenchmark(contracts, tick_interval, timer_interval, metrics_enabled)
+    start = perf_counter()
+    try:
+        bench.run(trades)
+    finally:
+        cost = perf_counter() - start
+        bench.close()
+    return bench, cost
+
+
+def run_allocation(contracts: list, trades: list, tick_interval: int, timer_interval: int):
+    """
+    Memory allocated per trade, traced in a separated run.
+    """
+    bench = FollowBenchmark(contracts, tick_interval, timer_interval)
+    try:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        begin, _ = tracemalloc.get_traced_memory()
+        before = tracemalloc.take_snapshot()
+
+        bench.run(trades)
+
+        after = tracemalloc.take_snapshot()
+        end, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        bench.close()
+
+    stats = after.compare_to(before, "filename")
+    allocated_blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    return {
+        "retained_bytes": (end - begin) / len(trades),
+        "peak_bytes": (peak - begin) / len(trades),
+        "retained_blocks": allocated_blocks / len(trades)
+    }
+
+
+def main():
+    """"""
+    parser = argparse.ArgumentParser(description="Follow trading latency benchmark")
+    parser.add_argument("-n", "--count", type=int, default=10000, help="count of synthetic source trades")
+    parser.add_argument("--symbols", type=int, default=10, help="count of symbols in synthetic trades")
+    parser.add_argument("--trade-file", default="", help="replay source trades from trade csv")
+    parser.add_argument("--trade-date", default="", help="replay source trades from trade files of date")
+    parser.add_argument("--gateway", default="", help="gateway name of source trades in trade csv")
+    parser.add_argument("--tick-interval", type=int, default=5)
+    parser.add_argument("--timer-interval", type=int, default=100)
+    parser.add_argument("--no-alloc", action="store_true", help="skip allocation tracing")
+    parser.add_argument("--metrics", action="store_true", help="enable engine metrics and print stage latency")
+    args = parser.parse_args()
+
+    random.seed(0)
+    if args.trade_file or args.trade_date:
+        contracts, trades = load_recorded_trades(args.trade_file, args.gateway, args.trade_date)
+    else:
+        contracts, trades = create_synthetic_trades(args.count, args.symbols)
+
+    if not trades:
+        print("没有可回放的成交")
+        return
+
+    bench, cost = run_benchmark(contracts, trades, args.tick_interval, args.timer_interval, args.metrics)
+
+    print(f"trades: {len(trades)}, target orders: {bench.gateway.orderid}, cost: {cost:.3f}s")
+    print(f"throughput: {len(trades) / cost:.0f} trades/s")
+    for name, values in [("latency", bench.latencies), ("handle", bench.handle_times)]:
+        p50, p99, p999 = [percentile(values, q) * 1e6 for q in (0.5, 0.99, 0.999)]
+        print(f"{name:8s} us  p50: {p50:.1f}  p99: {p99:.1f}  p999: {p999:.1f}  max: {max(values) * 1e6:.1f}")
+
+    if args.metrics:
+        metrics = bench.engine.get_metrics()
+        for stage, h in metrics["histograms"].items():
+            print(
+                f"stage {stage:8s} us  count: {h['count']}  mean: {h['mean']:.1f}  p50: {h['p50']:.1f}  "
+                f"p99: {h['p99']:.1f}  p999: {h['p999']:.1f}"
+            )
+        print(f"counters: {metrics['counters']}")
+        print(f"gauges: {metrics['gauges']}")
+
+    if not args.no_alloc:
+        alloc = run_allocation(contracts, trades, args.tick_interval, args.timer_interval)
+        print(
+            f"allocation per trade: retained {alloc['retained_bytes']:.0f} bytes, "
+            f"{alloc['retained_blocks']:.1f} blocks, peak {alloc['peak_bytes']:.0f} bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import mmap
+import struct
+from pathlib import Path
+
+from vnpy.trader.object import TickData
+
+
+BOARD_MAGIC = b"VNPRICE2"
+BOARD_CAPACITY = 4096
+
+# magic, capacity, count of symbols on board
+HEADER = struct.Struct("<8sII")
+# seq, vt_symbol, timestamp of tick, bid_price, ask_price, limit_up, limit_down
+SLOT = struct.Struct("<Q32s5d")
+SEQ = struct.Struct("<Q")
+SYMBOL = struct.Struct("<32s")
+PRICES = struct.Struct("<5d")
+
+# Retry times of reader when slot is being written
+READ_RETRY = 100
+
+
+class PriceBoard:
+    """
+    Memory-mapped price board shared by processes on one host, keyed by vt_symbol.
+
+    Only one process writes the board, others read it without lock. Each slot is
+    guarded by a sequence counter (seqlock): writer makes seq odd before changing
+    prices and even after, reader retries if seq is odd or changed during reading.
+
+    A new symbol is appended to next free slot, and the count in header is increased
+    after the slot written, so readers never see a half-written symbol.
+
+    Each slot keeps timestamp of its tick, reader can reject prices not updated for
+    a while, e.g. writer process stopped.
+    """
+
+    def __init__(self, file_path: Path, writer: bool = False, capacity: int = BOARD_CAPACITY):
+        """"""
+        self.file_path = Path(file_path)
+        self.writer = writer
+        self.capacity = capacity
+
+        self.file = None
+        self.buf = None
+        self.count = 0
+        self.slots = {}     # vt_symbol: offset of slot
+
+    def open(self):
+        """
+        Open board file. Writer creates it if not exists, reader returns False if not ready.
+        """
+        size = HEADER.size + SLOT.size * self.capacity
+
+        if self.writer:
+            if not self.is_valid_file(size):
+                with open(self.file_path, "wb") as f:
+                    f.write(HEADER.pack(BOARD_MAGIC, self.capacity, 0))
+                    f.truncate(size)
+
+            self.file = open(self.file_path, "r+b")
+            self.buf = mmap.mmap(self.file.fileno(), size)
+        else:
+            if not self.file_path.exists():
+                return False
+
+            self.file = open(self.file_path, "rb")
+            self.buf = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, capacity, _ = HEADER.unpack_from(self.buf, 0)
+        if magic != BOARD_MAGIC:
+            self.close()
+            return False
+
+        self.capacity = capacity
+        self.refresh_slots()
+        if self.writer:
+            self.recover_slots()
+        return True
+
+    def is_valid_file(self, size: int):
+        """
+        Check if board file exists and was created with same layout.
+        """
+        if not self.file_path.exists() or self.file_path.stat().st_size != size:
+            return False
+
+        with open(self.file_path, "rb") as f:
+            magic, capacity, _ = HEADER.unpack(f.read(HEADER.size))
+        return magic == BOARD_MAGIC and capacity == self.capacity
+
+    def recover_slots(self):
+        """
+        Writer killed while writing leaves seq of slot odd, readers would retry it forever.
+        Clear prices of such slot and make its seq even again.
+        """
+        for offset in self.slots.values():
+            seq, = SEQ.unpack_from(self.buf, offset)
+            if seq & 1:
+                PRICES.pack_into(self.buf, offset + SEQ.size + SYMBOL.size, 0, 0, 0, 0, 0)
+                SEQ.pack_into(self.buf, offset, seq + 1)
+
+    def close(self):
+        """"""
+        if self.buf:
+            self.buf.close()
+            self.buf = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+        self.count = 0
+        self.slots.clear()
+
+    def refresh_slots(self):
+        """
+        Index symbols appended to board since last refresh.
+        """
+        _, _, count = HEADER.unpack_from(self.buf, 0)
+        for index in range(self.count, count):
+            offset = HEADER.size + SLOT.size * index
+            raw_symbol, = SYMBOL.unpack_from(self.buf, offset + SEQ.size)
+            vt_symbol = raw_symbol.rstrip(b"\x00").decode()
+            self.slots[vt_symbol] = offset
+        self.count = count
+
+    def get_slot(self, vt_symbol: str):
+        """"""
+        offset = self.slots.get(vt_symbol, None)
+        if offset is None and self.buf:
+            self.refresh_slots()
+            offset = self.slots.get(vt_symbol, None)
+        return offset
+
+    def add_slot(self, vt_symbol: str):
+        """
+        Append slot of new symbol. Return None if board is full.
+        """
+        if self.count >= self.capacity:
+            return None
+
+        offset = HEADER.size + SLOT.size * self.count
+        SLOT.pack_into(self.buf, offset, 0, vt_symbol.encode(), 0, 0, 0, 0, 0)
+
+        self.count += 1
+        self.slots[vt_symbol] = offset
+        HEADER.pack_into(self.buf, 0, BOARD_MAGIC, self.capacity, self.count)
+        return offset
+
+    def write(
+        self,
+        vt_symbol: str,
+        timestamp: float,
+        bid_price: float,
+        ask_price: float,
+        limit_up: float,
+        limit_down: float
+    ):
+        """
+        Write prices of symbol, called by writer process only. Return False if board is full.
+        """
+        offset = self.slots.get(vt_symbol, None)
+        if offset is None:
+            offset = self.add_slot(vt_symbol)
+            if offset is None:
+                return False
+
+        seq, = SEQ.unpack_from(self.buf, offset)
+        SEQ.pack_into(self.buf, offset, seq + 1)
+        PRICES.pack_into(
+            self.buf,
+            offset + SEQ.size + SYMBOL.size,
+            timestamp,
+            bid_price,
+            ask_price,
+            limit_up,
+            limit_down
+        )
+        SEQ.pack_into(self.buf, offset, seq + 2)
+        return True
+
+    def write_tick(self, tick: TickData):
+        """"""
+        return self.write(
+            tick.vt_symbol,
+            tick.datetime.timestamp(),
+            tick.bid_price_1,
+            tick.ask_price_1,
+            tick.limit_up,
+            tick.limit_down
+        )
+
+    def read(self, vt_symbol: str, expire_time: float = 0):
+        """
+        Read (seq, timestamp, bid_price, ask_price, limit_up, limit_down) of symbol.
+        Return None if symbol not on board, no consistent read after retries,
+        or timestamp of prices is earlier than expire_time.
+        """
+        offset = self.get_slot(vt_symbol)
+        if offset is None:
+            return None
+
+        prices_offset = offset + SEQ.size + SYMBOL.size
+        for _ in range(READ_RETRY):
+            seq, = SEQ.unpack_from(self.buf, offset)
+            if seq & 1:
+                continue
+
+            prices = PRICES.unpack_from(self.buf, prices_offset)
+            if SEQ.unpack_from(self.buf, offset)[0] != seq:
+                continue
+
+            # timestamp 0 means prices not written yet, or cleared by recover_slots
+            timestamp = prices[0]
+            if not timestamp or timestamp < expire_time:
+                return None
+            return (seq, *prices)
+        return None
+
+    def __contains__(self, vt_symbol: str):
+        """"""
+        return self.get_slot(vt_symbol) is not None
@@ -0,0 +1,236 @@
+import pickle
+import sqlite3
+import traceback
+from datetime import datetime
+from queue import Queue, Empty
+from threading import Thread
+from typing import Dict, List
+
+from vnpy.trader.utility import get_file_path
+from vnpy.trader.constant import Exchange, Product, OptionType
+from vnpy.trader.object import ContractData
+
+
+# Columns are only appended, so files written by older version can still be loaded.
+CONTRACT_COLUMNS = [
+    ("vt_symbol", "TEXT PRIMARY KEY"),
+    ("symbol", "TEXT"),
+    ("exchange", "TEXT"),
+    ("name", "TEXT"),
+    ("product", "TEXT"),
+    ("size", "REAL"),
+    ("pricetick", "REAL"),
+    ("min_volume", "REAL"),
+    ("stop_supported", "INTEGER"),
+    ("net_position", "INTEGER"),
+    ("history_data", "INTEGER"),
+    ("option_strike", "REAL"),
+    ("option_underlying", "TEXT"),
+    ("option_type", "TEXT"),
+    ("option_expiry", "TEXT"),
+    ("gateway_name", "TEXT"),
+    ("update_time", "TEXT")
+]
+COLUMN_NAMES = [name for name, _ in CONTRACT_COLUMNS]
+
+# update_time is not compared when checking if contract changed
+ROW_SIZE = len(COLUMN_NAMES) - 1
+
+
+def contract_to_row(contract: ContractData):
+    """"""
+    option_type = getattr(contract, "option_type", None)
+    option_expiry = getattr(contract, "option_expiry", None)
+    return (
+        contract.vt_symbol,
+        contract.symbol,
+        contract.exchange.value,
+        contract.name,
+        contract.product.value if contract.product else "",
+        contract.size,
+        contract.pricetick,
+        contract.min_volume,
+        int(contract.stop_supported),
+        int(contract.net_position),
+        int(contract.history_data),
+        getattr(contract, "option_strike", 0) or 0,
+        getattr(contract, "option_underlying", "") or "",
+        option_type.value if option_type else "",
+        option_expiry.isoformat() if option_expiry else "",
+        contract.gateway_name
+    )
+
+
+def row_to_contract(row: sqlite3.Row):
+    """"""
+    contract = ContractData(
+        symbol=row["symbol"],
+        exchange=Exchange(row["exchange"]),
+        name=row["name"],
+        product=Product(row["product"]) if row["product"] else None,
+        size=row["size"],
+        pricetick=row["pricetick"],
+        min_volume=row["min_volume"],
+        stop_supported=bool(row["stop_supported"]),
+        net_position=bool(row["net_position"]),
+        history_data=bool(row["history_data"]),
+        gateway_name=row["gateway_name"]
+    )
+
+    if row["option_type"]:
+        contract.option_strike = row["option_strike"]
+        contract.option_underlying = row["option_underlying"]
+        contract.option_type = OptionType(row["option_type"])
+        if row["option_expiry"]:
+            contract.option_expiry = datetime.fromisoformat(row["option_expiry"])
+    return contract
+
+
+class ContractStore:
+    """
+    Keep contracts in sqlite file, indexed by vt_symbol.
+
+    Contracts are put to writer thread, which compares them with the rows saved before
+    and writes only new or changed ones in one transaction.
+
+    Full contract list put with dump is also pickled to legacy_filename (contracts.data of
+    older version) for readers not moved to sqlite yet, it will be removed in next release.
+    """
+
+    def __init__(
+        self,
+        filename: str = "follow_trading_contract.db",
+        flush_interval: float = 1,
+        legacy_filename: str = "contracts.data"
+    ):
+        """"""
+        self.file_path = get_file_path(filename)
+        self.legacy_path = get_file_path(legacy_filename) if legacy_filename else None
+        self.flush_interval = flush_interval
+
+        self.queue = Queue()
+        self.active = False
+        self.thread = None
+
+        self.rows = {}      # vt_symbol: row saved, accessed by writer thread only after started
+
+    def connect(self):
+        """"""
+        connection = sqlite3.connect(str(self.file_path))
+        connection.row_factory = sqlite3.Row
+
+        columns = ", ".join(f"{name} {type_}" for name, type_ in CONTRACT_COLUMNS)
+        connection.execute(f"CREATE TABLE IF NOT EXISTS contract ({columns})")
+
+        # Add columns missing in file of older version
+        exists = {row["name"] for row in connection.execute("PRAGMA table_info(contract)")}
+        for name, type_ in CONTRACT_COLUMNS:
+            if name not in exists:
+                connection.execute(f"ALTER TABLE contract ADD COLUMN {name} {type_}")
+        connection.commit()
+        return connection
+
+    def load(self, vt_symbols: List[str] = None):
+        """
+        Load contracts saved, all or of vt_symbols. Call it before start().
+        """
+        connection = self.connect()
+        try:
+            cursor = connection.execute(f"SELECT {', '.join(COLUMN_NAMES)} FROM contract")
+            contracts = {}
+            for row in cursor:
+                self.rows[row["vt_symbol"]] = tuple(row)[:ROW_SIZE]
+                if vt_symbols is None or row["vt_symbol"] in vt_symbols:
+                    contracts[row["vt_symbol"]] = row_to_contract(row)
+        finally:
+            connection.close()
+        return contracts
+
+    def start(self):
+        """"""
+        if self.active:
+            return
+
+        self.active = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop writer thread after pending contracts written.
+        """
+        if not self.active:
+            return
+
+        self.active = False
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def put_contracts(self, contracts: List[ContractData], dump: bool = False):
+        """
+        Put contracts to writer thread, unchanged ones are skipped there.
+        Set dump if contracts is full list to be pickled to legacy file.
+        """
+        self.queue.put((contracts, dump))
+
+    def run(self):
+        """"""
+        connection = self.connect()
+
+        while True:
+            items = []
+            try:
+                items.append(self.queue.get(timeout=self.flush_interval))
+                while True:
+                    items.append(self.queue.get_nowait())
+            except Empty:
+                pass
+
+            stopped = None in items
+            items = [item for item in items if item is not None]
+
+            try:
+                changed = self.get_changed_rows(items)
+                if changed:
+                    self.write_rows(connection, changed)
+
+                dumps = [contracts for contracts, dump in items if dump]
+                if dumps and self.legacy_path:
+                    self.write_legacy(dumps[-1])
+            except:  # noqa
+                traceback.print_exc()
+
+            if stopped:
+                break
+
+        connection.close()
+
+    def get_changed_rows(self, items: List[tuple]):
+        """"""
+        changed = {}
+        for contracts, _ in items:
+            if not contracts:
+                continue
+
+            for contract in contracts:
+                row = contract_to_row(contract)
+                if self.rows.get(row[0], None) != row:
+                    changed[row[0]] = row
+        return changed
+
+    def write_rows(self, connection: sqlite3.Connection, changed: Dict[str, tuple]):
+        """"""
+        update_time = datetime.now().isoformat()
+        placeholders = ", ".join("?" * len(COLUMN_NAMES))
+        with connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO contract ({', '.join(COLUMN_NAMES)}) VALUES ({placeholders})",
+                [row + (update_time,) for row in changed.values()]
+            )
+        self.rows.update(changed)
+
+    def write_legacy(self, contracts: List[ContractData]):
+        """"""
+        with open(self.legacy_path, "wb") as f:
+            pickle.dump(contracts, f)
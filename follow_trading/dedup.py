@@ -0,0 +1,95 @@
+from time import time
+
+from vnpy.trader.utility import load_json, save_json
+
+
+class TradeIdFilter:
+    """
+    Filter duplicate vt_tradeids seen in recent time window, with bounded memory.
+
+    Ids are kept in a rotating pair of sets. Current set is moved to previous one
+    (and the old previous one is dropped) when window passed or max_size reached,
+    so an id is remembered for at least one window unless max_size is exceeded.
+    """
+
+    def __init__(self, window: float, max_size: int = 100000):
+        """"""
+        self.window = window
+        self.max_size = max_size
+
+        self.current = set()
+        self.previous = set()
+        self.rotate_time = time()
+
+    def __contains__(self, vt_tradeid: str):
+        """"""
+        return vt_tradeid in self.current or vt_tradeid in self.previous
+
+    def __len__(self):
+        """"""
+        return len(self.current) + len(self.previous)
+
+    def add(self, vt_tradeid: str):
+        """
+        Add vt_tradeid, return False if it's duplicate.
+        """
+        if vt_tradeid in self.current or vt_tradeid in self.previous:
+            return False
+
+        self.check_rotate()
+        self.current.add(vt_tradeid)
+        return True
+
+    def update(self, vt_tradeids: list):
+        """"""
+        for vt_tradeid in vt_tradeids:
+            self.add(vt_tradeid)
+
+    def check_rotate(self):
+        """"""
+        now = time()
+        if now - self.rotate_time >= self.window or len(self.current) >= self.max_size:
+            # Both sets are expired if nothing added in last two windows
+            if now - self.rotate_time >= self.window * 2:
+                self.previous = set()
+            else:
+                self.previous = self.current
+            self.current = set()
+            self.rotate_time = now
+
+    def set_window(self, window: float):
+        """"""
+        self.window = window
+
+    def clear(self):
+        """"""
+        self.current = set()
+        self.previous = set()
+        self.rotate_time = time()
+
+    def save(self, filename: str, extra: dict = None):
+        """
+        Save to json file, extra data is saved together.
+        """
+        data = {
+            "rotate_time": self.rotate_time,
+            "current": list(self.current),
+            "previous": list(self.previous)
+        }
+        if extra:
+            data.update(extra)
+        save_json(filename, data)
+
+    def load(self, filename: str):
+        """
+        Load from json file, expired ids are dropped. Return all data in file.
+        """
+        data = load_json(filename)
+        if not data:
+            return data
+
+        self.rotate_time = data["rotate_time"]
+        self.current = set(data["current"])
+        self.previous = set(data["previous"])
+        self.check_rotate()
+        return data
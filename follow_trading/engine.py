@@ -1,21 +1,26 @@
-import pickle
+import heapq
 import traceback
-import pandas as pd
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, Future
 from datetime import datetime, timedelta, time
+from time import monotonic
 from enum import Enum
 from copy import copy
 from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
 
 from vnpy.event import EventEngine, Event
 from vnpy.trader.engine import BaseEngine, MainEngine
-from vnpy.trader.utility import load_json, save_json, get_folder_path, get_file_path
+from vnpy.trader.utility import load_json, save_json, get_file_path
 from vnpy.trader.converter import OffsetConverter
 from vnpy.trader.constant import (
     OrderType,
     Direction,
-    Offset
+    Offset,
+    Status
 )
 from vnpy.trader.event import (
     EVENT_TICK,
@@ -23,6 +28,7 @@ from vnpy.trader.event import (
     EVENT_TRADE,
     EVENT_POSITION,
     EVENT_TIMER,
+    EVENT_CONTRACT,
     EVENT_LOG
 )
 from vnpy.trader.object import (
@@ -35,6 +41,26 @@ from vnpy.trader.object import (
     PositionData
 )
 
+from .store import FollowDataStore, RecordType
+from .position import PositionTable, to_number
+from .pacer import OrderPacer
+from .dedup import TradeIdFilter
+from .metrics import FollowMetrics
+from .sink import TradeSink, TradeRole
+from .board import PriceBoard
+from .contract import ContractStore
+from .pricer import AdaptivePricer
+from .reconcile import SyncPlan, build_sync_plan, group_orders_by_symbol
+
+
+@dataclass
+class SymbolMeta:
+    vt_symbol: str
+    product: str                # symbol without digits, e.g. rb of rb2010
+    intraday: bool              # lock mode
+    single_max: int             # max volume of one order
+    pricetick: float
+
 
 @dataclass
 class PosDeltaData:
@@ -51,11 +77,66 @@ class PosDeltaData:
     basic_delta: int = 0
 
 
+class FollowTarget:
+    """
+    Extra target gateway in fan-out mode, which follows source trade with its own settings.
+    Orders of one target are sent to gateway by its own thread, so targets don't wait for each other.
+    All other state of target is changed in event thread only.
+    """
+
+    def __init__(
+        self,
+        main_engine: MainEngine,
+        gateway_name: str,
+        multiples: int = 1,
+        inverse_follow: bool = False,
+        single_max_dict: dict = None
+    ):
+        """"""
+        self.gateway_name = gateway_name
+        self.multiples = multiples
+        self.inverse_follow = inverse_follow
+        self.single_max_dict = single_max_dict if single_max_dict else {}
+
+        self.offset_converter = OffsetConverter(main_engine)
+        self.positions = {}
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def get_record_tradeid(self, vt_tradeid: str):
+        """
+        Key of follow orders of this target in tradeid_orderids_dict.
+        """
+        return f"{vt_tradeid}@{self.gateway_name}"
+
+
+@dataclass
+class SendingOrder:
+    """
+    Follow order taken by pacer, until its vt_orderid is recorded.
+    """
+    vt_tradeid: str
+    chase_count: int
+    target: FollowTarget = None
+    base_price: float = 0           # price before convert_order_price, to price again when delayed by pacer
+    pending_vt_orderid: str = ""    # set if frozen in offset converter before sent
+
+
 class FollowRunType(Enum):
     TEST = "测试"
     LIVE = "实盘"
 
 
+class DispatchMode(Enum):
+    IMMEDIATE = "立即"
+    TIMER = "定时"
+
+
+class PriceBoardMode(Enum):
+    NONE = "关闭"
+    WRITER = "写入"
+    READER = "读取"
+
+
 class TradeType(Enum):
     BUY = "买开"
     SHORT = "卖开"
@@ -63,9 +144,33 @@ class TradeType(Enum):
     COVER = "买平"
 
 
+class FollowOrderType(Enum):
+    FOLLOW = "跟随单"
+    SYNC = "同步单"
+    BASIC = "底仓单"
+
+
 APP_NAME = "FollowTrading"
 EVENT_FOLLOW_LOG = "eFollowLog"
-EVENT_FOLLOW_POS_DELTA = "eFollowPosDelta"
+EVENT_FOLLOW_POS_SNAPSHOT = "eFollowPosSnapshot"
+EVENT_FOLLOW_METRICS = "eFollowMetrics"
+EVENT_FOLLOW_CALLBACK = "eFollowCallback"
+
+# Prefix of orderid of order frozen in offset converter before it's sent
+PENDING_ORDERID_PREFIX = "PENDING"
+
+# Stage name: method of FollowEngine timed when metrics enabled
+METRICS_STAGES = {
+    "trade": "process_trade_event",
+    "tick": "process_tick_event",
+    "order": "process_order_event",
+    "timer": "process_timer_event",
+    "filter": "filter_source_trade",
+    "convert": "convert_trade_to_order_req",
+    "price": "convert_order_price",
+    "split": "split_req",
+    "send": "convert_and_send_orders"
+}
 
 DAYLIGHT_MARKET_END = time(15, 2)
 NIGHT_MARKET_BEGIN = time(20, 45)
@@ -78,6 +183,7 @@ class FollowEngine(BaseEngine):
     """
     setting_filename = "follow_trading_setting.json"
     data_filename = "follow_trading_data.json"
+    tradeids_filename = "follow_trading_tradeids.json"
 
     def __init__(self, main_engine: MainEngine, event_engine: EventEngine):
         super().__init__(main_engine, event_engine, APP_NAME)
@@ -86,13 +192,33 @@ class FollowEngine(BaseEngine):
         self.source_gateway_name = "CTP"
         self.target_gateway_name = "RPC"
         self.filter_trade_timeout = 60
-        self.cancel_order_timeout = 10
+        self.cancel_order_timeout = 10  # seconds, float is allowed
+        self.chase_order_count = 0  # times to resend order after timeout cancel, 0 means no chase
+        self.save_interval = 1
+        self.snapshot_interval = 60
         self.multiples = 1
         self.tick_add = 10
+        # Choose ticks crossed between adaptive_min_ticks and tick_add by spread, book volume and fill rate
+        self.adaptive_price = False
+        self.adaptive_min_ticks = 1
         self.inverse_follow = False
         self.order_type = OrderType.LIMIT
+        self.dispatch_mode = DispatchMode.IMMEDIATE
 
         self.single_max = 1000
+        # Order rate limit per second of each target gateway and each symbol, 0 means no limit
+        self.order_rate_limit = 0
+        self.symbol_rate_limit = 0
+        # Metrics of each stage, snapshot event is put every metrics_interval seconds
+        self.metrics_enabled = False
+        self.metrics_interval = 10
+        # Shared price board of processes on one host, written by one process and read by others
+        self.price_board_mode = PriceBoardMode.NONE
+        self.price_board_file = "follow_trading_price_board.dat"
+        # Prices on board older than price_board_expire seconds are not used, 0 means no check
+        self.price_board_expire = 60
+        # Fan-out targets, item example: {"gateway_name": "RPC2", "multiples": 2, "inverse_follow": False}
+        self.fanout_targets = []
         self.intraday_symbols = ['IF', 'IC', 'IH']
         self.single_max_dict = {
             "IF": 20,
@@ -111,40 +237,81 @@ class FollowEngine(BaseEngine):
         self.is_active = False
         self.follow_data = {}
         self.follow_setting = {}
+        self.data_store = None
 
         self.sync_order_ref = 0
         self.tradeid_orderids_dict = {}  # vt_tradeid: vt_orderid
-        self.positions = {}
-        self.target_positions = {}
-
-        self.vt_tradeids = set()
+        self.orderid_tradeid_map = {}  # vt_orderid: (vt_tradeid, FollowOrderType)
+        self.pos_key = ['source_long', 'source_short', 'source_net',
+                        'target_long', 'target_short', 'target_net', 'net_delta', 'basic_delta']
+        self.positions = PositionTable(self.pos_key)
+        self.target_positions = {}  # gateway_name: positions of fan-out target
+        self.targets = {}  # gateway_name: FollowTarget
+        self.pacers = {}  # gateway_name: OrderPacer
+        self.symbol_metas = {}  # vt_symbol: SymbolMeta
+        self.contract_store = ContractStore()
+        self.pricer = AdaptivePricer()
+        self.stored_contracts = {}  # vt_symbol: ContractData saved last time, used before gateway contracts ready
+        self.metrics = FollowMetrics()
+        self.trade_sink = TradeSink()
+        self.source_account = ("", "")  # (gateway_name, accountid) of source gateway
+        self.price_board = None
+        self.board_symbols = set()  # vt_symbols with latest price loaded from price board
+        self.tick_symbols = set()  # vt_symbols with tick handler registered
+        self.trade_handlers = {}  # gateway_name: handler of trade from the gateway
+        self.is_event_registered = False
+        self.all_tick_registered = False  # tick handler registered for all symbols, used to unregister in same way
+        self.metrics_put_time = monotonic()
+
+        # Source trades older than filter_trade_timeout are filtered by time, so only ids in window are kept.
+        self.vt_tradeids = TradeIdFilter(self.filter_trade_timeout)
+        self.target_tradeids = set()  # trades in target gateways, cleared daily
+        self.tradeids_changed = False
+        self.tradeids_save_time = monotonic()
         self.limited_prices = {}
         self.latest_prices = {}
-        self.due_out_req_list = []
-        self.refresh_pos_interval = 0
+        self.due_out_reqs = defaultdict(list)  # vt_symbol: [(vt_tradeid, req, target, chase_count)]
+        self.pos_delta_params = None
+        self.pos_snapshot_requested = False
 
         self.is_hedged_closed = False
 
         self.is_trade_saved = False
 
         # Timeout auto cancel
-        self.active_order_set = set()
-        self.active_order_counter = {}
+        self.order_deadlines = {}  # vt_orderid: deadline of active order
+        self.deadline_heap = []  # (deadline, vt_orderid), stale item is skipped when popped
+        self.timeout_orderids = set()  # orders cancelled for timeout
+        self.chase_counts = {}  # vt_orderid: times chased of order
+
+        # Orders of fan-out target are sent in its thread, results are posted back to event thread.
+        self.pending_order_count = 0
+        self.pending_sends = defaultdict(int)  # gateway_name: batches being sent in thread of target
+        self.deferred_events = defaultdict(list)  # gateway_name: order and trade events of orders not recorded yet
 
         self.offset_converter = OffsetConverter(main_engine)
 
         # If parameter is python object. It can not convert to json directly
         self.parameters = ['source_gateway_name', 'target_gateway_name', 'filter_trade_timeout',
-                           'cancel_order_timeout', 'multiples', 'tick_add', 'inverse_follow',
-                           'order_type', 'run_type',
+                           'cancel_order_timeout', 'chase_order_count', 'multiples', 'tick_add', 'inverse_follow',
+                           'adaptive_price', 'adaptive_min_ticks',
+                           'order_type', 'run_type', 'dispatch_mode',
                            'test_symbol', 'intraday_symbols',
                            'single_max',
-                           'single_max_dict']
-
-        self.variables = ['tradeid_orderids_dict', 'positions']
+                           'single_max_dict',
+                           'order_rate_limit',
+                           'symbol_rate_limit',
+                           'metrics_enabled',
+                           'metrics_interval',
+                           'price_board_mode',
+                           'price_board_file',
+                           'price_board_expire',
+                           'fanout_targets',
+                           'save_interval',
+                           'snapshot_interval']
+
+        self.variables = ['tradeid_orderids_dict', 'positions', 'target_positions']
         self.clear_variables = ['tradeid_orderids_dict']
-        self.pos_key = ['source_long', 'source_short', 'source_net',
-                        'target_long', 'target_short', 'target_net', 'net_delta', 'basic_delta']
 
         self.skip_contracts = []
 
@@ -155,9 +322,16 @@ class FollowEngine(BaseEngine):
         Init engine.
         """
         self.write_log("参数和数据读取成功。")
+        self.replay_follow_journal()
+        self.data_store.start()
+        self.trade_sink.start()
+        self.load_contracts()
+        self.open_price_board()
+        self.init_targets()
+        self.set_metrics_enabled(self.metrics_enabled)
         # update vt_tradeid firstly
+        self.load_tradeids()
         self.update_tradeids()
-        print('vt_tradeids', self.vt_tradeids)
 
         self.register_event()
         if self.run_type == FollowRunType.TEST:
@@ -172,7 +346,15 @@ class FollowEngine(BaseEngine):
         Load variables and settings
         """
         self.load_follow_setting()
+        self.data_store = FollowDataStore(
+            self.data_filename,
+            self.get_follow_snapshot,
+            self.save_interval,
+            self.snapshot_interval
+        )
         self.load_follow_data()
+        self.vt_tradeids.set_window(self.filter_trade_timeout)
+        self.pricer.set_range(self.adaptive_min_ticks, self.tick_add)
 
     def get_current_time(self):
         """
@@ -197,10 +379,91 @@ class FollowEngine(BaseEngine):
         """
         self.source_gateway_name = source_name
         self.target_gateway_name = target_name
+        self.update_trade_handlers()
+
+    def init_targets(self):
+        """
+        Create fan-out targets from setting.
+        """
+        for setting in self.fanout_targets:
+            gateway_name = setting["gateway_name"]
+            if gateway_name in [self.source_gateway_name, self.target_gateway_name] or gateway_name in self.targets:
+                self.write_log(f"扇出接口{gateway_name}与其他接口重复，已忽略。")
+                continue
+
+            target = FollowTarget(
+                self.main_engine,
+                gateway_name,
+                setting.get("multiples", self.multiples),
+                setting.get("inverse_follow", self.inverse_follow),
+                setting.get("single_max_dict", self.single_max_dict)
+            )
+            target.positions = self.target_positions.setdefault(gateway_name, {})
+            self.targets[gateway_name] = target
+            self.write_log(f"扇出接口{gateway_name}初始化完成")
+        self.update_trade_handlers()
+
+    def update_trade_handlers(self):
+        """
+        Route trade by gateway name, trades of other gateways are ignored.
+        """
+        self.trade_handlers = {self.target_gateway_name: self.process_target_trade}
+        for gateway_name in self.targets:
+            self.trade_handlers[gateway_name] = self.process_target_trade
+        self.trade_handlers[self.source_gateway_name] = self.process_source_trade
+
+    def is_target_gateway(self, gateway_name: str):
+        """"""
+        return gateway_name == self.target_gateway_name or gateway_name in self.targets
+
+    def get_target(self, gateway_name: str):
+        """
+        Get fan-out target by gateway name, None for main target gateway.
+        """
+        return self.targets.get(gateway_name, None)
+
+    def get_offset_converter(self, gateway_name: str):
+        """"""
+        target = self.targets.get(gateway_name, None)
+        if target:
+            return target.offset_converter
+        return self.offset_converter
+
+    def rebuild_offset_converters(self):
+        """
+        Rebuild offset converters of target gateways from positions and active orders in main engine.
+        """
+        positions = self.main_engine.get_all_positions()
+        orders = self.main_engine.get_all_active_orders()
+
+        for gateway_name in [self.target_gateway_name] + list(self.targets.keys()):
+            gateway_positions = [position for position in positions if position.gateway_name == gateway_name]
+            gateway_orders = [order for order in orders if order.gateway_name == gateway_name]
+
+            offset_converter = self.get_offset_converter(gateway_name)
+            self.load_offset_converter(offset_converter, gateway_positions, gateway_orders)
+
+            self.write_log(f"{gateway_name}委托转换数据重建，持仓{len(gateway_positions)}条，活动委托{len(gateway_orders)}笔")
+
+    @staticmethod
+    def load_offset_converter(offset_converter: OffsetConverter, positions: list, orders: list):
+        """"""
+        offset_converter.load_positions(positions)
+        offset_converter.load_orders(orders)
 
     def set_parameters(self, param_name, value):
         """"""
         setattr(self, param_name, value)
+        if param_name == 'filter_trade_timeout':
+            self.vt_tradeids.set_window(value)
+        elif param_name in ['intraday_symbols', 'single_max', 'single_max_dict']:
+            self.clear_symbol_meta()
+        elif param_name == 'metrics_enabled':
+            self.set_metrics_enabled(value)
+        elif param_name in ['source_gateway_name', 'target_gateway_name']:
+            self.update_trade_handlers()
+        elif param_name in ['tick_add', 'adaptive_min_ticks']:
+            self.pricer.set_range(self.adaptive_min_ticks, self.tick_add)
 
     def get_pos(self, vt_symbol: str, name: str):
         """"""
@@ -213,6 +476,11 @@ class FollowEngine(BaseEngine):
         symbol_pos = self.positions.get(vt_symbol, None)
         if symbol_pos:
             symbol_pos[name] = pos
+            if name in ['target_long', 'target_short']:
+                symbol_pos['target_net'] = symbol_pos['target_long'] - symbol_pos['target_short']
+                self.put_pos_record(vt_symbol, name, 'target_net')
+            else:
+                self.put_pos_record(vt_symbol, name)
 
     def get_connected_gateway_names(self):
         """
@@ -250,6 +518,10 @@ class FollowEngine(BaseEngine):
                     setattr(self, name, OrderType(value))
                 elif name == 'run_type':
                     setattr(self, name, FollowRunType(value))
+                elif name == 'dispatch_mode':
+                    setattr(self, name, DispatchMode(value))
+                elif name == 'price_board_mode':
+                    setattr(self, name, PriceBoardMode(value))
                 else:
                     setattr(self, name, value)
         self.write_log("参数配置读取成功")
@@ -259,7 +531,7 @@ class FollowEngine(BaseEngine):
         Save follow setting to setting file.
         """
         for name in self.parameters:
-            if name in ['order_type', 'run_type']:
+            if name in ['order_type', 'run_type', 'dispatch_mode', 'price_board_mode']:
                 self.follow_setting[name] = getattr(self, name).value
             else:
                 self.follow_setting[name] = getattr(self, name)
@@ -268,69 +540,104 @@ class FollowEngine(BaseEngine):
 
     def load_follow_data(self):
         """
-        Load run data from data file.
+        Load run data from last snapshot in data file.
         """
-        self.follow_data = load_json(self.data_filename)
+        self.follow_data = self.data_store.load()
         for name in self.variables:
             value = self.follow_data.get(name, None)
             if value:
-                setattr(self, name, value)
+                if name == 'positions':
+                    self.positions.load(value)
+                else:
+                    setattr(self, name, value)
+        self.rebuild_orderid_index()
         self.write_log("运行数据读取成功")
 
     def save_follow_data(self):
         """
-        Save run data to data file.
+        Save run data to data file immediately.
         """
         for name in self.variables:
             self.follow_data[name] = getattr(self, name)
-        save_json(self.data_filename, self.follow_data)
+        self.data_store.save()
+
+    def replay_follow_journal(self):
+        """
+        Replay follow events recorded after last snapshot.
+        """
+        data = {name: getattr(self, name) for name in self.variables}
+        count = self.data_store.replay(data)
+        self.rebuild_orderid_index()
+        self.write_log(f"运行数据日志回放成功，共{count}条记录")
+
+    def put_pos_record(self, vt_symbol: str, *names: str):
+        """
+        Record changed fields of symbol pos, all fields are recorded if names not given.
+        """
+        symbol_pos = self.positions[vt_symbol]
+        if names:
+            changed = {name: symbol_pos[name] for name in names}
+        else:
+            changed = dict(symbol_pos.items())
+        self.data_store.put_record(RecordType.POS_DELTA, (vt_symbol, changed))
+
+    def get_follow_snapshot(self):
+        """
+        Copy run data to be saved, it's called in event thread.
+        """
+        data = copy(self.follow_data)
+        for name in self.variables:
+            variable = getattr(self, name).copy()
+            data[name] = {key: copy(value) for key, value in variable.items()}
+        return data
 
     def clear_follow_data(self):
         """
         Clear follow data after market closed
         """
-        if self.follow_data:
-            # save to history data file
-            today = datetime.now().strftime('%Y%m%d')
-            save_json(f"follow_history/{today}_{self.data_filename}", self.follow_data)
-            self.write_log("清除临时数据并保存至历史成功")
+        # save to history data file
+        today = datetime.now().strftime('%Y%m%d')
+        save_json(f"follow_history/{today}_{self.data_filename}", self.get_follow_snapshot())
+        self.write_log("清除临时数据并保存至历史成功")
+
+        # clear the template variables
+        for name in self.clear_variables:
+            getattr(self, name).clear()
+        self.rebuild_orderid_index()
+        self.data_store.put_snapshot()
 
-            # clear the template variables
-            for name in self.clear_variables:
-                self.follow_data[name].clear()
-            save_json(self.data_filename, self.follow_data)
+        self.target_tradeids.clear()
+        self.save_tradeids()
 
-    def save_trade(self):
+    def sink_trade(self, trade: TradeData):
         """
-        Save trade record to file.
+        Append trades of source and target gateways to trade files.
+        Source vt_tradeid is empty for trade not of follow order, e.g. manual order.
         """
-        today = datetime.now().strftime('%Y%m%d')
-        trade_folder = get_folder_path('trade')
-        trade_file_path = trade_folder.joinpath(f"trade_{today}.csv")
+        source_account = self.get_source_account()
+        if trade.gateway_name == self.source_gateway_name:
+            self.trade_sink.put_trade(trade, TradeRole.SOURCE, source_account=source_account)
+        else:
+            source_vt_tradeid = ""
+            order_source = self.get_order_source(trade.vt_orderid)
+            if order_source:
+                # vt_tradeid of fan-out target is recorded with suffix of gateway
+                source_vt_tradeid = order_source[0].split("@")[0]
+            self.trade_sink.put_trade(trade, TradeRole.TARGET, source_vt_tradeid, source_account)
 
-        account_id = 'null'
-        accounts = self.main_engine.get_all_accounts()
-        for account in accounts:
-            if account.gateway_name == self.source_gateway_name:
-                account_id = account.accountid
-                break
+    def get_source_account(self):
+        """
+        Account id of source gateway, cached once account received.
+        """
+        gateway_name, accountid = self.source_account
+        if gateway_name == self.source_gateway_name:
+            return accountid
 
-        trades = self.main_engine.get_all_trades()
-        trade_list = []
-        for trade in trades:
-            d = copy(trade.__dict__)
-            d["exchange"] = d["exchange"].value
-            d["direction"] = d["direction"].value
-            d["offset"] = d["offset"].value
-            d['dt'] = f"{today} {d['time']}"
-            d['date'] = f"{today}"
-            d['source_account'] = account_id
-            d.pop("vt_symbol")
-
-            trade_list.append(d)
-        df = pd.DataFrame(trade_list)
-        df.to_csv(trade_file_path, index=False, encoding='utf-8')
-        self.write_log("成交记录保存成功")
+        for account in self.main_engine.get_all_accounts():
+            if account.gateway_name == self.source_gateway_name:
+                self.source_account = (self.source_gateway_name, account.accountid)
+                return account.accountid
+        return "null"
 
     def save_account_info(self):
         """
@@ -353,9 +660,49 @@ class FollowEngine(BaseEngine):
         Update received tradeids from main engine
         """
         trades = self.main_engine.get_all_trades()
-        tradeids = [trade.vt_tradeid for trade in trades]
-        self.vt_tradeids.update(set(tradeids))
-        self.write_log("成交单列表更新成功")
+        for trade in trades:
+            if self.add_tradeid(trade):
+                self.sink_trade(trade)
+        self.write_log(f"成交单列表更新成功，近期成交{len(self.vt_tradeids)}笔，目标户成交{len(self.target_tradeids)}笔")
+
+    def add_tradeid(self, trade: TradeData):
+        """
+        Add vt_tradeid of received trade, return False if it's duplicate push.
+        All trades are filtered in recent time window. Trades of target gateways,
+        follow orders or not, are also kept in target_tradeids for the whole day,
+        so they are never applied to offset converter twice after a long reconnect.
+        """
+        vt_tradeid = trade.vt_tradeid
+        if trade.gateway_name != self.source_gateway_name and vt_tradeid in self.target_tradeids:
+            return False
+
+        if not self.vt_tradeids.add(vt_tradeid):
+            return False
+
+        if trade.gateway_name != self.source_gateway_name:
+            self.target_tradeids.add(vt_tradeid)
+
+        self.tradeids_changed = True
+        return True
+
+    def load_tradeids(self):
+        """
+        Load received vt_tradeids saved before restart.
+        """
+        data = self.vt_tradeids.load(self.tradeids_filename)
+        if data:
+            self.target_tradeids = set(data.get("target", []))
+
+    def save_tradeids(self):
+        """"""
+        self.vt_tradeids.save(self.tradeids_filename, {"target": list(self.target_tradeids)})
+        self.tradeids_changed = False
+        self.tradeids_save_time = monotonic()
+
+    def auto_save_tradeids(self):
+        """"""
+        if self.tradeids_changed and monotonic() - self.tradeids_save_time >= self.snapshot_interval:
+            self.save_tradeids()
 
     def auto_save_trade(self):
         """
@@ -366,7 +713,6 @@ class FollowEngine(BaseEngine):
 
         now_time = datetime.now().time()
         if NIGHT_MARKET_BEGIN > now_time >= DAYLIGHT_MARKET_END:
-            self.save_trade()
             self.clear_follow_data()
             self.save_account_info()
 
@@ -384,6 +730,12 @@ class FollowEngine(BaseEngine):
             self.write_log("跟随接口和发单接口不能是同一个")
             return False
 
+        if self.source_gateway_name in self.targets or self.target_gateway_name in self.targets:
+            self.write_log("跟随接口和发单接口不能是扇出接口")
+            return False
+
+        self.rebuild_offset_converters()
+
         self.is_active = True
         self.write_log("跟随交易启动")
 
@@ -398,7 +750,7 @@ class FollowEngine(BaseEngine):
             return False
 
         self.is_active = False
-        self.cancel_all_order()
+        self.cancel_all_order(all_targets=True)
         self.write_log("跟随交易停止")
 
         self.clear_empty_pos()
@@ -406,8 +758,9 @@ class FollowEngine(BaseEngine):
 
         self.save_follow_setting()
         # self.save_follow_data()
+        # Data file is up to date once follow stopped, e.g. for sync uploading it
+        self.data_store.put_snapshot()
 
-        self.save_trade()
         self.save_contract()
 
         now_time = datetime.now().time()
@@ -421,14 +774,34 @@ class FollowEngine(BaseEngine):
         Close engine.
         """
         self.stop()
+        for target in self.targets.values():
+            target.executor.shutdown()
+        self.data_store.stop()
+        self.trade_sink.stop()
+        self.contract_store.stop()
+        self.close_price_board()
+        self.save_tradeids()
+
+    def load_contracts(self):
+        """
+        Load contracts saved last time and warm metadata of symbols in positions,
+        so following works before gateway finishes querying contracts.
+        """
+        self.stored_contracts = self.contract_store.load()
+        self.contract_store.start()
+
+        for vt_symbol in self.positions.keys():
+            self.get_symbol_meta(vt_symbol)
+        self.write_log(f"合约数据读取成功，共{len(self.stored_contracts)}个")
 
     def save_contract(self):
-        """"""
+        """
+        Contracts are compared and written by contract store thread, only changed ones are written.
+        Full list is also dumped to contracts.data for readers of older version.
+        """
         contracts = self.main_engine.get_all_contracts()
-        filepath = get_file_path('contracts.data')
-        with open(filepath, 'wb') as f:
-            pickle.dump(contracts, f)
-        self.write_log(f"当日合约数据保存成功")
+        self.contract_store.put_contracts(contracts, dump=True)
+        self.write_log(f"当日合约数据保存请求已提交")
 
     @staticmethod
     def get_trade_type(trade: TradeData):
@@ -446,6 +819,18 @@ class FollowEngine(BaseEngine):
             else:
                 return TradeType.SELL
 
+    @staticmethod
+    def get_follow_order_type(vt_tradeid: str):
+        """
+        Get follow order type by prefix of vt_tradeid.
+        """
+        if vt_tradeid.startswith('SYNC'):
+            return FollowOrderType.SYNC
+        elif vt_tradeid.startswith('BASIC'):
+            return FollowOrderType.BASIC
+        else:
+            return FollowOrderType.FOLLOW
+
     @staticmethod
     def inverse_req(req: OrderRequest):
         """Inverse trade"""
@@ -463,16 +848,60 @@ class FollowEngine(BaseEngine):
                 break
         return res
 
+    def get_symbol_meta(self, vt_symbol: str):
+        """
+        Get cached metadata of symbol, it's built when symbol is first seen.
+        Return None if contract not found, which is not cached.
+        """
+        meta = self.symbol_metas.get(vt_symbol, None)
+        if meta:
+            return meta
+
+        contract = self.main_engine.get_contract(vt_symbol)
+        if not contract:
+            contract = self.stored_contracts.get(vt_symbol, None)
+        if not contract:
+            return None
+
+        product = self.strip_digit(contract.symbol)
+        meta = SymbolMeta(
+            vt_symbol=vt_symbol,
+            product=product,
+            intraday=product in self.intraday_symbols,
+            single_max=min(self.single_max_dict.get(product, self.single_max), self.single_max),
+            pricetick=contract.pricetick
+        )
+        self.symbol_metas[vt_symbol] = meta
+        return meta
+
+    def clear_symbol_meta(self, vt_symbol: str = ""):
+        """
+        Clear cached metadata of vt_symbol or all symbols, call it after symbol settings changed.
+        """
+        if vt_symbol:
+            self.symbol_metas.pop(vt_symbol, None)
+        else:
+            self.symbol_metas.clear()
 
-    def is_intra_day_symbol(self, symbol: str):
+    def is_intra_day_symbol(self, vt_symbol: str):
         """"""
-        return self.strip_digit(symbol) in self.intraday_symbols
+        meta = self.get_symbol_meta(vt_symbol)
+        if meta:
+            return meta.intraday
+        return self.strip_digit(vt_symbol) in self.intraday_symbols
 
-    def split_req(self, req: OrderRequest):
+    def split_req(self, req: OrderRequest, target: FollowTarget = None):
         """Split order if needed"""
-        symbol = self.strip_digit(req.symbol)
-        symbol_single_max = self.single_max_dict.get(symbol, self.single_max)
-        order_max = min(symbol_single_max, self.single_max)
+        meta = self.get_symbol_meta(req.vt_symbol)
+        if not meta:
+            product = self.strip_digit(req.symbol)
+            order_max = min(self.single_max_dict.get(product, self.single_max), self.single_max)
+        else:
+            product = meta.product
+            order_max = meta.single_max
+
+        if target:
+            order_max = min(target.single_max_dict.get(product, self.single_max), self.single_max)
 
         if req.volume <= order_max:
             return [req]
@@ -489,20 +918,128 @@ class FollowEngine(BaseEngine):
             req_list.append(req_r)
         return req_list
 
-    def register_event(self):
+    def set_metrics_enabled(self, enabled: bool):
+        """
+        Enable metrics by replacing stage methods with timed ones, disable by restoring them.
+        """
+        # Event handlers are registered again, so the replaced ones are called.
+        registered = self.is_event_registered
+        if registered:
+            self.unregister_event()
+
+        self.metrics_enabled = enabled
+        for stage, method_name in METRICS_STAGES.items():
+            # remove timed method set on instance before
+            self.__dict__.pop(method_name, None)
+            if enabled:
+                method = getattr(self, method_name)
+                setattr(self, method_name, self.metrics.timed(stage, method))
+
+        if registered:
+            self.register_event()
+
+    def get_metrics(self):
+        """
+        Get snapshot of counters, gauges and stage latency histograms in microseconds.
+        """
+        gauges = {
+            "due_out_req_count": self.get_queue_order_count(),
+            "pacer_queue_size": sum(pacer.get_queue_size() for pacer in self.pacers.values()),
+            "active_order_count": len(self.order_deadlines),
+            "deadline_heap_size": len(self.deadline_heap),
+            "vt_tradeid_count": len(self.vt_tradeids) + len(self.target_tradeids),
+            "symbol_count": len(self.positions)
+        }
+        return self.metrics.get_snapshot(gauges)
+
+    def reset_metrics(self):
         """"""
-        self.event_engine.register(EVENT_TICK, self.process_tick_event)
+        self.metrics.reset()
+
+    def put_metrics_event(self):
+        """
+        Put metrics snapshot event regularly if enabled.
+        """
+        if not self.metrics_enabled:
+            return
+
+        now = monotonic()
+        if now - self.metrics_put_time < self.metrics_interval:
+            return
+        self.metrics_put_time = now
+
+        event = Event(EVENT_FOLLOW_METRICS, self.get_metrics())
+        self.event_engine.put(event)
+
+    def register_event(self):
+        """
+        Ticks are received only for followed symbols, except writer of price board receives all ticks.
+        """
+        self.all_tick_registered = self.is_price_board_writer()
+        if self.all_tick_registered:
+            self.event_engine.register(EVENT_TICK, self.process_tick_event)
+        else:
+            for vt_symbol in self.tick_symbols:
+                self.event_engine.register(EVENT_TICK + vt_symbol, self.process_tick_event)
         self.event_engine.register(EVENT_ORDER, self.process_order_event)
         self.event_engine.register(EVENT_TRADE, self.process_trade_event)
         self.event_engine.register(EVENT_POSITION, self.process_position_event)
         self.event_engine.register(EVENT_TIMER, self.process_timer_event)
+        self.event_engine.register(EVENT_CONTRACT, self.process_contract_event)
+        self.event_engine.register(EVENT_FOLLOW_CALLBACK, self.process_callback_event)
+        self.is_event_registered = True
+
+    def unregister_event(self):
+        """"""
+        if self.all_tick_registered:
+            self.event_engine.unregister(EVENT_TICK, self.process_tick_event)
+        else:
+            for vt_symbol in self.tick_symbols:
+                self.event_engine.unregister(EVENT_TICK + vt_symbol, self.process_tick_event)
+        self.event_engine.unregister(EVENT_ORDER, self.process_order_event)
+        self.event_engine.unregister(EVENT_TRADE, self.process_trade_event)
+        self.event_engine.unregister(EVENT_POSITION, self.process_position_event)
+        self.event_engine.unregister(EVENT_TIMER, self.process_timer_event)
+        self.event_engine.unregister(EVENT_CONTRACT, self.process_contract_event)
+        self.event_engine.unregister(EVENT_FOLLOW_CALLBACK, self.process_callback_event)
+        self.is_event_registered = False
+
+    def register_tick_event(self, vt_symbol: str):
+        """
+        Register tick handler of followed symbol.
+        """
+        if vt_symbol in self.tick_symbols:
+            return
+
+        self.tick_symbols.add(vt_symbol)
+        if self.is_event_registered and not self.all_tick_registered:
+            self.event_engine.register(EVENT_TICK + vt_symbol, self.process_tick_event)
 
     def process_tick_event(self, event: Event):
         """"""
-        tick = event.data
-        self.tick_time = tick.datetime
-        self.init_limited_price(tick)
-        self.update_latest_price(tick)
+        try:
+            tick = event.data
+            # Writer of price board receives all ticks, only followed ones are processed further.
+            if self.price_board and self.price_board.writer:
+                self.price_board.write_tick(tick)
+                if tick.vt_symbol not in self.tick_symbols:
+                    return
+
+            self.tick_time = tick.datetime
+            self.init_limited_price(tick)
+            self.update_latest_price(tick)
+            if self.adaptive_price:
+                self.update_pricer(tick)
+
+            # Release orders waiting for price of this symbol
+            if self.dispatch_mode == DispatchMode.IMMEDIATE and tick.vt_symbol in self.due_out_reqs:
+                self.send_symbol_queue_order(tick.vt_symbol)
+
+            self.cancel_timeout_order()
+            self.process_pacers()
+        except:  # noqa
+            msg = f"处理行情事件，触发异常：\n{traceback.format_exc()}"
+            self.write_log(msg)
 
     def process_order_event(self, event: Event):
         """
@@ -511,22 +1048,32 @@ class FollowEngine(BaseEngine):
         try:
             order = event.data
             vt_orderid = order.vt_orderid
-            if order.gateway_name == self.source_gateway_name:
+            if not self.is_target_gateway(order.gateway_name):
                 return
 
-            self.offset_converter.update_order(order)
+            if self.defer_target_event(event):
+                return
+
+            self.get_offset_converter(order.gateway_name).update_order(order)
 
             # Filter non-follow order
             if not self.filter_target_not_follow(order.vt_orderid):
                 return
 
             if order.is_active():
-                self.active_order_set.add(vt_orderid)
-                self.active_order_counter[vt_orderid] = 0
+                if vt_orderid not in self.order_deadlines:
+                    self.schedule_order_timeout(vt_orderid)
             else:
-                if vt_orderid in self.active_order_set:
-                    self.active_order_counter.pop(vt_orderid)
-                    self.active_order_set.remove(vt_orderid)
+                self.order_deadlines.pop(vt_orderid, None)
+                if vt_orderid in self.timeout_orderids:
+                    self.timeout_orderids.remove(vt_orderid)
+                    if order.status == Status.CANCELLED:
+                        self.pricer.update_fill(order.vt_symbol, False)
+                        self.chase_order(order)
+                elif order.status == Status.ALLTRADED:
+                    self.pricer.update_fill(order.vt_symbol, True)
+                # Not chased any more
+                self.chase_counts.pop(vt_orderid, None)
         except:  # noqa
             msg = f"处理委托事件，触发异常：\n{traceback.format_exc()}"
             self.write_log(msg)
@@ -535,52 +1082,133 @@ class FollowEngine(BaseEngine):
         """"""
         try:
             trade = event.data
+            handler = self.trade_handlers.get(trade.gateway_name, None)
+            if not handler:
+                return
+
+            if self.defer_target_event(event):
+                return
 
             # Filter duplicate trade push if reconnect gateway for disconnected reason.
-            if trade.vt_tradeid in self.vt_tradeids:
+            if not self.add_tradeid(trade):
                 self.write_log(f"{trade.vt_tradeid}是重复推送。")
+                if self.metrics_enabled:
+                    self.metrics.incr("duplicate_trade")
                 return
-            else:
-                self.vt_tradeids.add(trade.vt_tradeid)
+
+            # Source trades pushed again after a long reconnect are already in trade files
+            if trade.gateway_name != self.source_gateway_name or not self.is_timeout_trade(trade, quiet=True):
+                self.sink_trade(trade)
 
             if not self.is_active:
                 self.write_log(f"{trade.vt_tradeid}不跟随，系统尚未启动。")
                 return
 
-            if trade.gateway_name == self.source_gateway_name:
-                # validate source trade
-                if not self.filter_source_trade(trade):
-                    return
-
-                # generate order request based on trade
-                req = self.convert_trade_to_order_req(trade)
-                if not req:
-                    return
-
-                # send orders or push to order cache
-                self.send_order(req, trade.vt_tradeid)
-            else:
-                self.offset_converter.update_trade(trade)
-                if not self.filter_target_not_follow(trade.vt_orderid):
-                    self.write_log(f"{trade.vt_tradeid} 不是跟随策略的成交单。")
-                    return
-                self.update_target_pos(trade)
+            handler(trade)
         except:  # noqa
             msg = f"处理成交事件，触发异常：\n{traceback.format_exc()}"
             self.write_log(msg)
 
+    def process_source_trade(self, trade: TradeData):
+        """"""
+        # validate source trade
+        if not self.filter_source_trade(trade):
+            return
+
+        # send orders to fan-out targets
+        followed = False
+        for target in self.targets.values():
+            if self.follow_trade_to_target(trade, target):
+                followed = True
+
+        # generate order request based on trade
+        req = self.convert_trade_to_order_req(trade)
+        if not req and not followed:
+            return
+
+        # record trade accepted by any target, so it won't be followed again after restart.
+        self.tradeid_orderids_dict.setdefault(trade.vt_tradeid, [])
+        self.data_store.put_record(RecordType.TRADE_ACCEPTED, (trade.vt_tradeid,))
+
+        # send orders or push to order cache
+        if req:
+            self.send_order(req, trade.vt_tradeid)
+
+    def process_target_trade(self, trade: TradeData):
+        """"""
+        self.get_offset_converter(trade.gateway_name).update_trade(trade)
+
+        if not self.filter_target_not_follow(trade.vt_orderid):
+            self.write_log(f"{trade.vt_tradeid} 不是跟随策略的成交单。")
+            return
+        self.update_target_pos(trade)
+
     def process_timer_event(self, event: Event):
         """"""
         try:
+            self.check_price_board()
             self.send_queue_order()
+            self.process_pacers()
             self.cancel_timeout_order()
             # self.view_test_variables()
             self.refresh_pos()
+            self.data_store.check_snapshot()
+            self.auto_save_tradeids()
+            self.put_metrics_event()
             self.auto_save_trade()
         except:  # noqa
             msg = f"处理定时事件，触发异常：\n{traceback.format_exc()}"
             self.write_log(msg)
 
+    def process_contract_event(self, event: Event):
+        """
+        Refresh convert policy of contract in offset converters.
+        """
+        try:
+            contract = event.data
+            self.clear_symbol_meta(contract.vt_symbol)
+            self.contract_store.put_contracts([contract])
+            self.offset_converter.update_contract(contract)
+            for target in self.targets.values():
+                target.offset_converter.update_contract(contract)
+        except:  # noqa
+            msg = f"处理合约事件，触发异常：\n{traceback.format_exc()}"
+            self.write_log(msg)
+
+    def process_callback_event(self, event: Event):
+        """
+        Run function posted by thread of fan-out target in event thread.
+        """
+        try:
+            event.data()
+        except:  # noqa
+            msg = f"处理回调事件，触发异常：\n{traceback.format_exc()}"
+            self.write_log(msg)
+
+    def defer_target_event(self, event: Event):
+        """
+        Hold order or trade event of target gateway while its orders are being sent in its thread,
+        if the order is not recorded yet. Held events are processed again after orders recorded.
+        """
+        data = event.data
+        if not self.pending_sends.get(data.gateway_name, 0):
+            return False
+
+        if data.vt_orderid in self.orderid_tradeid_map:
+            return False
+
+        self.deferred_events[data.gateway_name].append(event)
+        return True
+
+    def replay_deferred_events(self, gateway_name: str):
+        """"""
+        events = self.deferred_events.pop(gateway_name, [])
+        for event in events:
+            if event.type == EVENT_ORDER:
+                self.process_order_event(event)
+            else:
+                self.process_trade_event(event)
+
     def process_position_event(self, event: Event):
         """
         update source gateway position and target gateway offset converter position
@@ -593,7 +1221,7 @@ class FollowEngine(BaseEngine):
             if position.gateway_name == self.source_gateway_name:
                 self.update_source_pos(position)
             else:
-                self.offset_converter.update_position(position)
+                self.get_offset_converter(position.gateway_name).update_position(position)
         except:  # noqa
             msg = f"处理持仓事件，触发异常：\n{traceback.format_exc()}"
             self.write_log(msg)
@@ -607,32 +1235,121 @@ class FollowEngine(BaseEngine):
             if self.subscribe(vt_symbol):
                 self.write_log(f"{vt_symbol}行情订阅请求已发送")
 
+    def schedule_order_timeout(self, vt_orderid: str):
+        """
+        Set deadline of active order, which is cancelled after cancel_order_timeout seconds.
+        """
+        deadline = monotonic() + self.cancel_order_timeout
+        self.order_deadlines[vt_orderid] = deadline
+        heapq.heappush(self.deadline_heap, (deadline, vt_orderid))
+
     def cancel_timeout_order(self):
         """
         Cancel active order if timeout exceed specified value.
+        Only orders whose deadline is due are popped from heap, so it's cheap to call on every tick.
         """
-        for vt_orderid, counter in self.active_order_counter.items():
-            print("counter:", vt_orderid, counter)
-            if counter is None:
+        heap = self.deadline_heap
+        if not heap:
+            return
+
+        # Drop stale items if orders finished quickly and heap is mostly stale.
+        if len(heap) > 2 * len(self.order_deadlines) + 64:
+            heap = [(deadline, vt_orderid) for vt_orderid, deadline in self.order_deadlines.items()]
+            heapq.heapify(heap)
+            self.deadline_heap = heap
+
+        now = monotonic()
+        while heap and heap[0][0] <= now:
+            deadline, vt_orderid = heapq.heappop(heap)
+
+            # Skip stale item of finished or rescheduled order
+            if self.order_deadlines.get(vt_orderid, None) != deadline:
                 continue
 
-            if counter > self.cancel_order_timeout:
-                self.cancel_order(vt_orderid)
-                self.active_order_counter[vt_orderid] = 0
-                self.write_log(f"委托单{vt_orderid} 超过最大等待时间，已执行撤单。")
+            self.cancel_order(vt_orderid)
+            self.timeout_orderids.add(vt_orderid)
+            if self.metrics_enabled:
+                self.metrics.incr("timeout_cancel")
+            self.write_log(f"委托单{vt_orderid} 超过最大等待时间，已执行撤单。")
+
+            # Cancel again later if order is still active
+            self.schedule_order_timeout(vt_orderid)
+
+    def chase_order(self, order: OrderData):
+        """
+        Resend remaining volume of order cancelled for timeout with latest price.
+        """
+        chase_count = self.chase_counts.pop(order.vt_orderid, 0)
+        if not self.is_active or chase_count >= self.chase_order_count:
+            return
+
+        volume = order.volume - order.traded
+        if volume <= 0:
+            return
+
+        vt_tradeid, _ = self.get_order_source(order.vt_orderid)
+        req = OrderRequest(
+            symbol=order.symbol,
+            exchange=order.exchange,
+            direction=order.direction,
+            type=OrderType.LIMIT,
+            volume=volume,
+            price=0,
+            offset=order.offset
+        )
 
-            self.active_order_counter[vt_orderid] += 1
+        target = self.targets.get(order.gateway_name, None)
+        self.send_chase_order(req, vt_tradeid, chase_count + 1, target)
+
+    def send_chase_order(
+        self,
+        req: OrderRequest,
+        vt_tradeid: str,
+        chase_count: int,
+        target: FollowTarget = None
+    ):
+        """
+        Send chase order, orders are appended to record of vt_tradeid when sent.
+        vt_tradeid here is the recorded one, already with suffix of fan-out target.
+        Chase order waits in order queue if price is not ready, e.g. prices on board expired.
+        """
+        vt_symbol = req.vt_symbol
+        if not self.is_price_inited(vt_symbol):
+            self.subscribe(vt_symbol)
+            self.due_out_reqs[vt_symbol].append((vt_tradeid, req, target, chase_count))
+            self.write_log(f"{vt_tradeid}追单行情未就绪，已进入发单队列")
+            return
+
+        self.convert_and_send_orders(req, target, vt_tradeid, chase_count)
+
+    def append_follow_orders(self, vt_tradeid: str, vt_orderids: list):
+        """
+        Append vt_orderids to record of vt_tradeid.
+        """
+        # New list, so snapshot thread never sees a list being changed.
+        all_vt_orderids = self.tradeid_orderids_dict.get(vt_tradeid, []) + vt_orderids
+        self.tradeid_orderids_dict[vt_tradeid] = all_vt_orderids
+        self.update_orderid_index(vt_tradeid, vt_orderids)
+        self.data_store.put_record(RecordType.ORDERS_SENT, (vt_tradeid, tuple(all_vt_orderids)))
 
     def refresh_pos(self):
         """
-        Put pos delta event regularly.
+        Put pos delta snapshot of changed symbols regularly.
         """
-        if self.refresh_pos_interval > 3:
-            for vt_symbol in self.positions:
-                # print('refresh', vt_symbol)
-                self.put_pos_delta_event(vt_symbol)
-            self.refresh_pos_interval = 0
-        self.refresh_pos_interval += 1
+        # pos delta of all symbols changed with follow parameters
+        params = (self.multiples, self.inverse_follow)
+        if params != self.pos_delta_params or self.pos_snapshot_requested:
+            self.positions.mark_all_changed()
+            self.pos_delta_params = params
+            self.pos_snapshot_requested = False
+
+        self.put_pos_snapshot_event()
+
+    def request_pos_snapshot(self):
+        """
+        Put all symbols in next pos snapshot, e.g. monitor created after engine started.
+        """
+        self.pos_snapshot_requested = True
 
     def view_pos(self):
         """
@@ -682,9 +1399,8 @@ class FollowEngine(BaseEngine):
         """
         Create symbol pos dict.
         """
-        self.positions[vt_symbol] = {}
-        for pos_key in self.pos_key:
-            self.positions[vt_symbol][pos_key] = 0
+        self.positions.add(vt_symbol)
+        self.put_pos_record(vt_symbol)
 
     def update_source_pos(self, position: PositionData):
         """
@@ -699,17 +1415,27 @@ class FollowEngine(BaseEngine):
         else:
             symbol_pos = self.positions[vt_symbol]
             if position.direction == Direction.LONG:
-                symbol_pos['source_long'] = position.volume
+                name = 'source_long'
             else:
-                symbol_pos['source_short'] = position.volume
+                name = 'source_short'
+
+            if symbol_pos[name] == position.volume:
+                return
+            symbol_pos[name] = position.volume
 
             symbol_pos['source_net'] = symbol_pos['source_long'] - symbol_pos['source_short']
             symbol_pos['net_delta'] = symbol_pos['source_net'] * self.multiples - symbol_pos['target_net']
+            self.put_pos_record(vt_symbol, name, 'source_net', 'net_delta')
 
     def update_target_pos(self, trade: TradeData):
         """
         Update pos in target gateway
         """
+        target = self.targets.get(trade.gateway_name, None)
+        if target:
+            self.update_fanout_target_pos(trade, target)
+            return
+
         vt_symbol = trade.vt_symbol
         if self.positions.get(vt_symbol, None) is None:
             self.init_symbol_pos(vt_symbol)
@@ -727,10 +1453,34 @@ class FollowEngine(BaseEngine):
         symbol_pos['target_net'] = symbol_pos['target_long'] - symbol_pos['target_short']
         symbol_pos['net_delta'] = symbol_pos['source_net'] * self.multiples - symbol_pos['target_net']
 
-        self.save_follow_data()
-        self.put_pos_delta_event(vt_symbol)
+        self.data_store.put_record(RecordType.TARGET_FILL, (trade.vt_tradeid, vt_symbol, dict(symbol_pos.items())))
         self.write_log(f"{vt_symbol}仓位更新成功")
 
+    def update_fanout_target_pos(self, trade: TradeData, target: FollowTarget):
+        """
+        Update pos in fan-out target gateway
+        """
+        vt_symbol = trade.vt_symbol
+        symbol_pos = target.positions.get(vt_symbol, None)
+        if symbol_pos is None:
+            symbol_pos = {pos_key: 0 for pos_key in self.pos_key}
+            target.positions[vt_symbol] = symbol_pos
+
+        trade_type = self.get_trade_type(trade)
+        if trade_type == TradeType.BUY:
+            symbol_pos['target_long'] += trade.volume
+        elif trade_type == TradeType.SHORT:
+            symbol_pos['target_short'] += trade.volume
+        elif trade_type == TradeType.SELL:
+            symbol_pos['target_long'] -= trade.volume
+        else:
+            symbol_pos['target_short'] -= trade.volume
+        symbol_pos['target_net'] = symbol_pos['target_long'] - symbol_pos['target_short']
+
+        payload = (target.gateway_name, vt_symbol, copy(symbol_pos))
+        self.data_store.put_record(RecordType.TARGET_POS, payload)
+        self.write_log(f"{target.gateway_name} {vt_symbol}仓位更新成功")
+
     def subscribe(self, vt_symbol: str):
         """
         Subscribe to get latest price and limit price.
@@ -739,6 +1489,8 @@ class FollowEngine(BaseEngine):
         if contract:
             req = SubscribeRequest(symbol=contract.symbol, exchange=contract.exchange)
             self.main_engine.subscribe(req, self.source_gateway_name)
+            self.register_tick_event(vt_symbol)
+            self.get_symbol_meta(vt_symbol)
             return True
 
     def init_limited_price(self, tick: TickData):
@@ -760,19 +1512,98 @@ class FollowEngine(BaseEngine):
         vt_symbol = tick.vt_symbol
         if self.latest_prices.get(vt_symbol, None) is None:
             self.latest_prices[vt_symbol] = {}
+        self.board_symbols.discard(vt_symbol)
         self.latest_prices[vt_symbol]['bid_price'] = tick.bid_price_1
         self.latest_prices[vt_symbol]['ask_price'] = tick.ask_price_1
 
-    def is_timeout_trade(self, trade: TradeData):
+    def open_price_board(self, quiet: bool = False):
+        """
+        Open shared price board in writer or reader mode.
+        Reader retries in timer if board is not created by writer yet.
+        """
+        if self.price_board_mode == PriceBoardMode.NONE or self.price_board:
+            return
+
+        board = PriceBoard(
+            get_file_path(self.price_board_file),
+            writer=self.price_board_mode == PriceBoardMode.WRITER
+        )
+        if board.open():
+            self.price_board = board
+            self.write_log(f"共享行情板打开成功，模式：{self.price_board_mode.value}，合约数：{board.count}")
+        elif not quiet:
+            self.write_log(f"共享行情板{self.price_board_file}尚未就绪，将定时重试")
+
+    def is_price_board_writer(self):
+        """"""
+        return self.price_board_mode == PriceBoardMode.WRITER
+
+    def check_price_board(self):
+        """"""
+        if self.price_board_mode == PriceBoardMode.READER and not self.price_board:
+            self.open_price_board(quiet=True)
+
+    def close_price_board(self):
+        """"""
+        if self.price_board:
+            self.price_board.close()
+            self.price_board = None
+
+    def load_board_price(self, vt_symbol: str):
+        """
+        Update limited price and latest price of symbol from shared price board.
+        Return False if symbol not on board or prices on board expired.
+        """
+        if not self.price_board or self.price_board.writer:
+            return False
+
+        expire_time = 0
+        if self.price_board_expire:
+            expire_time = datetime.now().timestamp() - self.price_board_expire
+
+        data = self.price_board.read(vt_symbol, expire_time)
+        if not data:
+            # Prices loaded from board before are expired too
+            if vt_symbol in self.board_symbols:
+                self.board_symbols.remove(vt_symbol)
+                self.latest_prices.pop(vt_symbol, None)
+            return False
+
+        _, _, bid_price, ask_price, limit_up, limit_down = data
+        # Limits change every trading day, so always take them from board
+        self.limited_prices[vt_symbol] = {
+            'limit_up': limit_up,
+            'limit_down': limit_down
+        }
+        self.board_symbols.add(vt_symbol)
+        self.latest_prices[vt_symbol] = {
+            'bid_price': bid_price,
+            'ask_price': ask_price
+        }
+        return True
+
+    def update_pricer(self, tick: TickData):
+        """"""
+        meta = self.get_symbol_meta(tick.vt_symbol)
+        if meta:
+            self.pricer.update_tick(tick, meta.pricetick)
+
+    def get_pricer_stats(self):
+        """
+        Spread, top of book volume and fill rate of symbols used by adaptive pricer.
+        """
+        return self.pricer.get_stats()
+
+    def is_timeout_trade(self, trade: TradeData, quiet: bool = False):
         """
         If trade happened a specified period of time before now, it usually happened if take a long time to reconnect.
         Because trade is not in self.vt_tradeids(if app don't restart). so it can't be filtered by self.vt_tradeids
         """
         now = self.get_current_time()
-        trade_time = datetime.strptime(trade.time, '%H:%M:%S')
-        trade_time = trade_time.replace(year=now.year, month=now.month, day=now.day)
+        trade_time = datetime.combine(now.date(), time.fromisoformat(trade.time))
         if now - trade_time > timedelta(seconds=self.filter_trade_timeout):
-            self.write_log(f"{trade.vt_tradeid} 成交时间：{trade.time} 超过跟单有效期。")
+            if not quiet:
+                self.write_log(f"{trade.vt_tradeid} 成交时间：{trade.time} 超过跟单有效期。")
             return True
         else:
             return False
@@ -812,17 +1643,37 @@ class FollowEngine(BaseEngine):
 
     def filter_target_not_follow(self, vt_orderid: str):
         """"""
-        for sub_list in self.tradeid_orderids_dict.values():
-            for orderid in sub_list:
-                if vt_orderid == orderid:
-                    return True
+        return vt_orderid in self.orderid_tradeid_map
+
+    def get_order_source(self, vt_orderid: str):
+        """
+        Get (vt_tradeid, FollowOrderType) of follow order, None if not sent by follow engine.
+        """
+        return self.orderid_tradeid_map.get(vt_orderid, None)
+
+    def update_orderid_index(self, vt_tradeid: str, vt_orderids: list):
+        """
+        Map vt_orderids of follow order to source vt_tradeid.
+        """
+        order_type = self.get_follow_order_type(vt_tradeid)
+        for vt_orderid in vt_orderids:
+            self.orderid_tradeid_map[vt_orderid] = (vt_tradeid, order_type)
 
-    def validate_target_pos(self, req: OrderRequest):
+    def rebuild_orderid_index(self):
+        """
+        Rebuild vt_orderid index from tradeid_orderids_dict.
+        """
+        self.orderid_tradeid_map.clear()
+        for vt_tradeid, vt_orderids in self.tradeid_orderids_dict.items():
+            self.update_orderid_index(vt_tradeid, vt_orderids)
+
+    def validate_target_pos(self, req: OrderRequest, target: FollowTarget = None):
         """
         Validate symbol pos in target gateway.
         """
         vt_symbol = req.vt_symbol
-        symbol_pos = self.positions.get(vt_symbol, None)
+        positions = target.positions if target else self.positions
+        symbol_pos = positions.get(vt_symbol, None)
         if symbol_pos is None:
             self.write_log(f"{vt_symbol} 跟随策略该品种的仓位不存在。")
             return
@@ -847,12 +1698,16 @@ class FollowEngine(BaseEngine):
         self,
         vt_symbol: str,
         direction: Direction,
-        price: float = 0
+        price: float = 0,
+        volume: float = 0,
+        chase_count: int = 0
     ):
         """
         Make sure price is in limit-up and limit-down range.
+        Ticks added to price is tick_add, or chosen by adaptive pricer if adaptive_price.
         """
         # call this function only self.is_price_inited() is True.
+        self.load_board_price(vt_symbol)
         limit_price = self.limited_prices.get(vt_symbol)
         latest_prices = self.latest_prices.get(vt_symbol)
 
@@ -864,27 +1719,35 @@ class FollowEngine(BaseEngine):
         else:
             bid_price = latest_prices['bid_price']
 
-        contract = self.main_engine.get_contract(vt_symbol)
+        pricetick = self.get_symbol_meta(vt_symbol).pricetick
+        if self.adaptive_price:
+            tick_add = self.pricer.get_cross_ticks(vt_symbol, direction, volume, chase_count)
+        else:
+            tick_add = self.tick_add
+
         if direction == Direction.LONG:
             price = ask_price if not price else price
             # If market price type or market price in manual order (when price is set to -1)
             if self.order_type == OrderType.MARKET or price == -1:
                 price = limit_price['limit_up']
             else:
-                price = min(limit_price['limit_up'], price + self.tick_add * contract.pricetick)
+                price = min(limit_price['limit_up'], price + tick_add * pricetick)
         else:
             price = bid_price if not price else price
             if self.order_type == OrderType.MARKET or price == -1:
                 price = limit_price['limit_down']
             else:
-                price = max(limit_price['limit_down'], price - self.tick_add * contract.pricetick)
+                price = max(limit_price['limit_down'], price - tick_add * pricetick)
 
         return price
 
-    def convert_trade_to_order_req(self, trade: TradeData):
+    def convert_trade_to_order_req(self, trade: TradeData, target: FollowTarget = None):
         """
         Trade convert to order request
         """
+        multiples = target.multiples if target else self.multiples
+        inverse_follow = target.inverse_follow if target else self.inverse_follow
+
         if trade.offset == Offset.NONE:
             self.write_log(f"{trade.vt_tradeid} offset为None，非CTP正常成交单。")
             return
@@ -901,110 +1764,319 @@ class FollowEngine(BaseEngine):
             price=trade.price,
             offset=trade.offset
         )
-        req.volume = req.volume * self.multiples
+        req.volume = req.volume * multiples
 
-        if self.inverse_follow:
+        if inverse_follow:
             req = self.inverse_req(req)
 
         # T0 symbol use lock mode, redirect.
-        if self.strip_digit(trade.vt_symbol) in self.intraday_symbols:
+        if self.is_intra_day_symbol(trade.vt_symbol):
             return req
 
         # Normal mode, check position if close
         if trade.offset != Offset.OPEN:
             req.offset = Offset.CLOSE
-            return self.validate_target_pos(req)
+            return self.validate_target_pos(req, target)
         else:
             return req
 
+    def follow_trade_to_target(self, trade: TradeData, target: FollowTarget):
+        """
+        Follow source trade in fan-out target gateway.
+        """
+        req = self.convert_trade_to_order_req(trade, target)
+        if not req:
+            return False
+
+        self.send_order(req, trade.vt_tradeid, target)
+        return True
+
     def is_price_inited(self, vt_symbol: str):
         """
         Check if limited price and latest price ready.
         """
+        # Prices loaded from board are checked again, they may be expired now
+        if vt_symbol in self.board_symbols:
+            return self.load_board_price(vt_symbol)
+
         if self.limited_prices.get(vt_symbol, None) and self.latest_prices.get(vt_symbol, None):
             return True
         else:
-            return False
+            return self.load_board_price(vt_symbol)
 
     def send_order(
         self,
         req: OrderRequest,
-        vt_tradeid: str
+        vt_tradeid: str,
+        target: FollowTarget = None
     ):
         """
-        Send order to order queue.
+        Send order directly if price is ready in immediate mode, otherwise push to order queue of symbol.
         """
-        if not self.is_price_inited(req.vt_symbol):
-            self.subscribe(req.vt_symbol)
-            self.write_log(f"{req.vt_symbol}订阅请求已发送。")
-        self.due_out_req_list.append((vt_tradeid, req))
+        vt_symbol = req.vt_symbol
+        if not self.is_price_inited(vt_symbol):
+            self.subscribe(vt_symbol)
+            self.write_log(f"{vt_symbol}订阅请求已发送。")
+        elif self.dispatch_mode == DispatchMode.IMMEDIATE and vt_symbol not in self.due_out_reqs:
+            self.dispatch_order(req, vt_tradeid, target)
+            return
+
+        self.due_out_reqs[vt_symbol].append((vt_tradeid, req, target, 0))
         self.write_log(f"{vt_tradeid}核验通过，已进入发单队列")
 
     def send_queue_order(self):
         """
         Send order in queue after limited price is ready.
         """
-        if not self.due_out_req_list:
+        if not self.due_out_reqs:
             return
 
-        for req_tuple in copy(self.due_out_req_list):
-            vt_tradeid, req = req_tuple
-            if not self.is_price_inited(req.vt_symbol):
-                print('Limit unready in send queue order event')
-                continue
+        for vt_symbol in list(self.due_out_reqs.keys()):
+            if self.is_price_inited(vt_symbol):
+                self.send_symbol_queue_order(vt_symbol)
 
-            self.send_and_record(req, vt_tradeid)
-            self.due_out_req_list.remove(req_tuple)
+    def send_symbol_queue_order(self, vt_symbol: str):
+        """
+        Send all queued orders of vt_symbol. Call this function only self.is_price_inited() is True.
+        """
+        req_list = self.due_out_reqs.pop(vt_symbol, [])
+        for vt_tradeid, req, target, chase_count in req_list:
+            if chase_count:
+                self.send_chase_order(req, vt_tradeid, chase_count, target)
+            else:
+                self.dispatch_order(req, vt_tradeid, target)
+
+    def dispatch_order(self, req: OrderRequest, vt_tradeid: str, target: FollowTarget = None):
+        """
+        Orders of fan-out target are sent to gateway in its own thread by send_batch.
+        """
+        self.send_and_record(req, vt_tradeid, target)
+
+    def get_queue_order_count(self):
+        """
+        Get count of orders waiting in queue.
+        """
+        return sum(len(req_list) for req_list in self.due_out_reqs.values())
 
     def send_and_record(
         self,
         req: OrderRequest,
-        vt_tradeid: str
+        vt_tradeid: str,
+        target: FollowTarget = None
     ):
         """
-        Send and record result.
+        Send orders of req, they are recorded to vt_tradeid by on_order_sent when sent.
         """
-        req.price = self.convert_order_price(req.vt_symbol, req.direction, req.price)
-        vt_orderids = self.convert_and_send_orders(req)
-        if vt_orderids:
-            self.tradeid_orderids_dict[vt_tradeid] = vt_orderids
-            if vt_tradeid.startswith('SYNC'):
-                order_prefix = "同步单"
-            elif vt_tradeid.startswith('BASIC'):
-                order_prefix = "底仓单"
-            else:
-                order_prefix = "跟随单"
+        if target:
+            vt_tradeid = target.get_record_tradeid(vt_tradeid)
 
-            self.write_log(f"{order_prefix} {vt_tradeid}发单成功，委托号：{'  '.join(vt_orderids)}。")
+        return self.convert_and_send_orders(req, target, vt_tradeid)
 
-            # Save data to file
-            self.save_follow_data()
-            # self.write_log(f"{order_prefix} {vt_tradeid}记录保存成功。")
-        return vt_orderids
-
-    def convert_and_send_orders(self, req: OrderRequest):
+    def convert_and_send_orders(
+        self,
+        req: OrderRequest,
+        target: FollowTarget = None,
+        vt_tradeid: str = "",
+        chase_count: int = 0
+    ):
         """
-        Convert a req to req list and send order to gateway.
+        Price and convert a req to req list, then send orders to gateway through its pacer. Return count of orders.
+
+        Orders not sent at once, delayed by rate limit or sent in thread of fan-out target, are frozen
+        in offset converter with pending orderids until sent, so following orders never close the
+        same position twice.
         """
-        lock = True if self.strip_digit(req.vt_symbol) in self.intraday_symbols else False
+        if target:
+            offset_converter = target.offset_converter
+            gateway_name = target.gateway_name
+        else:
+            offset_converter = self.offset_converter
+            gateway_name = self.target_gateway_name
+
+        base_price = req.price
+        req.price = self.convert_order_price(req.vt_symbol, req.direction, base_price, req.volume, chase_count)
 
-        req_list = self.offset_converter.convert_order_request(req, lock=lock)
+        lock = self.is_intra_day_symbol(req.vt_symbol)
+
+        req_list = offset_converter.convert_order_request(req, lock=lock)
         if not req_list:
             self.write_log("委托单转换模块转换失败，可能是目标账户实际可用仓位不足。")
+            return 0
+
+        # split req
+        splited_req_list = []
+        for req in req_list:
+            splited_req_list.extend(self.split_req(req, target))
+
+        items = [
+            (splited_req, SendingOrder(vt_tradeid, chase_count, target, base_price))
+            for splited_req in splited_req_list
+        ]
+
+        pacer = self.get_pacer(gateway_name)
+        batch = pacer.put_orders(items)
+
+        # Orders not sent in event thread now are frozen until sent
+        pending_items = items if target else items[len(batch):]
+        for splited_req, sending in pending_items:
+            sending.pending_vt_orderid = self.freeze_pending_order(offset_converter, splited_req, gateway_name)
+
+        queue_count = len(items) - len(batch)
+        if queue_count:
+            self.write_log(f"{vt_tradeid} {queue_count}笔委托超过发单频率限制，已进入限速队列。")
+            if self.metrics_enabled:
+                self.metrics.incr("order_paced", queue_count)
+
+        self.send_batch(pacer, batch, target)
+        return len(items)
+
+    def freeze_pending_order(self, offset_converter: OffsetConverter, req: OrderRequest, gateway_name: str):
+        """
+        Freeze position of order not sent yet in offset converter, return pending vt_orderid.
+        """
+        self.pending_order_count += 1
+        pending_vt_orderid = f"{gateway_name}.{PENDING_ORDERID_PREFIX}{self.pending_order_count}"
+        offset_converter.update_order_request(req, pending_vt_orderid)
+        return pending_vt_orderid
+
+    @staticmethod
+    def release_pending_order(
+        offset_converter: OffsetConverter,
+        req: OrderRequest,
+        pending_vt_orderid: str,
+        vt_orderid: str
+    ):
+        """
+        Replace pending order with the order sent in offset converter.
+        """
+        gateway_name, orderid = pending_vt_orderid.split(".")
+        pending_order = req.create_order_data(orderid, gateway_name)
+        pending_order.status = Status.CANCELLED
+        offset_converter.update_order(pending_order)
+
+        if vt_orderid:
+            offset_converter.update_order_request(req, vt_orderid)
+
+    def send_batch(self, pacer: OrderPacer, items: list, target: FollowTarget = None):
+        """
+        Send orders taken from pacer, in event thread for main target, or in thread of fan-out target.
+        """
+        if not items:
             return
 
+        reqs = [req for req, _ in items]
+        if not target:
+            vt_orderids = pacer.send_reqs(reqs)
+            self.on_batch_sent(items, vt_orderids)
+            return
+
+        self.pending_sends[target.gateway_name] += 1
+        future = target.executor.submit(pacer.send_reqs, reqs)
+        future.add_done_callback(partial(self.on_target_batch_done, target, items))
+
+    def on_target_batch_done(self, target: FollowTarget, items: list, future: Future):
+        """
+        Called in thread of fan-out target, post result back to event thread.
+        """
+        callback = partial(self.process_target_batch_result, target, items, future)
+        self.event_engine.put(Event(EVENT_FOLLOW_CALLBACK, callback))
+
+    def process_target_batch_result(self, target: FollowTarget, items: list, future: Future):
+        """
+        Record orders sent by fan-out target, then process its events held before recorded.
+        """
+        self.pending_sends[target.gateway_name] -= 1
+
         vt_orderids = []
-        for req in req_list:
-            # split req
-            splited_req_list = self.split_req(req)
-            for splited_req in splited_req_list:
-                vt_orderid = self.main_engine.send_order(splited_req, self.target_gateway_name)
-                if not vt_orderid:
-                    continue
-                vt_orderids.append(vt_orderid)
-                self.offset_converter.update_order_request(splited_req, vt_orderid)
+        if future.cancelled():
+            self.write_log(f"扇出接口{target.gateway_name}发单已取消。")
+        elif future.exception():
+            exception = future.exception()
+            text = "".join(traceback.format_exception(type(exception), exception, exception.__traceback__))
+            self.write_log(f"扇出接口{target.gateway_name}发单，触发异常：\n{text}")
+        else:
+            vt_orderids = future.result()
+
+        self.on_batch_sent(items, vt_orderids)
+        self.replay_deferred_events(target.gateway_name)
+
+    def on_batch_sent(self, items: list, vt_orderids: list):
+        """"""
+        vt_orderids = list(vt_orderids) + [""] * (len(items) - len(vt_orderids))
+        for (req, sending), vt_orderid in zip(items, vt_orderids):
+            self.on_order_sent(req, sending, vt_orderid)
+
+    def on_order_sent(self, req: OrderRequest, sending: SendingOrder, vt_orderid: str):
+        """
+        Record order sent, vt_orderid is empty if sending failed. Called in event thread.
+        """
+        vt_tradeid = sending.vt_tradeid
+        chase_count = sending.chase_count
+        target = sending.target
+
+        offset_converter = target.offset_converter if target else self.offset_converter
+        if sending.pending_vt_orderid:
+            self.release_pending_order(offset_converter, req, sending.pending_vt_orderid, vt_orderid)
+        elif vt_orderid:
+            offset_converter.update_order_request(req, vt_orderid)
+
+        if not vt_orderid:
+            self.write_log(f"{vt_tradeid}发单失败，{req.vt_symbol} {req.direction.value}{req.offset.value} {req.volume}。")
+            if self.metrics_enabled:
+                self.metrics.incr("order_failed")
+            return
+
+        if chase_count:
+            self.chase_counts[vt_orderid] = chase_count
+        self.append_follow_orders(vt_tradeid, [vt_orderid])
 
-        return vt_orderids
+        if chase_count:
+            self.write_log(f"{vt_tradeid}第{chase_count}次追单成功，委托号：{vt_orderid}。")
+        else:
+            order_prefix = self.get_follow_order_type(vt_tradeid).value
+            self.write_log(f"{order_prefix} {vt_tradeid}发单成功，委托号：{vt_orderid}。")
+
+        if self.metrics_enabled:
+            self.metrics.incr("order_sent")
+            if chase_count:
+                self.metrics.incr("chase_order")
+
+    def get_pacer(self, gateway_name: str):
+        """"""
+        pacer = self.pacers.get(gateway_name, None)
+        if not pacer:
+            pacer = OrderPacer(self.main_engine, gateway_name, self.order_rate_limit, self.symbol_rate_limit)
+            self.pacers[gateway_name] = pacer
+        else:
+            pacer.set_rate(self.order_rate_limit, self.symbol_rate_limit)
+        return pacer
+
+    def process_pacers(self):
+        """
+        Send orders delayed by rate limit, orders of fan-out target are sent in its own thread.
+        Delayed orders are priced again with latest prices.
+        """
+        for gateway_name, pacer in self.pacers.items():
+            if not pacer.get_queue_size():
+                continue
+
+            items = pacer.take_queued()
+            for req, sending in items:
+                if self.is_price_inited(req.vt_symbol):
+                    req.price = self.convert_order_price(
+                        req.vt_symbol,
+                        req.direction,
+                        sending.base_price,
+                        req.volume,
+                        sending.chase_count
+                    )
+            self.send_batch(pacer, items, self.targets.get(gateway_name, None))
+
+    def get_pacer_stats(self):
+        """
+        Get throughput and queueing delay of each gateway.
+        """
+        return [pacer.get_stats() for pacer in self.pacers.values()]
 
     def cancel_order(self, vt_orderid: str):
         """
@@ -1019,13 +2091,16 @@ class FollowEngine(BaseEngine):
         self.main_engine.cancel_order(req, order.gateway_name)
         self.write_log(f"委托号{vt_orderid}撤单请求已报。")
 
-    def cancel_all_order(self, vt_symbol: str = ""):
+    def cancel_all_order(self, vt_symbol: str = "", all_targets: bool = False):
         """
-        Cancel all active orders or orders of vt_symbol in target gateway
+        Cancel all active orders or orders of vt_symbol in target gateway, include fan-out targets if all_targets.
         """
         active_orders = self.main_engine.get_all_active_orders(vt_symbol)
 
-        target_orders = [order for order in active_orders if order.gateway_name == self.target_gateway_name]
+        gateway_names = {self.target_gateway_name}
+        if all_targets:
+            gateway_names.update(self.targets.keys())
+        target_orders = [order for order in active_orders if order.gateway_name in gateway_names]
         for order in target_orders:
             self.cancel_order(order.vt_orderid)
 
@@ -1065,11 +2140,32 @@ class FollowEngine(BaseEngine):
         net_pos_delta = delta if not self.inverse_follow else (- delta)
         return net_pos_delta
 
+    def get_all_pos_delta(self):
+        """
+        Calculate long, short and net pos delta of all symbols in one pass.
+        Return arrays in the order of self.positions.symbols.
+        """
+        table = self.positions
+        target_net = table.get_column('target_long') - table.get_column('target_short')
+
+        if not self.inverse_follow:
+            long_pos_delta = table.get_column('source_long') * self.multiples - table.get_column('target_long')
+            short_pos_delta = table.get_column('source_short') * self.multiples - table.get_column('target_short')
+        else:
+            long_pos_delta = table.get_column('source_short') * self.multiples - table.get_column('target_long')
+            short_pos_delta = table.get_column('source_long') * self.multiples - table.get_column('target_short')
+
+        net_pos_delta = table.get_column('source_net') * self.multiples - target_net
+        if self.inverse_follow:
+            net_pos_delta = -net_pos_delta
+
+        return long_pos_delta, short_pos_delta, net_pos_delta
+
     def sync_net_pos_delta(self, vt_symbol: str, is_sync_basic: bool = False):
         """
         If contract is intra-day mode. Only can sync by net pos.
         """
-        if self.strip_digit(vt_symbol) in self.intraday_symbols:
+        if self.is_intra_day_symbol(vt_symbol):
             symbol_pos = self.positions.get(vt_symbol, None)
             net_pos_delta = self.get_net_pos_delta(vt_symbol)
             if not is_sync_basic:
@@ -1087,13 +2183,14 @@ class FollowEngine(BaseEngine):
             if is_sync_basic:
                 symbol_pos = self.positions.get(vt_symbol, None)
                 symbol_pos['basic_delta'] = 0
+                self.put_pos_record(vt_symbol, 'basic_delta')
         else:
             self.write_log(f"{vt_symbol}不是日内模式。")
 
 
     def sync_open_pos(self, vt_symbol: str):
         """"""
-        if self.strip_digit(vt_symbol) in self.intraday_symbols:
+        if self.is_intra_day_symbol(vt_symbol):
             self.write_log(f"{vt_symbol}是日内模式，只支持同步净仓。")
             return
 
@@ -1114,7 +2211,7 @@ class FollowEngine(BaseEngine):
 
     def sync_close_pos(self, vt_symbol: str):
         """"""
-        if self.strip_digit(vt_symbol) in self.intraday_symbols:
+        if self.is_intra_day_symbol(vt_symbol):
             self.write_log(f"{vt_symbol}是日内模式，只支持同步净仓。")
             return
 
@@ -1146,8 +2243,99 @@ class FollowEngine(BaseEngine):
 
     def sync_all_pos(self):
         """Sync pos of all non-empty contract"""
-        for vt_symbol in list(self.positions.keys()):
-            self.sync_pos(vt_symbol)
+        plan = self.plan_sync_all()
+        self.execute_sync_plan(plan)
+
+    def plan_sync_all(self):
+        """
+        Build sync plan of all symbols from one snapshot of positions and active orders.
+        Nothing is sent, so it can be used as dry run.
+        """
+        symbols = list(self.positions.symbols)
+        long_pos_delta, short_pos_delta, _ = self.get_all_pos_delta()
+        long_pos_delta = long_pos_delta.copy()
+        short_pos_delta = short_pos_delta.copy()
+
+        intraday = np.zeros(len(symbols), dtype=bool)
+        for row in np.flatnonzero((long_pos_delta != 0) | (short_pos_delta != 0)):
+            intraday[row] = self.is_intra_day_symbol(symbols[row])
+
+        active_orders = self.main_engine.get_all_active_orders()
+        target_orders = [order for order in active_orders if order.gateway_name == self.target_gateway_name]
+
+        return build_sync_plan(
+            symbols,
+            long_pos_delta,
+            short_pos_delta,
+            intraday,
+            group_orders_by_symbol(target_orders)
+        )
+
+    def simulate_orders(self, reqs: list, gateway_name: str = ""):
+        """
+        Simulate offset convert of reqs in target gateway (or fan-out gateway) without changing state.
+        """
+        lock_symbols = {req.vt_symbol for req in reqs if self.is_intra_day_symbol(req.vt_symbol)}
+        offset_converter = self.get_offset_converter(gateway_name)
+        return offset_converter.simulate_order_requests(reqs, lock_symbols)
+
+    def simulate_sync_plan(self, plan: SyncPlan):
+        """
+        Simulate offset convert of orders in sync plan, return one SimulationStep per order.
+        Step is None if contract of order not found.
+        """
+        reqs = []
+        rows = []
+        for row, order in enumerate(plan.orders):
+            contract = self.main_engine.get_contract(order.vt_symbol)
+            if not contract:
+                continue
+
+            req = OrderRequest(
+                symbol=contract.symbol,
+                exchange=contract.exchange,
+                direction=order.direction,
+                type=OrderType.LIMIT,
+                volume=order.volume,
+                offset=order.offset
+            )
+            reqs.append(req)
+            rows.append(row)
+
+        steps = [None] * len(plan.orders)
+        for row, step in zip(rows, self.simulate_orders(reqs)):
+            steps[row] = step
+        return steps
+
+    def execute_sync_plan(self, plan: SyncPlan):
+        """
+        Cancel orders of plan, then send sync orders.
+        """
+        for vt_symbol in plan.skipped_symbols:
+            self.write_log(f"{vt_symbol}是日内模式，只支持同步净仓。")
+
+        if plan.is_empty():
+            self.write_log("源账户与目标户仓位一致，无需同步。")
+            return
+
+        for vt_orderid in plan.cancel_orderids:
+            self.cancel_order(vt_orderid)
+
+        for order in plan.orders:
+            if not self.main_engine.get_contract(order.vt_symbol):
+                self.write_log(f"{order.vt_symbol}合约信息不存在，跳过同步。")
+                continue
+
+            self.send_sync_order_req(
+                order.vt_symbol,
+                order.direction,
+                order.volume,
+                0,
+                order.offset,
+                market_price=False,
+                is_basic=False
+            )
+        self.write_log(f"全部持仓同步已执行，{plan.get_summary()}")
 
     def send_sync_order_req(
         self,
@@ -1249,23 +2437,29 @@ class FollowEngine(BaseEngine):
             else:
                 self.write_log(f"平仓手数超出最大已对冲仓位。")
 
-
-    def put_pos_delta_event(self, vt_symbol: str):
+    def put_pos_snapshot_event(self):
         """
-        Calculate delta pos and put event
+        Calculate delta pos and put one event with list of PosDeltaData changed since last put.
         """
-        pos_dict = self.positions.get(vt_symbol, None)
-        if pos_dict:
-            pos_dict['target_net'] = pos_dict['target_long'] - pos_dict['target_short']
-            pos_dict = copy(pos_dict)
+        table = self.positions
+        rows = table.pop_changed_rows()
+        if not len(rows):
+            return
+
+        long_pos_delta, short_pos_delta, net_pos_delta = self.get_all_pos_delta()
+
+        pos_data_list = []
+        for row in rows:
+            vt_symbol = table.symbols[row]
+            pos_dict = dict(zip(table.columns, table.get_row(vt_symbol)))
             pos_dict['vt_symbol'] = vt_symbol
-            pos_dict['long_delta'], pos_dict['short_delta'] = self.get_pos_delta(vt_symbol)
-            pos_dict['net_delta'] = self.get_net_pos_delta(vt_symbol)
+            pos_dict['long_delta'] = to_number(long_pos_delta[row].item())
+            pos_dict['short_delta'] = to_number(short_pos_delta[row].item())
+            pos_dict['net_delta'] = to_number(net_pos_delta[row].item())
+            pos_data_list.append(PosDeltaData(**pos_dict))
 
-            pos_data = PosDeltaData()
-            pos_data.__dict__ = pos_dict
-            event = Event(EVENT_FOLLOW_POS_DELTA, pos_data)
-            self.event_engine.put(event)
+        event = Event(EVENT_FOLLOW_POS_SNAPSHOT, pos_data_list)
+        self.event_engine.put(event)
 
     def write_log(self, msg: str):
         """"""
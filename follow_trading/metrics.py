@@ -0,0 +1,136 @@
+from collections import defaultdict
+from functools import wraps
+from math import frexp
+from time import perf_counter
+from typing import Callable
+
+
+# Each power of 2 is divided into 2 ** SUB_BUCKET_BITS buckets, so relative error of value is below 12.5%.
+SUB_BUCKET_BITS = 3
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+
+class Histogram:
+    """
+    Log-linear bucket histogram of latency in microseconds, like HDR histogram with low precision.
+    Recording is one frexp and one list increment.
+    """
+
+    def __init__(self):
+        """"""
+        self.counts = [0] * (64 * SUB_BUCKET_COUNT)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: float):
+        """
+        Record value in microseconds.
+        """
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+        if value < 1:
+            self.counts[0] += 1
+            return
+
+        mantissa, exponent = frexp(value)
+        # mantissa is in [0.5, 1), it's mapped to sub bucket
+        index = exponent * SUB_BUCKET_COUNT + int((mantissa - 0.5) * 2 * SUB_BUCKET_COUNT)
+        self.counts[index] += 1
+
+    @staticmethod
+    def get_bucket_value(index: int):
+        """
+        Upper bound of bucket value.
+        """
+        if not index:
+            return 1
+
+        exponent, sub_index = divmod(index, SUB_BUCKET_COUNT)
+        return (0.5 + (sub_index + 1) / SUB_BUCKET_COUNT / 2) * 2 ** exponent
+
+    def get_percentile(self, q: float):
+        """"""
+        if not self.count:
+            return 0
+
+        threshold = self.count * q
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return min(self.get_bucket_value(index), self.max)
+        return self.max
+
+    def get_snapshot(self):
+        """"""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0,
+            "p50": self.get_percentile(0.5),
+            "p99": self.get_percentile(0.99),
+            "p999": self.get_percentile(0.999),
+            "max": self.max
+        }
+
+
+class FollowMetrics:
+    """
+    Counters and per-stage latency histograms of follow engine.
+
+    Stage functions are timed by wrapping them with timed() only when metrics enabled,
+    so there is no cost at all when disabled.
+    """
+
+    def __init__(self):
+        """"""
+        self.counters = defaultdict(int)
+        self.histograms = defaultdict(Histogram)
+        self.start_time = perf_counter()
+
+    def incr(self, name: str, n: int = 1):
+        """"""
+        self.counters[name] += n
+
+    def record(self, stage: str, seconds: float):
+        """"""
+        self.histograms[stage].record(seconds * 1e6)
+
+    def timed(self, stage: str, func: Callable):
+        """
+        Wrap func to record its cost in stage histogram.
+        """
+        histogram = self.histograms[stage]
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record((perf_counter() - start) * 1e6)
+        return wrapper
+
+    def reset(self):
+        """"""
+        self.counters.clear()
+        for histogram in self.histograms.values():
+            histogram.__init__()
+        self.start_time = perf_counter()
+
+    def get_snapshot(self, gauges: dict = None):
+        """
+        Return dict of counters, gauges and histograms (latency in microseconds).
+        """
+        return {
+            "elapsed": perf_counter() - self.start_time,
+            "counters": dict(self.counters),
+            "gauges": gauges if gauges else {},
+            "histograms": {
+                stage: histogram.get_snapshot()
+                for stage, histogram in self.histograms.items()
+            }
+        }
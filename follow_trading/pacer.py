@@ -0,0 +1,205 @@
+from collections import deque
+from time import monotonic
+from typing import List
+
+from vnpy.trader.engine import MainEngine
+from vnpy.trader.gateway import BaseGateway
+from vnpy.trader.object import OrderRequest
+
+
+class TokenBucket:
+    """
+    Allow rate tokens per second, with burst up to capacity. Rate 0 means unlimited.
+    """
+
+    def __init__(self, rate: float, capacity: float = 0):
+        """"""
+        self.rate = rate
+        self.capacity = capacity if capacity else rate
+        self.tokens = self.capacity
+        self.last_time = monotonic()
+
+    def refill(self, now: float):
+        """
+        Bucket created after now is taken is not refilled.
+        """
+        if now > self.last_time:
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_time) * self.rate)
+            self.last_time = now
+
+    def available(self, now: float):
+        """"""
+        if not self.rate:
+            return True
+
+        self.refill(now)
+        return self.tokens >= 1
+
+    def consume(self):
+        """
+        Call it only after available() returns True.
+        """
+        if self.rate:
+            self.tokens -= 1
+
+
+class OrderPacer:
+    """
+    Send orders of one gateway under order rate limits, per gateway and per symbol.
+
+    Orders allowed by token buckets are taken by put_orders() at once, the rest wait in
+    queue and are taken by take_queued() later in sequence. Taken orders are sent by
+    send_reqs(), in one batch if gateway supports send_orders.
+
+    Queue and token buckets are only changed by the caller thread (event thread of engine),
+    send_reqs() may run in another thread.
+    """
+
+    def __init__(
+        self,
+        main_engine: MainEngine,
+        gateway_name: str,
+        order_rate: float = 0,
+        symbol_rate: float = 0
+    ):
+        """"""
+        self.main_engine = main_engine
+        self.gateway_name = gateway_name
+        self.order_rate = order_rate
+        self.symbol_rate = symbol_rate
+
+        self.bucket = TokenBucket(order_rate)
+        self.symbol_buckets = {}    # vt_symbol: TokenBucket
+
+        self.queue = deque()        # (item, put time)
+
+        # Stats
+        self.start_time = monotonic()
+        self.sent_count = 0
+        self.batch_count = 0
+        self.queued_count = 0
+        self.total_delay = 0
+        self.max_delay = 0
+
+    def set_rate(self, order_rate: float, symbol_rate: float):
+        """"""
+        if order_rate != self.order_rate:
+            self.order_rate = order_rate
+            self.bucket = TokenBucket(order_rate)
+
+        if symbol_rate != self.symbol_rate:
+            self.symbol_rate = symbol_rate
+            self.symbol_buckets.clear()
+
+    def get_symbol_bucket(self, vt_symbol: str):
+        """"""
+        bucket = self.symbol_buckets.get(vt_symbol, None)
+        if not bucket:
+            bucket = TokenBucket(self.symbol_rate)
+            self.symbol_buckets[vt_symbol] = bucket
+        return bucket
+
+    def put_orders(self, items: List[tuple]):
+        """
+        Take orders allowed now and queue the others. Return items to be sent now.
+        Each item is a tuple with OrderRequest as first element, other elements are kept for caller.
+        """
+        now = monotonic()
+
+        # Keep order sequence, new orders must wait after queued ones.
+        if self.queue:
+            batch = []
+            rest = items
+        else:
+            batch, rest = self.take_allowed(items, now)
+
+        for item in rest:
+            self.queue.append((item, now))
+        self.queued_count += len(rest)
+
+        self.count_sent(batch)
+        return batch
+
+    def take_queued(self):
+        """
+        Take queued items allowed by now, in sequence.
+        """
+        if not self.queue:
+            return []
+
+        now = monotonic()
+        entries = list(self.queue)
+        self.queue.clear()
+
+        batch, _ = self.take_allowed([item for item, _ in entries], now)
+        self.queue.extend(entries[len(batch):])
+
+        for _, put_time in entries[:len(batch)]:
+            delay = now - put_time
+            self.total_delay += delay
+            self.max_delay = max(self.max_delay, delay)
+
+        self.count_sent(batch)
+        return batch
+
+    def take_allowed(self, items: List[tuple], now: float):
+        """
+        Split items into (allowed now, rest) in sequence.
+        """
+        for i, item in enumerate(items):
+            symbol_bucket = self.get_symbol_bucket(item[0].vt_symbol)
+            if not self.bucket.available(now) or not symbol_bucket.available(now):
+                return items[:i], items[i:]
+
+            self.bucket.consume()
+            symbol_bucket.consume()
+        return items, []
+
+    def count_sent(self, batch: List[tuple]):
+        """"""
+        if batch:
+            self.sent_count += len(batch)
+            self.batch_count += 1
+
+    def send_reqs(self, reqs: List[OrderRequest]):
+        """
+        Send orders in one batch if gateway supports it. Return vt_orderid of each req, "" if failed.
+        No state of pacer is changed, so it can be called in sending thread of gateway.
+        """
+        if not reqs:
+            return []
+
+        gateway = self.main_engine.get_gateway(self.gateway_name)
+        if len(reqs) > 1 and gateway and self.is_batch_supported(gateway):
+            return gateway.send_orders(reqs)
+        else:
+            return [self.main_engine.send_order(req, self.gateway_name) for req in reqs]
+
+    @staticmethod
+    def is_batch_supported(gateway: BaseGateway):
+        """
+        Check if gateway overrides send_orders, default one of BaseGateway sends orders one by one.
+        """
+        method = getattr(type(gateway), "send_orders", None)
+        return method is not None and method is not getattr(BaseGateway, "send_orders", None)
+
+    def get_queue_size(self):
+        """"""
+        return len(self.queue)
+
+    def get_stats(self):
+        """
+        Throughput and queueing delay since start.
+        """
+        elapsed = monotonic() - self.start_time
+        delayed_count = self.queued_count - len(self.queue)
+        return {
+            "gateway_name": self.gateway_name,
+            "sent_count": self.sent_count,
+            "batch_count": self.batch_count,
+            "throughput": self.sent_count / elapsed if elapsed else 0,
+            "queue_size": len(self.queue),
+            "queued_count": self.queued_count,
+            "avg_delay": self.total_delay / delayed_count if delayed_count else 0,
+            "max_delay": self.max_delay
+        }
@@ -0,0 +1,222 @@
+from typing import List
+
+import numpy as np
+
+
+def to_number(value: float):
+    """
+    Integral value is returned as int, so positions of whole lots are shown and saved as before.
+    """
+    return int(value) if value.is_integer() else value
+
+
+class PositionRow:
+    """
+    Dict-like view of one symbol in PositionTable.
+    """
+
+    __slots__ = ("table", "vt_symbol")
+
+    def __init__(self, table: "PositionTable", vt_symbol: str):
+        """"""
+        self.table = table
+        self.vt_symbol = vt_symbol
+
+    def __getitem__(self, name: str):
+        """"""
+        return self.table.get_value(self.vt_symbol, name)
+
+    def __setitem__(self, name: str, value: float):
+        """"""
+        self.table.set_value(self.vt_symbol, name, value)
+
+    def __contains__(self, name: str):
+        """"""
+        return name in self.table.column_index
+
+    def __iter__(self):
+        """"""
+        return iter(self.table.columns)
+
+    def __repr__(self):
+        """"""
+        return f"{self.vt_symbol}: {dict(self.items())}"
+
+    def keys(self):
+        """"""
+        return list(self.table.columns)
+
+    def items(self):
+        """"""
+        return zip(self.table.columns, self.table.get_row(self.vt_symbol))
+
+    def update(self, d: dict):
+        """"""
+        for name, value in d.items():
+            self[name] = value
+
+
+class PositionTable:
+    """
+    Position of all symbols stored in one float array, one row per vt_symbol.
+    Float is used because volume of some gateways is not whole lots.
+
+    It supports the dict of dict interface used before (table[vt_symbol][name]),
+    and columns of all symbols can be read at once for vectorized calculation.
+    Rows changed since last pop_changed_rows() are tracked.
+    """
+
+    def __init__(self, columns: List[str], capacity: int = 64):
+        """"""
+        self.columns = list(columns)
+        self.column_index = {name: i for i, name in enumerate(self.columns)}
+
+        self.data = np.zeros((capacity, len(self.columns)), dtype=np.float64)
+        self.changed = np.zeros(capacity, dtype=bool)
+        self.index = {}         # vt_symbol: row
+        self.symbols = []       # row: vt_symbol
+
+    def __len__(self):
+        """"""
+        return len(self.symbols)
+
+    def __contains__(self, vt_symbol: str):
+        """"""
+        return vt_symbol in self.index
+
+    def __iter__(self):
+        """"""
+        return iter(list(self.symbols))
+
+    def __getitem__(self, vt_symbol: str):
+        """"""
+        if vt_symbol not in self.index:
+            raise KeyError(vt_symbol)
+        return PositionRow(self, vt_symbol)
+
+    def __setitem__(self, vt_symbol: str, d: dict):
+        """
+        Replace all fields of vt_symbol, missing fields are set to 0.
+        """
+        row = self.add(vt_symbol)
+        self.data[row] = 0
+        PositionRow(self, vt_symbol).update(d)
+        self.changed[row] = True
+
+    def get(self, vt_symbol: str, default=None):
+        """"""
+        if vt_symbol in self.index:
+            return PositionRow(self, vt_symbol)
+        return default
+
+    def setdefault(self, vt_symbol: str, default: dict = None):
+        """"""
+        if vt_symbol not in self.index:
+            self[vt_symbol] = default if default else {}
+        return PositionRow(self, vt_symbol)
+
+    def keys(self):
+        """"""
+        return list(self.symbols)
+
+    def items(self):
+        """"""
+        return [(vt_symbol, PositionRow(self, vt_symbol)) for vt_symbol in list(self.symbols)]
+
+    def add(self, vt_symbol: str):
+        """
+        Add empty row of vt_symbol if not exists, return row number.
+        """
+        row = self.index.get(vt_symbol, None)
+        if row is not None:
+            return row
+
+        row = len(self.symbols)
+        if row == len(self.data):
+            self.data = np.concatenate([self.data, np.zeros_like(self.data)])
+            self.changed = np.concatenate([self.changed, np.zeros_like(self.changed)])
+
+        self.data[row] = 0
+        self.changed[row] = True
+        self.index[vt_symbol] = row
+        self.symbols.append(vt_symbol)
+        return row
+
+    def pop(self, vt_symbol: str, *args):
+        """
+        Remove row of vt_symbol, last row is moved to its place.
+        """
+        if vt_symbol not in self.index:
+            if args:
+                return args[0]
+            raise KeyError(vt_symbol)
+
+        d = dict(self[vt_symbol].items())
+
+        row = self.index.pop(vt_symbol)
+        last_row = len(self.symbols) - 1
+        last_symbol = self.symbols.pop()
+        if row != last_row:
+            self.data[row] = self.data[last_row]
+            self.changed[row] = self.changed[last_row]
+            self.symbols[row] = last_symbol
+            self.index[last_symbol] = row
+        self.changed[last_row] = False
+        return d
+
+    def clear(self):
+        """"""
+        self.index.clear()
+        self.symbols.clear()
+        self.changed[:] = False
+
+    def load(self, d: dict):
+        """
+        Load from dict of dict, {vt_symbol: {name: value}}.
+        """
+        for vt_symbol, symbol_pos in d.items():
+            self[vt_symbol] = symbol_pos
+
+    def copy(self):
+        """
+        Return dict of dict, it's used to save data to file.
+        """
+        index = self.index.copy()
+        data = self.data.copy()
+        return {
+            vt_symbol: dict(zip(self.columns, map(to_number, data[row].tolist())))
+            for vt_symbol, row in index.items()
+        }
+
+    def get_value(self, vt_symbol: str, name: str):
+        """"""
+        return to_number(self.data[self.index[vt_symbol], self.column_index[name]].item())
+
+    def set_value(self, vt_symbol: str, name: str, value: float):
+        """"""
+        row = self.index[vt_symbol]
+        self.data[row, self.column_index[name]] = value
+        self.changed[row] = True
+
+    def get_row(self, vt_symbol: str):
+        """"""
+        return [to_number(value) for value in self.data[self.index[vt_symbol]].tolist()]
+
+    def get_column(self, name: str):
+        """
+        Get values of all symbols in one column, in the order of self.symbols.
+        """
+        return self.data[:len(self.symbols), self.column_index[name]]
+
+    def mark_all_changed(self):
+        """"""
+        self.changed[:len(self.symbols)] = True
+
+    def pop_changed_rows(self):
+        """
+        Get rows changed since last call.
+        """
+        count = len(self.symbols)
+        rows = np.flatnonzero(self.changed[:count])
+        self.changed[:count] = False
+        return rows
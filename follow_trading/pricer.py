@@ -0,0 +1,97 @@
+from vnpy.trader.constant import Direction
+from vnpy.trader.object import TickData
+
+
+class SymbolQuote:
+    """
+    Recent order book state and fill rate of follow orders of one symbol.
+    """
+
+    __slots__ = ("spread_ticks", "bid_volume", "ask_volume", "fill_rate")
+
+    def __init__(self):
+        """"""
+        self.spread_ticks = 1.0
+        self.bid_volume = 0
+        self.ask_volume = 0
+        self.fill_rate = 1.0
+
+
+class AdaptivePricer:
+    """
+    Choose how many ticks a follow order crosses beyond the price, instead of fixed tick_add.
+
+    ticks = min_ticks
+          + (max_ticks - min_ticks) * (1 - fill rate)       more aggressive when orders time out
+          + average spread, if volume exceeds top of book   order is expected to walk the book
+          + chase count                                      each re-quote after timeout goes deeper
+
+    rounded and capped at max_ticks. Spread and fill rate are exponential moving averages.
+    """
+
+    def __init__(self, min_ticks: int = 1, max_ticks: int = 10, alpha: float = 0.1):
+        """"""
+        self.min_ticks = min_ticks
+        self.max_ticks = max_ticks
+        self.alpha = alpha
+
+        self.quotes = {}    # vt_symbol: SymbolQuote
+
+    def set_range(self, min_ticks: int, max_ticks: int):
+        """"""
+        self.min_ticks = min(min_ticks, max_ticks)
+        self.max_ticks = max_ticks
+
+    def get_quote(self, vt_symbol: str):
+        """"""
+        quote = self.quotes.get(vt_symbol, None)
+        if not quote:
+            quote = SymbolQuote()
+            self.quotes[vt_symbol] = quote
+        return quote
+
+    def update_tick(self, tick: TickData, pricetick: float):
+        """"""
+        quote = self.get_quote(tick.vt_symbol)
+        quote.bid_volume = tick.bid_volume_1
+        quote.ask_volume = tick.ask_volume_1
+
+        # Skip one-sided book, e.g. price of empty side is 0 or max float at limit price.
+        if not pricetick or not tick.bid_volume_1 or not tick.ask_volume_1:
+            return
+
+        spread_ticks = (tick.ask_price_1 - tick.bid_price_1) / pricetick
+        if spread_ticks > 0:
+            quote.spread_ticks += self.alpha * (spread_ticks - quote.spread_ticks)
+
+    def update_fill(self, vt_symbol: str, filled: bool):
+        """
+        Update fill rate with follow order filled, or cancelled for timeout.
+        """
+        quote = self.get_quote(vt_symbol)
+        quote.fill_rate += self.alpha * (float(filled) - quote.fill_rate)
+
+    def get_cross_ticks(self, vt_symbol: str, direction: Direction, volume: float = 0, chase_count: int = 0):
+        """"""
+        quote = self.get_quote(vt_symbol)
+
+        ticks = self.min_ticks + (self.max_ticks - self.min_ticks) * (1 - quote.fill_rate)
+
+        top_volume = quote.ask_volume if direction == Direction.LONG else quote.bid_volume
+        if volume > top_volume:
+            ticks += quote.spread_ticks
+
+        ticks += chase_count
+        return min(self.max_ticks, int(round(ticks)))
+
+    def get_stats(self):
+        """"""
+        return {
+            vt_symbol: {
+                "spread_ticks": quote.spread_ticks,
+                "bid_volume": quote.bid_volume,
+                "ask_volume": quote.ask_volume,
+                "fill_rate": quote.fill_rate
+            }
+            for vt_symbol, quote in self.quotes.items()
+        }
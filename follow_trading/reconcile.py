@@ -0,0 +1,92 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from vnpy.trader.constant import Direction, Offset
+from vnpy.trader.object import OrderData
+
+from .position import to_number
+
+
+# (sign of delta, column of delta): (direction, offset) of sync order
+SYNC_ACTIONS = [
+    (1, 0, Direction.LONG, Offset.OPEN),       # buy
+    (1, 1, Direction.SHORT, Offset.OPEN),      # short
+    (-1, 0, Direction.SHORT, Offset.CLOSE),    # sell
+    (-1, 1, Direction.LONG, Offset.CLOSE),     # cover
+]
+
+
+@dataclass
+class SyncOrder:
+    vt_symbol: str
+    direction: Direction
+    offset: Offset
+    volume: float
+
+
+@dataclass
+class SyncPlan:
+    """
+    Cancels and orders to make target positions equal to source positions.
+    """
+    create_time: datetime = field(default_factory=datetime.now)
+    cancel_orderids: Dict[str, str] = field(default_factory=dict)     # vt_orderid: vt_symbol
+    orders: List[SyncOrder] = field(default_factory=list)
+    skipped_symbols: List[str] = field(default_factory=list)    # intraday symbols only synced by net pos
+
+    def is_empty(self):
+        """"""
+        return not self.cancel_orderids and not self.orders
+
+    def get_symbols(self):
+        """"""
+        return sorted({order.vt_symbol for order in self.orders})
+
+    def get_summary(self):
+        """"""
+        return f"撤单{len(self.cancel_orderids)}笔，委托{len(self.orders)}笔，涉及合约{len(self.get_symbols())}个"
+
+
+def group_orders_by_symbol(orders: List[OrderData]):
+    """"""
+    symbol_orders = defaultdict(list)
+    for order in orders:
+        symbol_orders[order.vt_symbol].append(order)
+    return symbol_orders
+
+
+def build_sync_plan(
+    symbols: List[str],
+    long_delta: np.ndarray,
+    short_delta: np.ndarray,
+    intraday: np.ndarray,
+    symbol_orders: Dict[str, List[OrderData]]
+):
+    """
+    Build plan from pos delta arrays of all symbols, in the order of symbols.
+
+    Symbol with any delta gets all its active target orders cancelled, then one order
+    per non-zero delta. Symbols without delta are untouched, intraday ones are skipped.
+    """
+    plan = SyncPlan()
+
+    deltas = np.column_stack([long_delta, short_delta])
+    has_delta = deltas.any(axis=1)
+
+    plan.skipped_symbols = [symbols[row] for row in np.flatnonzero(has_delta & intraday)]
+
+    rows = np.flatnonzero(has_delta & ~intraday)
+    for row in rows:
+        for order in symbol_orders.get(symbols[row], []):
+            plan.cancel_orderids[order.vt_orderid] = order.vt_symbol
+
+    for sign, column, direction, offset in SYNC_ACTIONS:
+        volumes = deltas[rows, column] * sign
+        for row, volume in zip(rows[volumes > 0], volumes[volumes > 0]):
+            plan.orders.append(SyncOrder(symbols[row], direction, offset, to_number(volume.item())))
+
+    return plan
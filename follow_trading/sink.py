@@ -0,0 +1,332 @@
+import csv
+import os
+import traceback
+from datetime import datetime
+from enum import Enum
+from queue import Queue, Empty
+from threading import Thread
+from typing import List
+
+from vnpy.trader.utility import get_folder_path
+from vnpy.trader.object import TradeData
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+
+TRADE_COLUMNS = [
+    "date", "time", "recv_time", "gateway_name", "symbol", "exchange", "vt_symbol",
+    "orderid", "tradeid", "vt_tradeid", "direction", "offset", "price", "volume",
+    "role", "source_vt_tradeid", "source_account"
+]
+
+if pa:
+    TRADE_SCHEMA = pa.schema([
+        ("date", pa.string()),
+        ("time", pa.string()),
+        ("recv_time", pa.timestamp("ms")),
+        ("gateway_name", pa.string()),
+        ("symbol", pa.string()),
+        ("exchange", pa.string()),
+        ("vt_symbol", pa.string()),
+        ("orderid", pa.string()),
+        ("tradeid", pa.string()),
+        ("vt_tradeid", pa.string()),
+        ("direction", pa.string()),
+        ("offset", pa.string()),
+        ("price", pa.float64()),
+        ("volume", pa.float64()),
+        ("role", pa.string()),
+        ("source_vt_tradeid", pa.string()),
+        ("source_account", pa.string())
+    ])
+
+
+class TradeRole(Enum):
+    SOURCE = "source"       # trade of source gateway
+    TARGET = "target"       # trade in target or fan-out gateway, source_vt_tradeid is empty if not follow order
+
+
+class TradeSink:
+    """
+    Append trades as they arrive to daily partitions: trade/date=20200601/part-xxx.arrow
+
+    Arrow IPC stream is used if pyarrow installed, otherwise csv. Each engine run writes
+    its own part file, since a closed stream can not be appended. Rows are written in
+    batch by writer thread.
+    """
+
+    def __init__(self, folder_name: str = "trade", flush_interval: float = 1, use_arrow: bool = True):
+        """"""
+        self.folder_path = get_folder_path(folder_name)
+        self.flush_interval = flush_interval
+        self.use_arrow = bool(pa) and use_arrow
+        self.suffix = ".arrow" if self.use_arrow else ".csv"
+        self.part_name = f"part-{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+
+        self.queue = Queue()
+        self.active = False
+        self.thread = None
+
+        self.date = ""
+        self.file = None
+        self.writer = None
+
+    def start(self):
+        """"""
+        if self.active:
+            return
+
+        self.active = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop writer thread after pending trades written.
+        """
+        if not self.active:
+            return
+
+        self.active = False
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def put_trade(
+        self,
+        trade: TradeData,
+        role: TradeRole,
+        source_vt_tradeid: str = "",
+        source_account: str = ""
+    ):
+        """
+        Put trade to writer thread.
+        """
+        now = datetime.now()
+        row = {
+            "date": now.strftime("%Y%m%d"),
+            "time": trade.time,
+            "recv_time": now,
+            "gateway_name": trade.gateway_name,
+            "symbol": trade.symbol,
+            "exchange": trade.exchange.value,
+            "vt_symbol": trade.vt_symbol,
+            "orderid": trade.orderid,
+            "tradeid": trade.tradeid,
+            "vt_tradeid": trade.vt_tradeid,
+            "direction": trade.direction.value if trade.direction else "",
+            "offset": trade.offset.value,
+            "price": trade.price,
+            "volume": trade.volume,
+            "role": role.value,
+            "source_vt_tradeid": source_vt_tradeid,
+            "source_account": source_account
+        }
+        self.queue.put(row)
+
+    def run(self):
+        """"""
+        while True:
+            rows = []
+            try:
+                rows.append(self.queue.get(timeout=self.flush_interval))
+                while True:
+                    rows.append(self.queue.get_nowait())
+            except Empty:
+                pass
+
+            stopped = None in rows
+            rows = [row for row in rows if row is not None]
+
+            try:
+                if rows:
+                    self.write_rows(rows)
+                if stopped:
+                    self.close_file()
+            except:  # noqa
+                traceback.print_exc()
+
+            if stopped:
+                break
+
+    def write_rows(self, rows: List[dict]):
+        """
+        Write rows, grouped by date partition.
+        """
+        begin = 0
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or rows[i]["date"] != rows[begin]["date"]:
+                self.open_file(rows[begin]["date"])
+                self.write_batch(rows[begin:i])
+                begin = i
+
+    def open_file(self, date: str):
+        """"""
+        if date == self.date and self.file:
+            return
+
+        self.close_file()
+
+        partition_path = self.folder_path.joinpath(f"date={date}")
+        partition_path.mkdir(parents=True, exist_ok=True)
+        file_path = partition_path.joinpath(self.part_name + self.suffix)
+
+        if self.use_arrow:
+            self.file = open(file_path, "wb")
+            self.writer = pa.ipc.new_stream(self.file, TRADE_SCHEMA)
+        else:
+            is_new = not file_path.exists()
+            self.file = open(file_path, "a", newline="", encoding="utf-8")
+            self.writer = csv.DictWriter(self.file, TRADE_COLUMNS)
+            if is_new:
+                self.writer.writeheader()
+
+        self.date = date
+
+    def write_batch(self, rows: List[dict]):
+        """"""
+        if self.use_arrow:
+            columns = {name: [row[name] for row in rows] for name in TRADE_COLUMNS}
+            batch = pa.RecordBatch.from_pydict(columns, schema=TRADE_SCHEMA)
+            self.writer.write_batch(batch)
+        else:
+            self.writer.writerows(rows)
+        self.file.flush()
+
+    def close_file(self):
+        """"""
+        if not self.file:
+            return
+
+        if self.use_arrow:
+            self.writer.close()
+        self.file.close()
+
+        self.file = None
+        self.writer = None
+        self.date = ""
+
+
+def get_partition_dates(folder_name: str = "trade"):
+    """
+    Get sorted dates of all trade partitions.
+    """
+    folder_path = get_folder_path(folder_name)
+    return sorted(
+        path.name[len("date="):] for path in folder_path.iterdir()
+        if path.is_dir() and path.name.startswith("date=")
+    )
+
+
+def read_arrow_part(file_path):
+    """
+    Read record batches of arrow stream file, incomplete tail written before crash is skipped.
+    """
+    batches = []
+    with pa.OSFile(str(file_path), "rb") as f:
+        try:
+            reader = pa.ipc.open_stream(f)
+            for batch in reader:
+                batches.append(batch)
+        except (pa.ArrowInvalid, OSError):
+            pass
+    return batches
+
+
+def read_trades(
+    start_date: str = "",
+    end_date: str = "",
+    columns: List[str] = None,
+    folder_name: str = "trade"
+):
+    """
+    Read trades of dates in [start_date, end_date] (YYYYMMDD, empty means no limit).
+    Duplicate trades (pushed again after restart) are dropped.
+
+    Return pyarrow Table if pyarrow installed, otherwise list of dict.
+    """
+    folder_path = get_folder_path(folder_name)
+    dates = [
+        date for date in get_partition_dates(folder_name)
+        if (not start_date or date >= start_date) and (not end_date or date <= end_date)
+    ]
+
+    file_paths = []
+    for date in dates:
+        file_paths.extend(sorted(folder_path.joinpath(f"date={date}").iterdir()))
+
+    if pa:
+        return read_trades_arrow(file_paths, columns)
+    else:
+        return read_trades_csv(file_paths, columns)
+
+
+def read_trades_arrow(file_paths: list, columns: List[str] = None):
+    """"""
+    tables = []
+    for file_path in file_paths:
+        if file_path.suffix == ".arrow":
+            batches = read_arrow_part(file_path)
+            if batches:
+                tables.append(conform_table(pa.Table.from_batches(batches)))
+        elif file_path.suffix == ".csv":
+            # recv_time in csv has microseconds
+            column_types = {field.name: field.type for field in TRADE_SCHEMA}
+            column_types["recv_time"] = pa.timestamp("us")
+            options = pa_csv.ConvertOptions(column_types=column_types)
+            table = pa_csv.read_csv(file_path, convert_options=options)
+            tables.append(conform_table(table))
+
+    if not tables:
+        table = TRADE_SCHEMA.empty_table()
+    else:
+        table = pa.concat_tables(tables)
+
+    # Keep first row of each vt_tradeid
+    seen = set()
+    mask = []
+    for vt_tradeid in table.column("vt_tradeid").to_pylist():
+        mask.append(vt_tradeid not in seen)
+        seen.add(vt_tradeid)
+    table = table.filter(pa.array(mask, type=pa.bool_()))
+
+    if columns:
+        table = table.select(columns)
+    return table
+
+
+def conform_table(table):
+    """
+    Cast table to TRADE_SCHEMA, columns missing in parts written by older version are filled with empty string.
+    """
+    for field in TRADE_SCHEMA:
+        if field.name not in table.column_names:
+            table = table.append_column(field.name, pa.array([""] * table.num_rows, type=pa.string()))
+    return table.select(TRADE_SCHEMA.names).cast(TRADE_SCHEMA, safe=False)
+
+
+def read_trades_csv(file_paths: list, columns: List[str] = None):
+    """"""
+    rows = []
+    seen = set()
+    for file_path in file_paths:
+        if file_path.suffix != ".csv":
+            continue
+
+        with open(file_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if row["vt_tradeid"] in seen:
+                    continue
+                seen.add(row["vt_tradeid"])
+
+                # Parts written before source_account added
+                row.setdefault("source_account", "")
+
+                if columns:
+                    row = {name: row[name] for name in columns}
+                rows.append(row)
+    return rows
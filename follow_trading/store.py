@@ -0,0 +1,271 @@
+import os
+import json
+import pickle
+import struct
+import traceback
+from enum import IntEnum
+from queue import Queue, Empty
+from threading import Thread, Lock
+from time import monotonic
+from typing import Callable
+from zlib import crc32
+
+from vnpy.trader.utility import get_file_path
+
+
+class RecordType(IntEnum):
+    TRADE_ACCEPTED = 1      # (vt_tradeid,)
+    ORDERS_SENT = 2         # (vt_tradeid, vt_orderids)
+    TARGET_FILL = 3         # (vt_tradeid, vt_symbol, symbol_pos)
+    POS_DELTA = 4           # (vt_symbol, changed fields of symbol_pos)
+    TARGET_POS = 5          # (gateway_name, vt_symbol, symbol_pos) of fan-out target
+
+
+# crc32 of payload, record type, payload length
+RECORD_HEADER = struct.Struct("<IBI")
+
+# Type of queue item carrying snapshot data, it's not written to journal
+SNAPSHOT = 0
+
+
+class FollowDataStore:
+    """
+    Persist follow data off the event thread.
+
+    Every follow event is appended to binary journal file by writer thread as soon as
+    it is put. After snapshot_count records or snapshot_interval seconds, full data file
+    is rewritten (temp file and rename) and journal is compacted. Records carry absolute values, so replaying them over a newer
+    snapshot is safe.
+
+    Snapshot data is taken by the thread changing the data (check_snapshot) and queued
+    after records put before it, so writer thread never reads data being changed.
+    """
+
+    def __init__(
+        self,
+        data_filename: str,
+        snapshot_func: Callable,
+        save_interval: float = 1,
+        snapshot_interval: float = 60,
+        snapshot_count: int = 1000
+    ):
+        """
+        snapshot_func returns data dict to be saved in data file.
+        """
+        self.data_path = get_file_path(data_filename)
+        self.journal_path = self.data_path.with_suffix(".journal")
+        self.snapshot_func = snapshot_func
+        self.save_interval = save_interval
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_count = snapshot_count
+
+        self.queue = Queue()
+        self.journal_count = 0
+        self.last_save_time = monotonic()
+        self.snapshot_queued = False
+
+        self.lock = Lock()
+        self.active = False
+        self.thread = None
+
+    def start(self):
+        """
+        Start writer thread.
+        """
+        if self.active:
+            return
+
+        self.active = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop writer thread after all pending records written.
+        """
+        if not self.active:
+            return
+
+        self.active = False
+        self.put_snapshot()
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def load(self):
+        """
+        Load data file (last snapshot).
+        """
+        if not self.data_path.exists():
+            return {}
+
+        with open(self.data_path, mode="r", encoding="UTF-8") as f:
+            return json.load(f)
+
+    def replay(self, data: dict):
+        """
+        Apply journal records after last snapshot to data dict. Return count of records.
+        """
+        if not self.journal_path.exists():
+            return 0
+
+        with open(self.journal_path, mode="rb") as f:
+            buf = f.read()
+
+        count = 0
+        valid_size = 0
+        header_size = RECORD_HEADER.size
+        while valid_size + header_size <= len(buf):
+            checksum, record_type, length = RECORD_HEADER.unpack_from(buf, valid_size)
+            begin = valid_size + header_size
+            payload = buf[begin: begin + length]
+
+            # Tail may be incomplete if crashed while writing
+            if len(payload) < length or crc32(payload) != checksum:
+                break
+
+            self.apply_record(data, RecordType(record_type), pickle.loads(payload))
+            valid_size = begin + length
+            count += 1
+
+        # Drop broken tail, so new records are not appended after it.
+        if valid_size < len(buf):
+            with open(self.journal_path, mode="r+b") as f:
+                f.truncate(valid_size)
+
+        self.journal_count = count
+        return count
+
+    @staticmethod
+    def apply_record(data: dict, record_type: RecordType, payload: tuple):
+        """
+        Apply one journal record to data dict.
+        """
+        tradeid_orderids_dict = data.setdefault("tradeid_orderids_dict", {})
+        positions = data.setdefault("positions", {})
+
+        if record_type == RecordType.TRADE_ACCEPTED:
+            vt_tradeid, = payload
+            tradeid_orderids_dict.setdefault(vt_tradeid, [])
+        elif record_type == RecordType.ORDERS_SENT:
+            vt_tradeid, vt_orderids = payload
+            tradeid_orderids_dict[vt_tradeid] = list(vt_orderids)
+        elif record_type == RecordType.TARGET_FILL:
+            vt_tradeid, vt_symbol, symbol_pos = payload
+            positions[vt_symbol] = symbol_pos
+        elif record_type == RecordType.POS_DELTA:
+            vt_symbol, changed = payload
+            positions.setdefault(vt_symbol, {}).update(changed)
+        elif record_type == RecordType.TARGET_POS:
+            gateway_name, vt_symbol, symbol_pos = payload
+            target_positions = data.setdefault("target_positions", {})
+            target_positions.setdefault(gateway_name, {})[vt_symbol] = symbol_pos
+
+    def put_record(self, record_type: RecordType, payload: tuple):
+        """
+        Put record to writer thread. Mutable objects in payload must not be changed later.
+        """
+        self.queue.put((record_type, payload))
+
+    def check_snapshot(self):
+        """
+        Take snapshot and queue it if required, called in the thread changing data.
+        """
+        if not self.snapshot_queued and self.is_snapshot_required():
+            self.put_snapshot()
+
+    def put_snapshot(self):
+        """
+        Take snapshot and queue it now, e.g. after data cleared or before data file read by other process.
+        """
+        self.snapshot_queued = True
+        self.queue.put((SNAPSHOT, self.snapshot_func()))
+
+    def save(self, data: dict = None):
+        """
+        Write snapshot to data file immediately and compact journal.
+        Snapshot is taken in the calling thread if data not given.
+        """
+        with self.lock:
+            # Snapshot queued after records or taken in lock, so every record in journal is included in it.
+            if data is None:
+                data = self.snapshot_func()
+
+            tmp_path = self.data_path.with_suffix(".tmp")
+            with open(tmp_path, mode="w+", encoding="UTF-8") as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.data_path)
+
+            with open(self.journal_path, mode="wb"):
+                pass
+
+            self.journal_count = 0
+            self.last_save_time = monotonic()
+
+    def is_snapshot_required(self):
+        """"""
+        if not self.journal_count:
+            return False
+        elif self.journal_count >= self.snapshot_count:
+            return True
+        else:
+            return monotonic() - self.last_save_time >= self.snapshot_interval
+
+    def run(self):
+        """"""
+        while True:
+            records = []
+            try:
+                records.append(self.queue.get(timeout=self.save_interval))
+                while True:
+                    records.append(self.queue.get_nowait())
+            except Empty:
+                pass
+
+            stopped = None in records
+            records = [record for record in records if record is not None]
+
+            try:
+                self.write_records(records)
+            except:  # noqa
+                traceback.print_exc()
+
+            if stopped:
+                break
+
+    def write_records(self, records: list):
+        """
+        Write records to journal in order, snapshot item replaces journal written before it.
+        """
+        journal_records = []
+        for record_type, payload in records:
+            if record_type == SNAPSHOT:
+                if journal_records:
+                    self.write_journal(journal_records)
+                    journal_records = []
+                try:
+                    self.save(payload)
+                finally:
+                    self.snapshot_queued = False
+            else:
+                journal_records.append((record_type, payload))
+
+        if journal_records:
+            self.write_journal(journal_records)
+
+    def write_journal(self, records: list):
+        """"""
+        buf = bytearray()
+        for record_type, payload in records:
+            data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+            buf += RECORD_HEADER.pack(crc32(data), record_type, len(data))
+            buf += data
+
+        with self.lock:
+            with open(self.journal_path, mode="ab") as f:
+                f.write(buf)
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_count += len(records)
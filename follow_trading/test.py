@@ -0,0 +1,853 @@
+"""
+Unit tests of follow trading, run in the folder of follow_trading:
+
+python -m unittest follow_trading.test
+"""
+import copy
+import csv
+import pickle
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from vnpy.event import Event, EventEngine
+from vnpy.trader.constant import Direction, Exchange, Offset, OrderType, Product, Status
+from vnpy.trader.event import EVENT_ORDER, EVENT_TRADE
+from vnpy.trader.object import AccountData, ContractData, OrderData, OrderRequest, PositionData, TickData, TradeData
+
+from follow_trading.contract import ContractStore
+from follow_trading.dedup import TradeIdFilter
+from follow_trading.engine import FollowEngine
+from follow_trading.pacer import OrderPacer
+from follow_trading.position import PositionTable
+from follow_trading.pricer import AdaptivePricer
+from follow_trading.sink import TradeRole, TradeSink, read_trades
+from follow_trading.store import FollowDataStore, RecordType
+
+
+class FakeMainEngine:
+    """
+    Main engine without gateways, sent orders are kept in orders.
+    """
+
+    def __init__(self):
+        """"""
+        self.contracts = {}
+        self.positions = []
+        self.accounts = []
+        self.gateways = {}
+        self.orders = {}
+        self.order_count = 0
+
+    def add_contract(self, symbol: str, exchange: Exchange, pricetick: float = 1):
+        """"""
+        contract = ContractData(
+            gateway_name="CTP",
+            symbol=symbol,
+            exchange=exchange,
+            name=symbol,
+            product=Product.FUTURES,
+            size=10,
+            pricetick=pricetick
+        )
+        self.contracts[contract.vt_symbol] = contract
+        return contract
+
+    def get_contract(self, vt_symbol: str):
+        """"""
+        return self.contracts.get(vt_symbol, None)
+
+    def get_all_contracts(self):
+        """"""
+        return list(self.contracts.values())
+
+    def get_all_positions(self):
+        """"""
+        return self.positions
+
+    def get_all_active_orders(self, vt_symbol: str = ""):
+        """"""
+        return [
+            order for order in self.orders.values()
+            if order.is_active() and (not vt_symbol or order.vt_symbol == vt_symbol)
+        ]
+
+    def get_all_trades(self):
+        """"""
+        return []
+
+    def get_all_accounts(self):
+        """"""
+        return self.accounts
+
+    def get_order(self, vt_orderid: str):
+        """"""
+        return self.orders.get(vt_orderid, None)
+
+    def get_gateway(self, gateway_name: str):
+        """"""
+        return self.gateways.get(gateway_name, None)
+
+    def subscribe(self, req, gateway_name: str):
+        """"""
+        pass
+
+    def send_order(self, req: OrderRequest, gateway_name: str):
+        """"""
+        self.order_count += 1
+        order = req.create_order_data(str(self.order_count), gateway_name)
+        order.status = Status.NOTTRADED
+        self.orders[order.vt_orderid] = order
+        return order.vt_orderid
+
+    def cancel_order(self, req, gateway_name: str):
+        """"""
+        order = self.orders.get(f"{gateway_name}.{req.orderid}", None)
+        if order:
+            order.status = Status.CANCELLED
+
+
+class EngineTestCase(unittest.TestCase):
+    """
+    Follow engine started without data store threads, files are saved in a temp folder.
+    """
+
+    def setUp(self):
+        """"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+        class TestFollowEngine(FollowEngine):
+            setting_filename = str(self.temp_dir.joinpath("follow_trading_setting.json"))
+            data_filename = str(self.temp_dir.joinpath("follow_trading_data.json"))
+            tradeids_filename = str(self.temp_dir.joinpath("follow_trading_tradeids.json"))
+
+        self.main_engine = FakeMainEngine()
+        self.main_engine.add_contract("rb2010", Exchange.SHFE)
+        self.main_engine.add_contract("IF2006", Exchange.CFFEX, 0.2)
+
+        self.engine = TestFollowEngine(self.main_engine, EventEngine())
+        self.engine.load_data()
+        self.engine.init_targets()
+
+    def tearDown(self):
+        """"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def put_tick(self, bid_price: float, ask_price: float, vt_symbol: str = "rb2010.SHFE"):
+        """"""
+        symbol, exchange = vt_symbol.split(".")
+        tick = TickData(
+            gateway_name="CTP",
+            symbol=symbol,
+            exchange=Exchange(exchange),
+            datetime=datetime.now(),
+            bid_price_1=bid_price,
+            ask_price_1=ask_price,
+            limit_up=bid_price * 1.1,
+            limit_down=bid_price * 0.9
+        )
+        self.engine.init_limited_price(tick)
+        self.engine.update_latest_price(tick)
+
+    def add_position(self, gateway_name: str, direction: Direction, volume: int, yd_volume: int):
+        """"""
+        position = PositionData(
+            gateway_name=gateway_name,
+            symbol="rb2010",
+            exchange=Exchange.SHFE,
+            direction=direction,
+            volume=volume,
+            yd_volume=yd_volume
+        )
+        self.main_engine.positions.append(position)
+
+    def create_trade(
+        self,
+        gateway_name: str,
+        tradeid: str,
+        direction: Direction,
+        offset: Offset,
+        volume: int = 1,
+        orderid: str = ""
+    ):
+        """"""
+        return TradeData(
+            gateway_name=gateway_name,
+            symbol="rb2010",
+            exchange=Exchange.SHFE,
+            orderid=orderid or f"manual{tradeid}",
+            tradeid=tradeid,
+            direction=direction,
+            offset=offset,
+            price=3500,
+            volume=volume,
+            time=datetime.now().strftime("%H:%M:%S")
+        )
+
+
+class TestTradeFilter(EngineTestCase):
+
+    def expire_window(self):
+        """
+        Make recent trade ids expired, as if gateway reconnected after a long time.
+        """
+        self.engine.vt_tradeids.rotate_time -= self.engine.filter_trade_timeout * 3
+        self.engine.vt_tradeids.check_rotate()
+
+    def test_target_trade_pushed_again(self):
+        self.add_position("RPC", Direction.LONG, 5, 2)
+        self.engine.start()
+        holding = self.engine.offset_converter.get_position_holding("rb2010.SHFE")
+
+        trade = self.create_trade("RPC", "1", Direction.SHORT, Offset.CLOSETODAY)
+        self.engine.process_trade_event(Event(EVENT_TRADE, trade))
+        self.assertEqual(holding.long_td, 2)
+
+        self.expire_window()
+        self.assertNotIn(trade.vt_tradeid, self.engine.vt_tradeids)
+
+        self.engine.process_trade_event(Event(EVENT_TRADE, trade))
+        self.assertEqual(holding.long_td, 2)
+        self.assertEqual(holding.long_pos, 4)
+
+    def test_target_trade_kept_after_restart(self):
+        self.engine.start()
+        trade = self.create_trade("RPC", "1", Direction.LONG, Offset.OPEN)
+        self.assertTrue(self.engine.add_tradeid(trade))
+        self.engine.save_tradeids()
+
+        self.engine.target_tradeids.clear()
+        self.engine.vt_tradeids.clear()
+        self.engine.load_tradeids()
+        self.expire_window()
+        self.assertFalse(self.engine.add_tradeid(trade))
+
+
+class TestSyncPlan(EngineTestCase):
+
+    def setUp(self):
+        """"""
+        super().setUp()
+        self.main_engine.add_contract("ag2012", Exchange.SHFE)
+        self.engine.start()
+
+    def send_target_order(self, vt_symbol: str, gateway_name: str = "RPC"):
+        """"""
+        symbol, exchange = vt_symbol.split(".")
+        req = OrderRequest(
+            symbol=symbol,
+            exchange=Exchange(exchange),
+            direction=Direction.LONG,
+            type=OrderType.LIMIT,
+            volume=1,
+            price=3500,
+            offset=Offset.OPEN
+        )
+        return self.main_engine.send_order(req, gateway_name)
+
+    def check_plan(self, positions: dict):
+        """
+        Plan of all symbols should have same cancels and orders as sync_pos of each symbol.
+        """
+        self.engine.positions.load(positions)
+        for vt_symbol in positions:
+            self.send_target_order(vt_symbol)
+            self.send_target_order(vt_symbol, "OTHER")
+
+        # Nothing is cancelled or sent by plan
+        plan = self.engine.plan_sync_all()
+        self.assertEqual(len(self.main_engine.get_all_active_orders()), len(positions) * 2)
+        self.assertFalse(self.engine.due_out_reqs)
+
+        for vt_symbol in list(self.engine.positions.keys()):
+            self.engine.sync_pos(vt_symbol)
+
+        cancelled = {
+            order.vt_orderid for order in self.main_engine.orders.values()
+            if order.status == Status.CANCELLED
+        }
+        self.assertEqual(set(plan.cancel_orderids), cancelled)
+
+        sync_orders = sorted(
+            (req.vt_symbol, req.direction.value, req.offset.value, req.volume)
+            for req_list in self.engine.due_out_reqs.values() for _, req, _, _ in req_list
+        )
+        plan_orders = sorted(
+            (order.vt_symbol, order.direction.value, order.offset.value, order.volume)
+            for order in plan.orders
+        )
+        self.assertEqual(plan_orders, sync_orders)
+        return plan
+
+    def test_plan_matches_sync_pos(self):
+        plan = self.check_plan({
+            "rb2010.SHFE": {"source_long": 5, "source_short": 2, "target_long": 3, "target_short": 4},
+            "ag2012.SHFE": {"source_long": 1, "target_long": 1},
+            "IF2006.CFFEX": {"source_long": 2, "source_net": 2}
+        })
+        self.assertEqual(plan.skipped_symbols, ["IF2006.CFFEX"])
+        self.assertEqual(len(plan.orders), 2)
+        self.assertEqual(len(plan.cancel_orderids), 1)
+
+    def test_plan_with_multiples(self):
+        self.engine.multiples = 3
+        self.check_plan({
+            "rb2010.SHFE": {"source_long": 2, "target_long": 7, "target_short": 1},
+            "ag2012.SHFE": {"source_short": 1, "target_short": 3}
+        })
+
+    def test_plan_inverse_follow(self):
+        self.engine.inverse_follow = True
+        self.check_plan({
+            "rb2010.SHFE": {"source_long": 2, "source_short": 1, "target_short": 2},
+            "ag2012.SHFE": {"source_long": 0.5, "target_long": 1, "target_short": 1}
+        })
+
+    def test_plan_empty(self):
+        plan = self.check_plan({
+            "rb2010.SHFE": {"source_long": 2, "target_long": 2},
+        })
+        self.assertTrue(plan.is_empty())
+
+
+class TestTradeIdFilter(unittest.TestCase):
+
+    def test_rotate_by_window(self):
+        vt_tradeids = TradeIdFilter(60)
+        self.assertTrue(vt_tradeids.add("CTP.1"))
+        self.assertFalse(vt_tradeids.add("CTP.1"))
+
+        # Kept for one more window after rotated
+        vt_tradeids.rotate_time -= 60
+        self.assertTrue(vt_tradeids.add("CTP.2"))
+        self.assertIn("CTP.1", vt_tradeids)
+        self.assertEqual(vt_tradeids.current, {"CTP.2"})
+
+        vt_tradeids.rotate_time -= 60
+        vt_tradeids.check_rotate()
+        self.assertNotIn("CTP.1", vt_tradeids)
+        self.assertIn("CTP.2", vt_tradeids)
+
+        # Nothing added in last two windows
+        vt_tradeids.rotate_time -= 120
+        vt_tradeids.check_rotate()
+        self.assertEqual(len(vt_tradeids), 0)
+
+    def test_rotate_by_size(self):
+        vt_tradeids = TradeIdFilter(60, max_size=10)
+        vt_tradeids.update([f"CTP.{i}" for i in range(25)])
+        self.assertEqual(len(vt_tradeids.current), 5)
+        self.assertEqual(len(vt_tradeids), 15)
+        self.assertNotIn("CTP.9", vt_tradeids)
+        self.assertIn("CTP.10", vt_tradeids)
+
+    def test_save_and_load(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        filename = str(temp_dir.joinpath("tradeids.json"))
+        try:
+            vt_tradeids = TradeIdFilter(60)
+            vt_tradeids.add("CTP.1")
+            vt_tradeids.rotate_time -= 60
+            vt_tradeids.add("CTP.2")
+            vt_tradeids.save(filename, {"target": ["RPC.1"]})
+
+            loaded = TradeIdFilter(60)
+            self.assertEqual(loaded.load(filename)["target"], ["RPC.1"])
+            self.assertIn("CTP.1", loaded)
+            self.assertIn("CTP.2", loaded)
+
+            # Expired ids are dropped when loaded
+            vt_tradeids.rotate_time -= 120
+            vt_tradeids.save(filename)
+            loaded = TradeIdFilter(60)
+            loaded.load(filename)
+            self.assertEqual(len(loaded), 0)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TestChaseOrder(EngineTestCase):
+
+    def create_cancelled_order(self):
+        """"""
+        return OrderData(
+            gateway_name="RPC",
+            symbol="rb2010",
+            exchange=Exchange.SHFE,
+            orderid="100",
+            direction=Direction.LONG,
+            offset=Offset.OPEN,
+            price=3500,
+            volume=3,
+            traded=1,
+            status=Status.CANCELLED
+        )
+
+    def test_chase_order_price_not_ready(self):
+        self.engine.chase_order_count = 1
+        self.engine.start()
+        self.engine.append_follow_orders("CTP.1", ["RPC.100"])
+
+        # e.g. prices loaded from price board expired
+        self.engine.chase_order(self.create_cancelled_order())
+        self.assertFalse(self.main_engine.orders)
+        self.assertEqual(self.engine.get_queue_order_count(), 1)
+
+        self.put_tick(3600, 3601)
+        self.engine.send_queue_order()
+        self.assertEqual(self.engine.get_queue_order_count(), 0)
+
+        order, = self.main_engine.orders.values()
+        self.assertEqual(order.volume, 2)
+        self.assertEqual(order.price, 3601 + self.engine.tick_add)
+
+
+class TestTradeSink(EngineTestCase):
+
+    def take_rows(self):
+        """"""
+        rows = []
+        while not self.engine.trade_sink.queue.empty():
+            rows.append(self.engine.trade_sink.queue.get_nowait())
+        return rows
+
+    def test_sink_all_target_trades(self):
+        self.main_engine.accounts.append(AccountData(gateway_name="CTP", accountid="10001"))
+        self.engine.start()
+        self.engine.append_follow_orders("CTP.1", ["RPC.100"])
+
+        source_trade = self.create_trade("CTP", "1", Direction.LONG, Offset.OPEN)
+        follow_trade = self.create_trade("RPC", "2", Direction.LONG, Offset.OPEN, orderid="100")
+        manual_trade = self.create_trade("RPC", "3", Direction.LONG, Offset.OPEN)
+        for trade in [source_trade, follow_trade, manual_trade]:
+            self.engine.sink_trade(trade)
+
+        rows = self.take_rows()
+        self.assertEqual([row["vt_tradeid"] for row in rows], ["CTP.1", "RPC.2", "RPC.3"])
+        self.assertEqual(
+            [row["role"] for row in rows],
+            [TradeRole.SOURCE.value, TradeRole.TARGET.value, TradeRole.TARGET.value]
+        )
+        self.assertEqual([row["source_vt_tradeid"] for row in rows], ["", "CTP.1", ""])
+        self.assertEqual({row["source_account"] for row in rows}, {"10001"})
+
+    def test_read_part_without_source_account(self):
+        sink = TradeSink(str(self.temp_dir.joinpath("trade")), use_arrow=False)
+        sink.put_trade(self.create_trade("RPC", "1", Direction.LONG, Offset.OPEN), TradeRole.TARGET)
+        sink.start()
+        sink.stop()
+
+        # Drop column as in part written by older version
+        file_path, = sink.folder_path.glob("date=*/*.csv")
+        with open(file_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            columns = [name for name in rows[0] if name != "source_account"]
+            writer = csv.DictWriter(f, columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+        trades = read_trades(folder_name=str(sink.folder_path), columns=["vt_tradeid", "source_account"])
+        if isinstance(trades, list):
+            self.assertEqual(trades, [{"vt_tradeid": "RPC.1", "source_account": ""}])
+        else:
+            self.assertEqual(trades.to_pylist(), [{"vt_tradeid": "RPC.1", "source_account": ""}])
+
+
+class TestOrderTimeout(EngineTestCase):
+
+    def push_order(self, orderid: str, status: Status = Status.NOTTRADED):
+        """
+        Push order of target gateway, it's also kept in main engine.
+        """
+        order = OrderData(
+            gateway_name="RPC",
+            symbol="rb2010",
+            exchange=Exchange.SHFE,
+            orderid=orderid,
+            direction=Direction.LONG,
+            offset=Offset.OPEN,
+            price=3500,
+            volume=1,
+            status=status
+        )
+        self.main_engine.orders[order.vt_orderid] = order
+        self.engine.process_order_event(Event(EVENT_ORDER, order))
+        return order
+
+    def test_cancel_due_orders(self):
+        self.engine.start()
+        self.engine.append_follow_orders("CTP.1", ["RPC.1", "RPC.2", "RPC.3"])
+
+        self.push_order("1")
+        self.engine.cancel_order_timeout = 0
+        self.push_order("2")
+        self.push_order("3")
+        self.push_order("3", Status.ALLTRADED)
+
+        # Non-follow order is never scheduled
+        self.push_order("4")
+        self.assertEqual(set(self.engine.order_deadlines), {"RPC.1", "RPC.2"})
+
+        self.engine.cancel_timeout_order()
+        self.assertEqual(self.main_engine.orders["RPC.1"].status, Status.NOTTRADED)
+        self.assertEqual(self.main_engine.orders["RPC.2"].status, Status.CANCELLED)
+        self.assertEqual(self.engine.timeout_orderids, {"RPC.2"})
+
+        # Cancelled again later if still active, finished order is dropped
+        self.assertIn("RPC.2", self.engine.order_deadlines)
+        self.push_order("2", Status.CANCELLED)
+        self.assertEqual(set(self.engine.order_deadlines), {"RPC.1"})
+        self.assertFalse(self.engine.timeout_orderids)
+
+    def test_drop_stale_items(self):
+        self.engine.start()
+        orderids = [str(i) for i in range(200)]
+        self.engine.append_follow_orders("CTP.1", [f"RPC.{orderid}" for orderid in orderids])
+
+        for orderid in orderids:
+            self.push_order(orderid)
+        for orderid in orderids[10:]:
+            self.push_order(orderid, Status.ALLTRADED)
+        self.assertEqual(len(self.engine.deadline_heap), 200)
+
+        self.engine.cancel_timeout_order()
+        self.assertEqual(len(self.engine.deadline_heap), 10)
+        self.assertEqual(sorted(vt_orderid for _, vt_orderid in self.engine.deadline_heap),
+                         sorted(self.engine.order_deadlines))
+
+
+class BatchGateway:
+    """
+    Gateway sending orders in one batch.
+    """
+
+    def __init__(self, main_engine: FakeMainEngine):
+        """"""
+        self.main_engine = main_engine
+        self.batches = []
+
+    def send_orders(self, reqs: list):
+        """"""
+        self.batches.append(len(reqs))
+        return [self.main_engine.send_order(req, "RPC") for req in reqs]
+
+
+class TestOrderPacer(unittest.TestCase):
+
+    def setUp(self):
+        """"""
+        self.main_engine = FakeMainEngine()
+
+    @staticmethod
+    def create_items(count: int, symbol: str = "rb2010"):
+        """"""
+        return [
+            (
+                OrderRequest(
+                    symbol=symbol,
+                    exchange=Exchange.SHFE,
+                    direction=Direction.LONG,
+                    type=OrderType.LIMIT,
+                    volume=1,
+                    price=3500,
+                    offset=Offset.OPEN
+                ),
+                i
+            )
+            for i in range(count)
+        ]
+
+    @staticmethod
+    def pass_time(pacer: OrderPacer, seconds: float):
+        """
+        Move last refill time of all buckets back, as if time passed.
+        """
+        for bucket in [pacer.bucket] + list(pacer.symbol_buckets.values()):
+            bucket.last_time -= seconds
+
+    def test_unlimited(self):
+        pacer = OrderPacer(self.main_engine, "RPC")
+        items = self.create_items(100)
+        self.assertEqual(pacer.put_orders(items), items)
+        self.assertEqual(pacer.get_queue_size(), 0)
+
+    def test_order_rate(self):
+        pacer = OrderPacer(self.main_engine, "RPC", order_rate=5)
+        batch = pacer.put_orders(self.create_items(8))
+        self.assertEqual([i for _, i in batch], [0, 1, 2, 3, 4])
+        self.assertEqual(pacer.get_queue_size(), 3)
+
+        # New orders wait after queued ones, even if tokens are available
+        self.pass_time(pacer, 1)
+        self.assertEqual(pacer.put_orders(self.create_items(2)), [])
+        self.assertEqual([i for _, i in pacer.take_queued()], [5, 6, 7, 0, 1])
+        self.assertEqual(pacer.get_queue_size(), 0)
+
+        stats = pacer.get_stats()
+        self.assertEqual(stats["sent_count"], 10)
+        self.assertEqual(stats["queued_count"], 5)
+
+    def test_symbol_rate(self):
+        pacer = OrderPacer(self.main_engine, "RPC", symbol_rate=2)
+        items = self.create_items(3) + self.create_items(1, "ag2012")
+        batch = pacer.put_orders(items)
+
+        # Sequence is kept, so order of other symbol waits too
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(pacer.get_queue_size(), 2)
+
+        self.pass_time(pacer, 1)
+        self.assertEqual([req.symbol for req, _ in pacer.take_queued()], ["rb2010", "ag2012"])
+
+    def test_send_reqs(self):
+        pacer = OrderPacer(self.main_engine, "RPC")
+        reqs = [req for req, _ in self.create_items(3)]
+        self.assertEqual(pacer.send_reqs(reqs), ["RPC.1", "RPC.2", "RPC.3"])
+
+        gateway = BatchGateway(self.main_engine)
+        self.main_engine.gateways["RPC"] = gateway
+        self.assertEqual(pacer.send_reqs(reqs), ["RPC.4", "RPC.5", "RPC.6"])
+        self.assertEqual(pacer.send_reqs(reqs[:1]), ["RPC.7"])
+        self.assertEqual(gateway.batches, [3])
+
+        self.assertTrue(OrderPacer.is_batch_supported(gateway))
+        self.assertFalse(OrderPacer.is_batch_supported(object()))
+
+
+class TestAdaptivePricer(unittest.TestCase):
+
+    def setUp(self):
+        """"""
+        self.pricer = AdaptivePricer(min_ticks=1, max_ticks=10, alpha=1)
+
+    def update_tick(self, bid_price: float, ask_price: float, bid_volume: float, ask_volume: float):
+        """"""
+        tick = TickData(
+            gateway_name="CTP",
+            symbol="rb2010",
+            exchange=Exchange.SHFE,
+            datetime=datetime.now(),
+            bid_price_1=bid_price,
+            ask_price_1=ask_price,
+            bid_volume_1=bid_volume,
+            ask_volume_1=ask_volume
+        )
+        self.pricer.update_tick(tick, 1)
+
+    def test_min_ticks(self):
+        self.assertEqual(self.pricer.get_cross_ticks("rb2010.SHFE", Direction.LONG), 1)
+
+        self.update_tick(3500, 3503, 10, 20)
+        self.assertEqual(self.pricer.get_cross_ticks("rb2010.SHFE", Direction.LONG, 20), 1)
+        self.assertEqual(self.pricer.get_cross_ticks("rb2010.SHFE", Direction.SHORT, 10), 1)
+
+    def test_volume_exceeds_top(self):
+        self.update_tick(3500, 3503, 10, 20)
+        self.assertEqual(self.pricer.get_cross_ticks("rb2010.SHFE", Direction.LONG, 21), 4)
+        self.assertEqual(self.pricer.get_cross_ticks("rb2010.SHFE", Direction.SHORT, 11), 4)
+
+        # One-sided book keeps spread of last time
+        self.update_tick(3500, 0, 10, 0)
+        self.assertEqual(self.pricer.get_cross_ticks("rb2010.SHFE", Direction.SHORT, 11), 4)
+
+    def test_fill_rate_and_chase(self):
+        self.pricer.update_fill("rb2010.SHFE", False)
+        self.assertEqual(self.pricer.get_cross_ticks("rb2010.SHFE", Direction.LONG), 10)
+
+        self.pricer.update_fill("rb2010.SHFE", True)
+        self.assertEqual(self.pricer.get_cross_ticks("rb2010.SHFE", Direction.LONG, chase_count=2), 3)
+        self.assertEqual(self.pricer.get_cross_ticks("rb2010.SHFE", Direction.LONG, chase_count=20), 10)
+
+    def test_moving_average(self):
+        pricer = AdaptivePricer(min_ticks=2, max_ticks=12, alpha=0.5)
+        pricer.update_fill("rb2010.SHFE", False)
+        self.assertEqual(pricer.get_stats()["rb2010.SHFE"]["fill_rate"], 0.5)
+        self.assertEqual(pricer.get_cross_ticks("rb2010.SHFE", Direction.LONG), 7)
+
+        pricer.set_range(20, 12)
+        self.assertEqual(pricer.get_cross_ticks("rb2010.SHFE", Direction.LONG), 12)
+
+
+class TestPositionTable(unittest.TestCase):
+
+    def setUp(self):
+        """"""
+        self.table = PositionTable(["source_long", "source_short", "target_long"], capacity=2)
+
+    def test_dict_interface(self):
+        self.table["rb2010.SHFE"] = {"source_long": 2}
+        self.table.setdefault("IF2006.CFFEX")["target_long"] = 1.5
+
+        self.assertEqual(self.table["rb2010.SHFE"]["source_long"], 2)
+        self.assertIsInstance(self.table["rb2010.SHFE"]["source_long"], int)
+        self.assertEqual(self.table["IF2006.CFFEX"]["target_long"], 1.5)
+        self.assertEqual(self.table.get("ag2012.SHFE", {}), {})
+        self.assertRaises(KeyError, self.table.__getitem__, "ag2012.SHFE")
+        self.assertEqual(
+            self.table.copy(),
+            {
+                "rb2010.SHFE": {"source_long": 2, "source_short": 0, "target_long": 0},
+                "IF2006.CFFEX": {"source_long": 0, "source_short": 0, "target_long": 1.5}
+            }
+        )
+
+    def test_grow_and_pop(self):
+        vt_symbols = [f"rb20{i:02d}.SHFE" for i in range(5)]
+        for i, vt_symbol in enumerate(vt_symbols):
+            self.table[vt_symbol] = {"source_long": i}
+        self.assertEqual(len(self.table), 5)
+
+        # Last row is moved to the place of popped one
+        self.assertEqual(self.table.pop(vt_symbols[1]), {"source_long": 1, "source_short": 0, "target_long": 0})
+        self.assertEqual(self.table.pop(vt_symbols[1], None), None)
+        self.assertEqual(self.table.keys(), [vt_symbols[0], vt_symbols[4], vt_symbols[2], vt_symbols[3]])
+        self.assertEqual(self.table[vt_symbols[4]]["source_long"], 4)
+        self.assertEqual(self.table.get_column("source_long").tolist(), [0, 4, 2, 3])
+
+    def test_changed_rows(self):
+        self.table.load({"rb2010.SHFE": {"source_long": 1}, "IF2006.CFFEX": {"source_short": 1}})
+        self.assertEqual(self.table.pop_changed_rows().tolist(), [0, 1])
+        self.assertEqual(self.table.pop_changed_rows().tolist(), [])
+
+        self.table["IF2006.CFFEX"]["target_long"] = 1
+        self.assertEqual(self.table.pop_changed_rows().tolist(), [1])
+
+        # Changed flag of moved row is kept
+        self.table["IF2006.CFFEX"]["target_long"] = 2
+        self.table.pop("rb2010.SHFE")
+        self.assertEqual(self.table.pop_changed_rows().tolist(), [0])
+
+        self.table.mark_all_changed()
+        self.assertEqual(self.table.pop_changed_rows().tolist(), [0])
+
+
+class TestDataStore(unittest.TestCase):
+
+    def setUp(self):
+        """"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.data = {"tradeid_orderids_dict": {}, "positions": {}}
+        self.store = self.create_store()
+
+    def tearDown(self):
+        """"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def create_store(self):
+        """"""
+        return FollowDataStore(str(self.temp_dir.joinpath("data.json")), lambda: copy.deepcopy(self.data))
+
+    def write_queued(self):
+        """
+        Write queued items as writer thread does.
+        """
+        records = []
+        while not self.store.queue.empty():
+            records.append(self.store.queue.get_nowait())
+        self.store.write_records(records)
+
+    def put_record(self, record_type: RecordType, payload: tuple):
+        """
+        Change data and put record as engine does.
+        """
+        FollowDataStore.apply_record(self.data, record_type, payload)
+        self.store.put_record(record_type, payload)
+
+    def test_put_snapshot(self):
+        self.put_record(RecordType.TRADE_ACCEPTED, ("CTP.1",))
+        self.data["tradeid_orderids_dict"].clear()
+        self.store.put_snapshot()
+        self.put_record(RecordType.TRADE_ACCEPTED, ("CTP.2",))
+        self.write_queued()
+
+        self.assertFalse(self.store.snapshot_queued)
+        self.assertEqual(self.store.load()["tradeid_orderids_dict"], {})
+
+        # Only record after snapshot is left in journal
+        data = self.store.load()
+        self.assertEqual(self.create_store().replay(data), 1)
+        self.assertEqual(data["tradeid_orderids_dict"], {"CTP.2": []})
+
+    def put_records(self):
+        """"""
+        self.put_record(RecordType.TRADE_ACCEPTED, ("CTP.1",))
+        self.put_record(RecordType.ORDERS_SENT, ("CTP.1", ("RPC.1", "RPC.2")))
+        self.put_record(RecordType.TARGET_FILL, ("CTP.1", "rb2010.SHFE", {"source_long": 2, "target_long": 2}))
+        self.put_record(RecordType.POS_DELTA, ("rb2010.SHFE", {"source_long": 3}))
+        self.put_record(RecordType.TARGET_POS, ("RPC2", "rb2010.SHFE", {"target_long": 1}))
+
+    def test_journal_replay(self):
+        self.store.save()
+        self.put_records()
+        self.write_queued()
+
+        data = self.store.load()
+        self.assertEqual(self.create_store().replay(data), 5)
+        self.assertEqual(data, self.data)
+
+    def test_journal_corrupt_tail(self):
+        self.store.save()
+        self.put_records()
+        self.write_queued()
+        expected = copy.deepcopy(self.data)
+
+        # Last record broken by crash while writing: payload changed, then truncated
+        self.put_record(RecordType.TRADE_ACCEPTED, ("CTP.2",))
+        self.write_queued()
+        journal_path = self.store.journal_path
+        size = journal_path.stat().st_size
+        with open(journal_path, "r+b") as f:
+            f.seek(size - 1)
+            f.write(b"\xff")
+
+        store = self.create_store()
+        data = store.load()
+        self.assertEqual(store.replay(data), 5)
+        self.assertEqual(data, expected)
+
+        # Broken tail is dropped, so new records are replayed after valid ones
+        valid_size = journal_path.stat().st_size
+        self.assertLess(valid_size, size)
+        store.put_record(RecordType.TRADE_ACCEPTED, ("CTP.3",))
+        self.store = store
+        self.write_queued()
+
+        data = store.load()
+        self.assertEqual(self.create_store().replay(data), 6)
+        self.assertIn("CTP.3", data["tradeid_orderids_dict"])
+        self.assertNotIn("CTP.2", data["tradeid_orderids_dict"])
+
+        with open(journal_path, "ab") as f:
+            f.write(b"\x01\x02")
+        data = store.load()
+        self.assertEqual(self.create_store().replay(data), 6)
+
+
+class TestContractStore(EngineTestCase):
+
+    def test_save_and_dump(self):
+        store = ContractStore(
+            str(self.temp_dir.joinpath("contract.db")),
+            legacy_filename=str(self.temp_dir.joinpath("contracts.data"))
+        )
+        store.load()
+        store.start()
+
+        contracts = self.main_engine.get_all_contracts()
+        store.put_contracts(contracts[:1])
+        store.put_contracts(contracts, dump=True)
+        store.stop()
+
+        with open(store.legacy_path, "rb") as f:
+            self.assertEqual([c.vt_symbol for c in pickle.load(f)], ["rb2010.SHFE", "IF2006.CFFEX"])
+
+        loaded = ContractStore(str(self.temp_dir.joinpath("contract.db")), legacy_filename="").load()
+        self.assertEqual(loaded["IF2006.CFFEX"].pricetick, 0.2)
+        self.assertEqual(set(loaded), {"rb2010.SHFE", "IF2006.CFFEX"})
+
+
+if __name__ == "__main__":
+    unittest.main()
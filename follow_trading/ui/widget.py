@@ -19,8 +19,9 @@ from vnpy.trader.constant import (
 from ..engine import (
     APP_NAME,
     FollowEngine,
+    DispatchMode,
     EVENT_FOLLOW_LOG,
-    EVENT_FOLLOW_POS_DELTA
+    EVENT_FOLLOW_POS_SNAPSHOT
 )
 
 
@@ -105,6 +106,11 @@ class FollowManager(QtWidgets.QWidget):
         self.order_type_combo.addItems(['限价', '市价'])
         self.order_type_combo.activated[str].connect(self.set_order_type)
 
+        self.dispatch_mode_combo = QtWidgets.QComboBox()
+        self.dispatch_mode_combo.addItems([mode.value for mode in DispatchMode])
+        self.dispatch_mode_combo.setCurrentText(self.follow_engine.dispatch_mode.value)
+        self.dispatch_mode_combo.activated[str].connect(self.set_dispatch_mode)
+
         self.skip_contracts_combo = ComboBox()
         self.skip_contracts_combo.pop_show.connect(self.refresh_skip_contracts)
         self.refresh_skip_contracts()
@@ -118,9 +124,13 @@ class FollowManager(QtWidgets.QWidget):
 
         validator = QtGui.QIntValidator()
         self.timeout_line = QtWidgets.QLineEdit(str(self.follow_engine.cancel_order_timeout))
-        self.timeout_line.setValidator(validator)
+        self.timeout_line.setValidator(QtGui.QDoubleValidator())
         self.timeout_line.editingFinished.connect(self.set_cancel_order_timeout)
 
+        self.chase_count_line = QtWidgets.QLineEdit(str(self.follow_engine.chase_order_count))
+        self.chase_count_line.setValidator(validator)
+        self.chase_count_line.editingFinished.connect(self.set_chase_order_count)
+
         self.follow_timeout_line = QtWidgets.QLineEdit(str(self.follow_engine.filter_trade_timeout))
         self.follow_timeout_line.setValidator(validator)
         self.follow_timeout_line.editingFinished.connect(self.set_follow_timeout)
@@ -138,6 +148,7 @@ class FollowManager(QtWidgets.QWidget):
         self.single_max_line.editingFinished.connect(self.set_single_max)
 
         self.pos_delta_monitor = PosDeltaMonitor(self.main_engine, self.event_engine)
+        self.follow_engine.request_pos_snapshot()
         self.log_monitor = LogMonitor(self.main_engine, self.event_engine)
 
         # set layout
@@ -145,8 +156,10 @@ class FollowManager(QtWidgets.QWidget):
         form.addRow("跟随接口名", self.source_combo)
         form.addRow("发单接口名", self.target_combo)
         form.addRow("发单类型", self.order_type_combo)
+        form.addRow("发单模式", self.dispatch_mode_combo)
         form.addRow("跟单方向", self.follow_direction_combo)
         form.addRow("超时自动撤单（秒）", self.timeout_line)
+        form.addRow("超时追单次数", self.chase_count_line)
         form.addRow("超时禁止跟单（秒）", self.follow_timeout_line)
         form.addRow("超价下单档位", self.tickout_line)
         form.addRow("跟随倍数", self.multiples_line)
@@ -201,12 +214,23 @@ class FollowManager(QtWidgets.QWidget):
             self.follow_engine.set_parameters('order_type', OrderType.MARKET)
         self.write_log(f"发单类型：{self.follow_engine.order_type.value} 切换成功")
 
+    def set_dispatch_mode(self, dispatch_mode: str):
+        """"""
+        self.follow_engine.set_parameters('dispatch_mode', DispatchMode(dispatch_mode))
+        self.write_log(f"发单模式：{self.follow_engine.dispatch_mode.value} 切换成功")
+
     def set_cancel_order_timeout(self):
         """"""
         text = self.timeout_line.text()
-        self.follow_engine.set_parameters('cancel_order_timeout', int(text))
+        self.follow_engine.set_parameters('cancel_order_timeout', float(text))
         self.write_log(f"未成交自动撤单超时：{self.follow_engine.cancel_order_timeout} 秒设置成功")
 
+    def set_chase_order_count(self):
+        """"""
+        text = self.chase_count_line.text()
+        self.follow_engine.set_parameters('chase_order_count', int(text))
+        self.write_log(f"超时追单次数：{self.follow_engine.chase_order_count} 设置成功")
+
     def set_follow_timeout(self):
         text = self.follow_timeout_line.text()
         self.follow_engine.set_parameters('filter_trade_timeout', int(text))
@@ -358,7 +382,7 @@ class PosDeltaMonitor(BaseMonitor):
     """
     Monitor for position delta.
     """
-    event_type = EVENT_FOLLOW_POS_DELTA
+    event_type = EVENT_FOLLOW_POS_SNAPSHOT
     data_key = "vt_symbol"
     sorting = True
 
@@ -380,6 +404,21 @@ class PosDeltaMonitor(BaseMonitor):
         super(PosDeltaMonitor, self).init_ui()
         self.resize_columns()
 
+    def process_event(self, event: Event):
+        """
+        Update all rows in pos snapshot event.
+        """
+        self.setSortingEnabled(False)
+
+        for data in event.data:
+            if data.vt_symbol in self.cells:
+                self.update_old_row(data)
+            else:
+                self.insert_new_row(data)
+
+        self.setSortingEnabled(True)
+
+
 class LogMonitor(BaseMonitor):
     """
     Monitor for log data.
@@ -435,6 +474,9 @@ class SyncPosEditor(QtWidgets.QDialog):
         self.sync_all_button = QtWidgets.QPushButton("所有持仓同步")
         self.sync_all_button.clicked.connect(self.sync_all)
 
+        self.preview_all_button = QtWidgets.QPushButton("所有持仓同步预览")
+        self.preview_all_button.clicked.connect(self.preview_sync_all)
+
         self.sync_net_button = QtWidgets.QPushButton("日内交易同步")
         self.sync_net_button.clicked.connect(lambda: self.sync_net_delta(is_sync_baisc=False))
 
@@ -445,6 +487,7 @@ class SyncPosEditor(QtWidgets.QDialog):
                     self.sync_close_button,
                     self.sync_button,
                     self.sync_all_button,
+                    self.preview_all_button,
                     self.sync_net_button,
                     self.sync_basic_button]:
             btn.setFixedHeight(btn.sizeHint().height() * 1.5)
@@ -456,6 +499,7 @@ class SyncPosEditor(QtWidgets.QDialog):
         form_sync.addRow(self.sync_close_button)
         form_sync.addRow(self.sync_button)
         form_sync.addRow(self.sync_all_button)
+        form_sync.addRow(self.preview_all_button)
         form_sync.addRow(self.sync_net_button)
         form_sync.addRow(self.sync_basic_button)
 
@@ -501,6 +545,11 @@ class SyncPosEditor(QtWidgets.QDialog):
         """"""
         self.follow_engine.sync_all_pos()
 
+    def preview_sync_all(self):
+        """"""
+        dialog = SyncPlanDialog(self, self.follow_engine)
+        dialog.exec_()
+
     def sync_net_delta(self, is_sync_baisc: bool):
         """"""
         vt_symbol = self.sync_symbol
@@ -512,6 +561,101 @@ class SyncPosEditor(QtWidgets.QDialog):
         self.follow_engine.write_log(msg)
 
 
+class SyncPlanDialog(QtWidgets.QDialog):
+    """
+    Dry run of syncing all positions, plan is executed only after confirmed.
+    """
+
+    headers = ["类型", "合约", "方向", "开平", "数量", "委托号", "转换结果"]
+
+    def __init__(self, parent: QtWidgets.QWidget, follow_engine: FollowEngine):
+        super().__init__()
+
+        self.parent = parent
+        self.follow_engine = follow_engine
+        self.plan = None
+
+        self.init_ui()
+        self.refresh_plan()
+
+    def init_ui(self):
+        self.setWindowTitle("同步预览")
+        self.setMinimumWidth(600)
+        self.setMinimumHeight(400)
+
+        self.summary_label = QtWidgets.QLabel()
+
+        self.table = QtWidgets.QTableWidget()
+        self.table.setColumnCount(len(self.headers))
+        self.table.setHorizontalHeaderLabels(self.headers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(self.table.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+
+        refresh_button = QtWidgets.QPushButton("刷新")
+        refresh_button.clicked.connect(self.refresh_plan)
+
+        self.execute_button = QtWidgets.QPushButton("执行同步")
+        self.execute_button.clicked.connect(self.execute_plan)
+
+        hbox = QtWidgets.QHBoxLayout()
+        hbox.addWidget(refresh_button)
+        hbox.addWidget(self.execute_button)
+
+        vbox = QtWidgets.QVBoxLayout()
+        vbox.addWidget(self.summary_label)
+        vbox.addWidget(self.table)
+        vbox.addLayout(hbox)
+
+        self.setLayout(vbox)
+
+    def refresh_plan(self):
+        """"""
+        self.plan = self.follow_engine.plan_sync_all()
+        plan = self.plan
+
+        steps = self.follow_engine.simulate_sync_plan(plan)
+
+        rows = []
+        for vt_orderid, vt_symbol in plan.cancel_orderids.items():
+            rows.append(["撤单", vt_symbol, "", "", "", vt_orderid, ""])
+        for order, step in zip(plan.orders, steps):
+            if not step:
+                result = "合约不存在"
+            elif step.child_reqs:
+                result = " ".join(f"{req.offset.value}{req.volume}" for req in step.child_reqs)
+            else:
+                result = "可用仓位不足"
+            rows.append(["委托", order.vt_symbol, order.direction.value, order.offset.value, str(order.volume), "", result])
+        for vt_symbol in plan.skipped_symbols:
+            rows.append(["跳过(日内)", vt_symbol, "", "", "", "", ""])
+
+        self.table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for j, text in enumerate(row):
+                self.table.setItem(i, j, QtWidgets.QTableWidgetItem(text))
+
+        self.summary_label.setText(f"{plan.create_time.strftime('%H:%M:%S')} {plan.get_summary()}")
+        self.execute_button.setEnabled(not plan.is_empty())
+
+    def execute_plan(self):
+        """
+        Plan is refreshed instead of executed if positions or orders changed after preview.
+        """
+        plan = self.follow_engine.plan_sync_all()
+        if (plan.cancel_orderids, plan.orders) != (self.plan.cancel_orderids, self.plan.orders):
+            self.refresh_plan()
+            self.write_log("持仓或委托已变化，同步预览已刷新，请重新确认。")
+            return
+
+        self.follow_engine.execute_sync_plan(self.plan)
+        self.accept()
+
+    def write_log(self, msg: str):
+        """"""
+        self.follow_engine.write_log(msg)
+
+
 class PosEditor(QtWidgets.QDialog):
     def __init__(self, parent: QtWidgets.QWidget, follow_engine: FollowEngine):
         super().__init__()
@@ -725,6 +869,7 @@ class SkipContractEditor(QtWidgets.QDialog):
         commodity = self.new_intra_line.text()
         if commodity not in self.follow_engine.get_intraday_symbols():
             self.follow_engine.get_intraday_symbols().append(commodity)
+            self.follow_engine.clear_symbol_meta()
             self.refresh_intra_list()
             self.parent.refresh_intraday()
             self.write_log(f"{commodity}添加到日内模式成功")
@@ -738,6 +883,7 @@ class SkipContractEditor(QtWidgets.QDialog):
             intra_symbols = self.follow_engine.get_intraday_symbols()
             if commodity in intra_symbols:
                 intra_symbols.remove(commodity)
+                self.follow_engine.clear_symbol_meta()
                 self.refresh_intra_list()
                 self.parent.refresh_intraday()
                 self.write_log(f"{commodity}从日内模式移除成功")
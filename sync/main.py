@@ -1,5 +1,5 @@
 import traceback
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 
 from sync.logger import logger
 from sync.setting import mysql_setting, Content, MYSQL_SETTING_FILENAME
@@ -14,20 +14,27 @@ print(mysql_setting)
 def main():
     logger.info(f"连接数据库 {mysql_setting['host']}:{mysql_setting['port']}")
     mysql = MySqlHandler()
-    mysql.connect(**mysql_setting)
+    # 连接池在第一个连接可用后返回，失败时按间隔重试
+    if not mysql.connect(**mysql_setting):
+        return
 
-    logger.info("数据库连接等待...")
-    for i in reversed(range(5)):
-        logger.info(f"等待倒计时:{i}")
-        sleep(1)
+    # contents = [Content.CTA_SETTING, Content.CTA_DATA, Content.FOLLOW_DATA]
+    contents = [Content.FOLLOW_DATA]
 
     try:
         init()
-        # for content in [Content.CTA_SETTING, Content.CTA_DATA, Content.FOLLOW_DATA]:
-        #     sync(mysql, content)
-        sync(mysql, Content.FOLLOW_DATA)
+        # 各类数据的同步任务并发执行，每个任务使用连接池中的一个连接
+        with ThreadPoolExecutor(max_workers=len(contents)) as executor:
+            futures = {executor.submit(sync, mysql, content): content for content in contents}
+            for future, content in futures.items():
+                try:
+                    future.result()
+                except:  # noqa
+                    logger.info(f"{content.value}：同步失败")
+                    traceback.print_exc()
     except:
         traceback.print_exc()
+    finally:
         mysql.close_db()
 
 
@@ -1,31 +1,46 @@
 import traceback
-import pymysql
+from threading import local
 from functools import wraps
 from datetime import datetime
+from contextlib import contextmanager
 from pymysql.cursors import DictCursor
-from typing import Callable
+from typing import Callable, List
 
 from sync.logger import logger
+from sync.setting import SYNC_CHUNK_SIZE, pool_setting
+from sync.mysql_pool import MySqlPool, CONNECTION_ERRORS
 
 
 def execute_decorator(func: Callable):
     @wraps(func)
     def wrapper(self, *args, **kwargs):
-        self.cursor_list.append(self.get_cursor())
-        # print(self.cursor_list)
-        try:
-            res = func(self, *args, **kwargs)
-            logger.debug(f"{func.__name__} Mysql语句执行成功")
-            return res
-        except:
-            self.db.rollback()
-            logger.debug(f"{func.__name__} Mysql语句执行异常")
-            traceback.print_exc()
-            return 0
-        finally:
-            self.cursor.close()
-            self.cursor_list.pop()
-            # print(self.cursor_list)
+        # 连接断开时，最外层的调用在新连接上重试一次
+        # 嵌套调用的任何异常都抛给外层处理，使外层事务整体回滚
+        nested = self.in_transaction()
+        retry = 1
+        while True:
+            try:
+                with self.transaction():
+                    with self.open_cursor():
+                        res = func(self, *args, **kwargs)
+                logger.debug(f"{func.__name__} Mysql语句执行成功")
+                return res
+            except CONNECTION_ERRORS:
+                if nested:
+                    raise
+                if retry:
+                    retry -= 1
+                    logger.info(f"{func.__name__} Mysql连接断开，重新执行")
+                    continue
+                logger.debug(f"{func.__name__} Mysql语句执行异常")
+                traceback.print_exc()
+                return 0
+            except:  # noqa
+                if nested:
+                    raise
+                logger.debug(f"{func.__name__} Mysql语句执行异常")
+                traceback.print_exc()
+                return 0
 
     return wrapper
 
@@ -37,19 +52,23 @@ class MySqlHandler(object):
         str: 'varchar(255)',
         datetime: 'datetime'
     }
+    # Unique key of utf8 varchar(255) columns exceeds index length limit of old InnoDB.
+    KEY_FIELD_TYPE = 'varchar(100)'
 
-    def __init__(self):
-        self.db = None
+    def __init__(self, chunk_size: int = SYNC_CHUNK_SIZE):
+        self.pool = None
 
-        # 嵌套执行含有装饰器的函数时，需要多个cursor
-        self.cursor_list = []
+        # 批量写入时每次executemany的行数
+        self.chunk_size = chunk_size
+
+        # 每个线程当前事务的连接和cursor，多个同步任务可以并发使用同一个handler
+        self.local = local()
 
         self.cursor_type = DictCursor
 
     def __del__(self):
-        if self.db.open:
-            self.db.close()
-        print('对象析构，断开数据库连接')
+        if self.pool:
+            self.pool.close()
 
     @staticmethod
     def gen_insert_sql(table_name: str, record: dict) -> str:
@@ -63,8 +82,22 @@ class MySqlHandler(object):
         sql = f"INSERT INTO `{table_name}` ({keys_str}) VALUES ({values_str});"
         return sql
 
+    @staticmethod
+    def gen_upsert_sql(table_name: str, record: dict, key_fields: tuple) -> str:
+        """
+        Insert record, or update it if row of same unique key exists.
+        """
+        ordered_key = list(record.keys())
+        keys_str = ', '.join(f"`{key}`" for key in ordered_key)
+        values_str = ', '.join(f"%({key})s" for key in ordered_key)
+        update_keys = [key for key in ordered_key if key not in key_fields] or ordered_key[:1]
+        update_str = ', '.join(f"`{key}` = VALUES(`{key}`)" for key in update_keys)
+        sql = (f"INSERT INTO `{table_name}` ({keys_str}) VALUES ({values_str}) "
+               f"ON DUPLICATE KEY UPDATE {update_str};")
+        return sql
+
     @classmethod
-    def gen_create_table_sql(cls, table_name: str, field_dict: dict) -> str:
+    def gen_create_table_sql(cls, table_name: str, field_dict: dict, key_fields: tuple = ()) -> str:
         """
         Parse table field from field dict example.
         field_dict example:
@@ -73,11 +106,19 @@ class MySqlHandler(object):
             "fast_ma0": 0.0,
             "slow_ma0": 0.0,
         }
+        key_fields: fields of unique key, example: ('strategy_name',)
         """
         fields = []
         for key, value in field_dict.items():
-            field = f"`{key}` {cls.PY_TYPE_TO_MYSQL_FIELD_MAP[type(value)]} NOT NULL"
+            if key in key_fields:
+                field_type = cls.KEY_FIELD_TYPE
+            else:
+                field_type = cls.PY_TYPE_TO_MYSQL_FIELD_MAP[type(value)]
+            field = f"`{key}` {field_type} NOT NULL"
             fields.append(field)
+        if key_fields:
+            keys_str = ', '.join(f"`{key}`" for key in key_fields)
+            fields.append(f"UNIQUE KEY `uk_{table_name}` ({keys_str})")
         field_sql = ',\n'.join(fields)
 
         sql = f"""
@@ -113,13 +154,19 @@ class MySqlHandler(object):
         self.cursor.execute(sql, *args, **kwargs)
         return self.cursor
 
-    def connect(self, *args, **kwargs):
+    def connect(self, **kwargs) -> bool:
+        """
+        Create connection pool, return after first connection is ready.
+        """
         try:
-            self.db = pymysql.connect(*args, **kwargs)
+            self.pool = MySqlPool(kwargs, **pool_setting)
+            self.pool.open()
             logger.info("Mysql连接成功")
-        except:
+            return True
+        except:  # noqa
             logger.info('Mysql连接失败')
             traceback.print_exc()
+            return False
 
     def set_cursor_type(self, cursor_class: object):
         """
@@ -131,12 +178,56 @@ class MySqlHandler(object):
         return self.db.cursor(self.cursor_type)
 
     def close_db(self):
-        self.db.close()
+        self.pool.close()
         logger.info("Mysql连接关闭")
 
+    def in_transaction(self) -> bool:
+        return getattr(self.local, 'db', None) is not None
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run statements on one pooled connection, commit them together when exit,
+        or rollback if any error. Nested transaction joins the outer one.
+        """
+        if self.in_transaction():
+            yield self.local.db
+            return
+
+        with self.pool.connection() as db:
+            self.local.db = db
+            try:
+                yield db
+                db.commit()
+            except CONNECTION_ERRORS:
+                raise
+            except:  # noqa
+                db.rollback()
+                raise
+            finally:
+                self.local.db = None
+
+    @contextmanager
+    def open_cursor(self):
+        """
+        Cursor used by self.cursor, restored to the outer one after nested call.
+        """
+        outer_cursor = getattr(self.local, 'cursor', None)
+        cursor = self.get_cursor()
+        self.local.cursor = cursor
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            self.local.cursor = outer_cursor
+
+    @property
+    def db(self):
+        return self.local.db
+
     @property
     def cursor(self):
-        return self.cursor_list[-1]
+        return self.local.cursor
 
     @execute_decorator
     def get_tables(self, table_name: str, precise: bool = True):
@@ -147,14 +238,23 @@ class MySqlHandler(object):
         result = cursor.fetchall()
         return result
 
+    def get_table_names(self, table_name: str, precise: bool = True) -> list:
+        tables = self.get_tables(table_name, precise)
+        return [list(row.values())[0] for row in tables] if tables else []
+
     def is_table_exists(self, table_name: str, precise: bool = True):
         res = self.get_tables(table_name, precise)
         return len(res) > 0
 
     @execute_decorator
-    def create_table(self, table_name: str, field_dict: dict):
+    def get_columns(self, table_name: str) -> list:
+        self._execute(f"SHOW COLUMNS FROM `{table_name}`;")
+        return [row['Field'] for row in self.cursor.fetchall()]
+
+    @execute_decorator
+    def create_table(self, table_name: str, field_dict: dict, key_fields: tuple = ()):
         if not self.is_table_exists(table_name):
-            create_sql = self.gen_create_table_sql(table_name, field_dict)
+            create_sql = self.gen_create_table_sql(table_name, field_dict, key_fields)
             self._execute(create_sql)
             logger.debug(f"{table_name}:数据表创建成功")
         else:
@@ -173,9 +273,97 @@ class MySqlHandler(object):
     def insert(self, table_name: str, record: dict):
         sql = self.gen_insert_sql(table_name, record)
         self._execute(sql, record)
-        self.db.commit()
         logger.debug("数据插入并提交成功")
 
+    @execute_decorator
+    def upsert(self, table_name: str, record: dict, key_fields: tuple):
+        """
+        Insert or update record by unique key, table must be created with key_fields.
+        """
+        sql = self.gen_upsert_sql(table_name, record, key_fields)
+        self._execute(sql, record)
+        logger.debug("数据更新并提交成功")
+
+    @staticmethod
+    def group_records(records: List[dict], chunk_size: int):
+        """
+        Split records into chunks of same fields, so each chunk can be sent by one executemany.
+        """
+        groups = {}
+        for record in records:
+            groups.setdefault(tuple(record.keys()), []).append(record)
+
+        for group in groups.values():
+            for i in range(0, len(group), chunk_size):
+                yield group[i:i + chunk_size]
+
+    def _execute_many(self, sql_func: Callable, records: List[dict], chunk_size: int = 0) -> int:
+        """
+        pymysql rewrites executemany of INSERT ... VALUES to one multi-row INSERT per chunk.
+        """
+        count = 0
+        for chunk in self.group_records(records, chunk_size or self.chunk_size):
+            sql = sql_func(chunk[0])
+            count += self.cursor.executemany(sql, chunk)
+        return count
+
+    @execute_decorator
+    def insert_many(self, table_name: str, records: List[dict], chunk_size: int = 0):
+        """
+        Insert records in chunks in one transaction, rollback all if any chunk failed.
+        """
+        if not records:
+            return 0
+        self._execute_many(lambda record: self.gen_insert_sql(table_name, record), records, chunk_size)
+        logger.debug(f"数据表{table_name} 批量插入{len(records)}条数据成功")
+        return len(records)
+
+    @execute_decorator
+    def upsert_many(self, table_name: str, records: List[dict], key_fields: tuple, chunk_size: int = 0):
+        """
+        Insert or update records by unique key in chunks in one transaction.
+        """
+        if not records:
+            return 0
+        self._execute_many(lambda record: self.gen_upsert_sql(table_name, record, key_fields), records, chunk_size)
+        logger.debug(f"数据表{table_name} 批量更新{len(records)}条数据成功")
+        return len(records)
+
+    @execute_decorator
+    def delete_keys(self, table_name: str, key_fields: tuple, keys: list):
+        """
+        Delete rows by unique keys in one transaction.
+        :param keys: list of tuple of key values, in the order of key_fields.
+        """
+        cond_sql = ' AND '.join(f"`{field}` = %s" for field in key_fields)
+        sql = f"DELETE FROM `{table_name}` WHERE {cond_sql};"
+        keys = [tuple(key) for key in keys]
+        for i in range(0, len(keys), self.chunk_size):
+            self.cursor.executemany(sql, keys[i:i + self.chunk_size])
+        logger.debug(f"数据表{table_name} 删除{len(keys)}条数据成功")
+
+    @execute_decorator
+    def query_hashes(self, table_name: str, key_fields: tuple) -> dict:
+        """
+        Query row hash of all rows.
+        :return: {tuple of key values: row_hash}
+        """
+        fields_sql = ', '.join(f"`{field}`" for field in key_fields)
+        self._execute(f"SELECT {fields_sql}, `row_hash` FROM `{table_name}`;")
+        return {
+            tuple(row[field] for field in key_fields): row['row_hash']
+            for row in self.cursor.fetchall()
+        }
+
+    @execute_decorator
+    def query_max_time(self, table_names: list, field: str = 'last_modified_time'):
+        """
+        Query max value of time field of all tables in one statement.
+        """
+        union_sql = ' UNION ALL '.join(f"SELECT MAX(`{field}`) AS t FROM `{name}`" for name in table_names)
+        self._execute(f"SELECT MAX(t) AS max_time FROM ({union_sql}) AS times;")
+        return self.cursor.fetchone()['max_time']
+
     @execute_decorator
     def update(self, table_name: str, new_data: dict, condition: dict):
         # use this sql
@@ -201,7 +389,6 @@ class MySqlHandler(object):
         sql = self.gen_delete_sql(table_name, cond_dict)
         # print(sql)
         self._execute(sql)
-        self.db.commit()
         logger.debug(f"数据表{table_name} 数据删除成功")
 
     @execute_decorator
@@ -225,5 +412,4 @@ class MySqlHandler(object):
     def delete_all(self, table_name: str):
         sql = f"DELETE FROM `{table_name}`"
         self._execute(sql)
-        self.db.commit()
         logger.debug("所有数据删除成功")
@@ -0,0 +1,141 @@
+from time import sleep, time
+from queue import Queue, Empty
+from threading import Lock
+from contextlib import contextmanager
+
+import pymysql
+
+from sync.logger import logger
+
+
+# Errors meaning connection is lost, connection should be dropped instead of reused
+CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+
+class MySqlPool(object):
+    """
+    Thread safe pool of pymysql connections.
+
+    Connections are created on demand up to size. An idle connection is pinged before
+    reused if not used for ping_interval seconds, and replaced if ping failed. Connecting
+    is retried with exponential backoff from retry_interval up to max_retry_interval.
+    """
+
+    def __init__(
+        self,
+        connect_kwargs: dict,
+        size: int = 3,
+        ping_interval: float = 30,
+        retry_count: int = 5,
+        retry_interval: float = 1,
+        max_retry_interval: float = 30
+    ):
+        self.connect_kwargs = connect_kwargs
+        self.size = size
+        self.ping_interval = ping_interval
+        self.retry_count = retry_count
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+
+        self.idle = Queue()     # (connection, last used time)
+        self.lock = Lock()
+        self.created = 0
+        self.closed = False
+
+    def create_connection(self):
+        interval = self.retry_interval
+        for i in range(self.retry_count):
+            try:
+                db = pymysql.connect(**self.connect_kwargs)
+                logger.debug("Mysql连接成功")
+                return db
+            except CONNECTION_ERRORS:
+                if i == self.retry_count - 1:
+                    raise
+                logger.info(f"Mysql连接失败，{interval}秒后重试")
+                sleep(interval)
+                interval = min(interval * 2, self.max_retry_interval)
+
+    def open(self):
+        """
+        Create first connection, so the server is known to be ready before syncing.
+        """
+        self.closed = False
+        db = self.acquire()
+        self.release(db)
+
+    def check_connection(self, db, last_used: float) -> bool:
+        if not db.open:
+            return False
+        if time() - last_used < self.ping_interval:
+            return True
+        try:
+            db.ping(reconnect=True)
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def acquire(self, timeout: float = None):
+        """
+        Get a healthy connection, wait for one released if pool is full.
+        """
+        while True:
+            try:
+                db, last_used = self.idle.get_nowait()
+            except Empty:
+                with self.lock:
+                    can_create = self.created < self.size
+                    if can_create:
+                        self.created += 1
+
+                if can_create:
+                    try:
+                        return self.create_connection()
+                    except:  # noqa
+                        with self.lock:
+                            self.created -= 1
+                        raise
+
+                db, last_used = self.idle.get(timeout=timeout)
+
+            if self.check_connection(db, last_used):
+                return db
+
+            logger.info("Mysql连接已断开，重新连接")
+            self.discard(db)
+
+    def release(self, db, broken: bool = False):
+        if broken or self.closed:
+            self.discard(db)
+        else:
+            self.idle.put((db, time()))
+
+    def discard(self, db):
+        try:
+            db.close()
+        except:  # noqa
+            pass
+
+        with self.lock:
+            self.created -= 1
+
+    @contextmanager
+    def connection(self):
+        db = self.acquire()
+        broken = False
+        try:
+            yield db
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.release(db, broken)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                db, _ = self.idle.get_nowait()
+            except Empty:
+                break
+            self.discard(db)
@@ -37,4 +37,16 @@ mysql_setting = {
     "database": "database_nmae"
 }
 
+# 连接池大小，健康检查间隔，连接失败重试次数和间隔（秒，指数增长）
+pool_setting = {
+    "size": 3,
+    "ping_interval": 30,
+    "retry_count": 5,
+    "retry_interval": 1,
+    "max_retry_interval": 30
+}
+
+# 批量写入数据库时每批的行数
+SYNC_CHUNK_SIZE = 500
+
 logger_level = logging.INFO
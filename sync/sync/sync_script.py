@@ -1,6 +1,8 @@
 # coding: utf-8
 
-from pymysql.cursors import Cursor, DictCursor
+import json
+import hashlib
+import traceback
 from datetime import datetime
 from copy import copy
 from collections import defaultdict
@@ -18,6 +20,19 @@ follow_data = {}
 content_map = {}
 strategy_to_class_name_map = {}
 
+FOLLOW_IDS_TABLE_NAME = 'follow_data_trade_ids'
+FOLLOW_POS_TABLE_NAME = 'follow_data_positions'
+
+# 唯一键字段，差量同步时以此识别数据行
+TABLE_KEY_FIELDS = {
+    FOLLOW_IDS_TABLE_NAME: ('follow_id', 'order_id'),
+    FOLLOW_POS_TABLE_NAME: ('vt_symbol',)
+}
+DEFAULT_KEY_FIELDS = ('strategy_name',)
+
+# 不参与行哈希计算的字段
+HASH_EXCLUDED_FIELDS = ('last_modified_time', 'row_hash')
+
 
 def get_strategy_to_class_name() -> dict:
     """
@@ -79,6 +94,22 @@ def strategy_to_table_name(strategy_name: str, content: Content) -> str:
     return f"{content.value}_{table_name}"
 
 
+def get_key_fields(table_name: str) -> tuple:
+    """
+    数据表的唯一键字段，cta数据表以策略名为键
+    """
+    return TABLE_KEY_FIELDS.get(table_name, DEFAULT_KEY_FIELDS)
+
+
+def get_row_hash(row: dict) -> str:
+    """
+    计算数据行内容的哈希值，修改时间不参与计算
+    """
+    content = {key: value for key, value in row.items() if key not in HASH_EXCLUDED_FIELDS}
+    text = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
 def get_cond_dict(strategy_name: str) -> dict:
     """
     从策略名获取自定义的mysql handler条件过滤字典
@@ -109,6 +140,7 @@ def get_cta_data_fields(extend_field: Optional[dict] = None) -> List[Tuple[str,
             field_dict = copy(cta_data[strategy_name])
             field_dict['strategy_name'] = ''
             field_dict['last_modified_time'] = datetime.now()
+            field_dict['row_hash'] = ''
             if extend_field:
                 field_dict.update(extend_field)
             row = (table_name, field_dict)
@@ -137,6 +169,7 @@ def get_cta_setting_fields(extend_field: Optional[dict] = None) -> List[Tuple[st
             field_dict['strategy_name'] = ''
             field_dict['class_name'] = ''
             field_dict['last_modified_time'] = datetime.now()
+            field_dict['row_hash'] = ''
             if extend_field:
                 field_dict.update(extend_field)
 
@@ -158,9 +191,10 @@ def get_follow_data_fields() -> List[Tuple[str, Dict]]:
     ids_dict = {
         'follow_id': '',
         'order_id': '',
-        'last_modified_time': datetime.now()
+        'last_modified_time': datetime.now(),
+        'row_hash': ''
     }
-    trade_ids = ('follow_data_trade_ids', ids_dict)
+    trade_ids = (FOLLOW_IDS_TABLE_NAME, ids_dict)
 
     pos_dict = {
         "source_long": 0,
@@ -168,9 +202,10 @@ def get_follow_data_fields() -> List[Tuple[str, Dict]]:
         "target_long": 0,
         "target_short": 0,
         "vt_symbol": "",
-        "last_modified_time": datetime.now()
+        "last_modified_time": datetime.now(),
+        "row_hash": ""
     }
-    positions = ("follow_data_positions", pos_dict)
+    positions = (FOLLOW_POS_TABLE_NAME, pos_dict)
     return [trade_ids, positions]
 
 
@@ -182,19 +217,86 @@ def create_table(mysql_handler: MySqlHandler, content: Content) -> None:
     create_func = content_map[content]['create_func']
     fields_list = create_func()
     for (table_name, field_dict) in fields_list:
-        mysql_handler.create_table(table_name, field_dict)
+        mysql_handler.create_table(table_name, field_dict, get_key_fields(table_name))
     logger.info(f"{content.value}：数据表创建成功")
 
 
+def prepare_tables(mysql_handler: MySqlHandler, content: Content) -> None:
+    """
+    创建缺少的数据表。字段与本地数据不一致的表（包括旧版本没有唯一键和行哈希的表）删除后重建，
+    其他表保留，由差量同步更新
+    """
+    create_func = content_map[content]['create_func']
+    fields_list = create_func()
+    for (table_name, field_dict) in fields_list:
+        if mysql_handler.is_table_exists(table_name):
+            columns = mysql_handler.get_columns(table_name)
+            if set(columns) == set(field_dict.keys()):
+                continue
+            logger.info(f"{table_name}：数据表字段已变化，重建数据表")
+            mysql_handler.drop_table(table_name)
+        mysql_handler.create_table(table_name, field_dict, get_key_fields(table_name))
+    logger.info(f"{content.value}：数据表准备完成")
+
+
+def diff_sync_table(mysql_handler: MySqlHandler, table_name: str, rows: List[dict]) -> bool:
+    """
+    按行哈希差量同步一个数据表：只写入新增或变化的行，删除本地已不存在的行
+    查询、写入和删除在同一个事务中，任何一步失败整体回滚，返回是否成功
+    """
+    key_fields = get_key_fields(table_name)
+    for row in rows:
+        row['row_hash'] = get_row_hash(row)
+
+    try:
+        with mysql_handler.transaction():
+            # 事务中的调用失败时抛出异常，不会返回0
+            server_hashes = mysql_handler.query_hashes(table_name, key_fields)
+
+            local_keys = set()
+            changed_rows = []
+            for row in rows:
+                key = tuple(row[field] for field in key_fields)
+                local_keys.add(key)
+                if server_hashes.get(key, None) != row['row_hash']:
+                    changed_rows.append(row)
+
+            deleted_keys = [key for key in server_hashes if key not in local_keys]
+
+            mysql_handler.upsert_many(table_name, changed_rows, key_fields)
+            if deleted_keys:
+                mysql_handler.delete_keys(table_name, key_fields, deleted_keys)
+    except:  # noqa
+        logger.info(f"{table_name}：差量同步失败，已回滚")
+        traceback.print_exc()
+        return False
+
+    logger.info(f"{table_name}：更新{len(changed_rows)}行，删除{len(deleted_keys)}行，未变化{len(rows) - len(changed_rows)}行")
+    return True
+
+
+def diff_sync_content(mysql_handler: MySqlHandler, content: Content, table_rows: Dict[str, List[dict]]) -> bool:
+    """
+    差量同步一类数据的所有表，本地已没有数据的表删除
+    任何一个表同步失败即中止，返回是否全部成功
+    """
+    for table_name in get_table_list(mysql_handler, content):
+        if table_name not in table_rows:
+            mysql_handler.drop_table(table_name)
+            logger.info(f"{table_name}：本地已无数据，数据表删除")
+
+    for table_name, rows in table_rows.items():
+        if not diff_sync_table(mysql_handler, table_name, rows):
+            logger.info(f"{content.value}：{table_name}同步失败，中止同步")
+            return False
+    return True
+
+
 def get_table_list(mysql_handler: MySqlHandler, content: Content) -> List:
     """
     通过前缀名，从数据库获取对应的数据表名称列表
     """
-    mysql_handler.set_cursor_type(Cursor)
-    tables = mysql_handler.get_tables(content.value, False)
-    tables = [item[0] for item in tables]
-    mysql_handler.set_cursor_type(DictCursor)
-    return tables
+    return mysql_handler.get_table_names(content.value, False)
 
 
 def get_local_modified_time(content: Content) -> datetime:
@@ -204,12 +306,12 @@ def get_local_modified_time(content: Content) -> datetime:
 
 
 def get_server_modified_time(mysql_handler: MySqlHandler, content: Content) -> datetime:
-    """获取数据库数据最新修改时间"""
+    """获取数据库数据最新修改时间，差量同步只更新变化的行，所以取所有表的最大值"""
     tables = get_table_list(mysql_handler, content)
-    table_name = tables[0]
-
-    server_record = mysql_handler.query_all(table_name, order_field='last_modified_time', order_by='DESC')
-    server_time = server_record[0]['last_modified_time']
+    server_time = mysql_handler.query_max_time(tables)
+    # 表中没有数据
+    if not server_time:
+        server_time = datetime.min
     return server_time
 
 
@@ -231,11 +333,12 @@ def is_remote_exist(mysql_handler: MySqlHandler, content: Content) -> bool:
     return mysql_handler.is_table_exists(content.value, precise=False)
 
 
-def cta_setting_to_server(mysql_handler: MySqlHandler) -> None:
+def cta_setting_to_server(mysql_handler: MySqlHandler) -> bool:
     """
     推送本地cta配置到数据库
     """
     modified_time = get_file_modified_time(CTA_SETTING_FILENAME)
+    table_rows = defaultdict(list)
     for strategy_name, settings in cta_settings.items():
         row = dict()
         row['strategy_name'] = strategy_name
@@ -245,13 +348,14 @@ def cta_setting_to_server(mysql_handler: MySqlHandler) -> None:
         row.update(settings['setting'])
 
         table_name = strategy_to_table_name(strategy_name, Content.CTA_SETTING)
-        # print(table_name)
+        table_rows[table_name].append(row)
+
+    if diff_sync_content(mysql_handler, Content.CTA_SETTING, table_rows):
+        logger.info(f"{len(cta_settings)}个策略：配置同步到远程成功")
+        return True
 
-        # delete first.
-        mysql_handler.delete(table_name, get_cond_dict(strategy_name))
-        # insert
-        mysql_handler.insert(table_name, row)
-        logger.info(f"策略{strategy_name}：配置同步到远程成功")
+    logger.info(f"{len(cta_settings)}个策略：配置同步到远程失败")
+    return False
 
 
 def cta_setting_from_server(mysql_handler: MySqlHandler) -> dict:
@@ -270,18 +374,19 @@ def cta_setting_from_server(mysql_handler: MySqlHandler) -> dict:
             temp['class_name'] = row_dict['class_name']
             temp['vt_symbol'] = row_dict['vt_symbol']
 
-            for key in ['vt_symbol', 'strategy_name', 'last_modified_time']:
-                row_dict.pop(key)
+            for key in ['vt_symbol', 'strategy_name', 'last_modified_time', 'row_hash']:
+                row_dict.pop(key, None)
             temp['setting'] = row_dict
     # print(server_settings)
     return server_settings
 
 
-def cta_data_to_server(mysql_handler: MySqlHandler) -> None:
+def cta_data_to_server(mysql_handler: MySqlHandler) -> bool:
     """
     推送本地cta数据到数据库
     """
     modified_time = get_file_modified_time(CTA_DATA_FILENAME)
+    table_rows = defaultdict(list)
     for strategy_name, data in cta_data.items():
         row = dict()
         row['strategy_name'] = strategy_name
@@ -289,12 +394,14 @@ def cta_data_to_server(mysql_handler: MySqlHandler) -> None:
         row.update(data)
 
         table_name = strategy_to_table_name(strategy_name, Content.CTA_DATA)
+        table_rows[table_name].append(row)
+
+    if diff_sync_content(mysql_handler, Content.CTA_DATA, table_rows):
+        logger.info(f"{len(cta_data)}个策略：数据同步到远程成功")
+        return True
 
-        # delete first.
-        mysql_handler.delete(table_name, get_cond_dict(strategy_name))
-        # insert
-        mysql_handler.insert(table_name, row)
-        logger.info(f"策略{strategy_name}：数据同步到远程成功")
+    logger.info(f"{len(cta_data)}个策略：数据同步到远程失败")
+    return False
 
 
 def cta_data_from_server(mysql_handler: MySqlHandler) -> dict:
@@ -309,8 +416,8 @@ def cta_data_from_server(mysql_handler: MySqlHandler) -> dict:
         for row_dict in table_res:
             strategy_name = row_dict['strategy_name']
             server_data[strategy_name] = dict()
-            for key in ['strategy_name', 'last_modified_time']:
-                row_dict.pop(key)
+            for key in ['strategy_name', 'last_modified_time', 'row_hash']:
+                row_dict.pop(key, None)
             server_data[strategy_name].update(row_dict)
 
     # print(server_data)
@@ -324,9 +431,9 @@ def follow_data_from_server(mysql_handler: MySqlHandler) -> dict:
     server_data = dict()
 
     # sync ids
-    ids_list = mysql_handler.query_all('follow_data_trade_ids')
+    ids_list = mysql_handler.query_all(FOLLOW_IDS_TABLE_NAME)
     # print(ids_list)
-    if ids_list[0]['follow_id'] == 'empty':
+    if not ids_list or ids_list[0]['follow_id'] == 'empty':
         ids_dict = dict()
     else:
         ids_dict = defaultdict(list)
@@ -337,9 +444,9 @@ def follow_data_from_server(mysql_handler: MySqlHandler) -> dict:
     # print(ids_dict)
 
     # sync pos
-    pos_list = mysql_handler.query_all('follow_data_positions')
+    pos_list = mysql_handler.query_all(FOLLOW_POS_TABLE_NAME)
     # print(pos_list)
-    if pos_list[0]['vt_symbol'] == 'empty':
+    if not pos_list or pos_list[0]['vt_symbol'] == 'empty':
         pos_dict = dict()
     else:
         pos_dict = dict()
@@ -347,8 +454,8 @@ def follow_data_from_server(mysql_handler: MySqlHandler) -> dict:
             vt_symbol = row_dict['vt_symbol']
             pos_dict[vt_symbol] = dict()
 
-            for key in ['vt_symbol', 'last_modified_time']:
-                row_dict.pop(key)
+            for key in ['vt_symbol', 'last_modified_time', 'row_hash']:
+                row_dict.pop(key, None)
             pos_dict[vt_symbol].update(row_dict)
     # print(pos_dict)
 
@@ -358,15 +465,14 @@ def follow_data_from_server(mysql_handler: MySqlHandler) -> dict:
     return server_data
 
 
-def follow_data_to_server(mysql_handler: MySqlHandler) -> None:
+def follow_data_to_server(mysql_handler: MySqlHandler) -> bool:
     """
     推送跟随数据到数据库
     """
     modified_time = get_file_modified_time(FOLLOW_DATA_FILENAME)
 
     # sync trade ids
-    id_table_name = 'follow_data_trade_ids'
-    mysql_handler.delete_all(id_table_name)
+    id_rows = []
     trade_ids = follow_data['tradeid_orderids_dict']
 
     if not trade_ids:
@@ -374,20 +480,18 @@ def follow_data_to_server(mysql_handler: MySqlHandler) -> None:
         row['follow_id'] = 'empty'
         row['order_id'] = 'empty'
         row['last_modified_time'] = modified_time
-        mysql_handler.insert(id_table_name, row)
+        id_rows.append(row)
     else:
         for trade_id, order_list in trade_ids.items():
-            row = dict()
-            row['follow_id'] = trade_id
-            row['last_modified_time'] = modified_time
             for order in order_list:
+                row = dict()
+                row['follow_id'] = trade_id
                 row['order_id'] = order
-                mysql_handler.insert(id_table_name, row)
-    logger.info(f"跟随单ID：数据同步到远程成功")
+                row['last_modified_time'] = modified_time
+                id_rows.append(row)
 
     # sync positions
-    pos_table_name = 'follow_data_positions'
-    mysql_handler.delete_all(pos_table_name)
+    pos_rows = []
     positions = follow_data['positions']
     if not positions:
         row = dict()
@@ -397,17 +501,26 @@ def follow_data_to_server(mysql_handler: MySqlHandler) -> None:
         row['target_short'] = 0
         row['vt_symbol'] = 'empty'
         row['last_modified_time'] = modified_time
-        mysql_handler.insert(pos_table_name, row)
+        pos_rows.append(row)
     else:
         for vt_symbol, pos_dict in positions.items():
             row = dict()
             row['vt_symbol'] = vt_symbol
             row['last_modified_time'] = modified_time
-            row.update(pos_dict)
+            for key in ['source_long', 'source_short', 'target_long', 'target_short']:
+                row[key] = pos_dict.get(key, 0)
+            pos_rows.append(row)
 
-            # insert
-            mysql_handler.insert(pos_table_name, row)
-    logger.info(f"跟随单仓位：数据同步到远程成功")
+    table_rows = {
+        FOLLOW_IDS_TABLE_NAME: id_rows,
+        FOLLOW_POS_TABLE_NAME: pos_rows
+    }
+    if diff_sync_content(mysql_handler, Content.FOLLOW_DATA, table_rows):
+        logger.info(f"跟随数据：同步到远程成功")
+        return True
+
+    logger.info(f"跟随数据：同步到远程失败")
+    return False
 
 
 def clear_server_data(mysql_handler: MySqlHandler, content: Content):
@@ -451,12 +564,12 @@ def sync(mysql_handler: MySqlHandler, content: Content) -> None:
             logger.info("远程数据已存在")
             if local_time > server_time:
                 logger.info("本地数据是最新的")
-                # 删除数据库上所有数据和表格
-                clear_server_data(mysql_handler, content)
-                create_table(mysql_handler, content)
-                # 重新建立表格和数据
-                sync_to_server_func(mysql_handler)
-                logger.info("上传数据成功")
+                # 只上传变化的数据行
+                prepare_tables(mysql_handler, content)
+                if sync_to_server_func(mysql_handler):
+                    logger.info("上传数据成功")
+                else:
+                    logger.info("上传数据失败")
             elif server_time > local_time:
                 logger.info("本地数据不是最新的")
                 data = sync_from_server_func(mysql_handler)
@@ -466,9 +579,11 @@ def sync(mysql_handler: MySqlHandler, content: Content) -> None:
                 logger.info("本地数据与数据库时间戳一致，无需同步")
         else:
             logger.info("远程数据不存在")
-            create_table(mysql_handler, content)
-            sync_to_server_func(mysql_handler)
-            logger.info("上传数据成功")
+            prepare_tables(mysql_handler, content)
+            if sync_to_server_func(mysql_handler):
+                logger.info("上传数据成功")
+            else:
+                logger.info("上传数据失败")
     else:
         logger.info("本地数据不存在")
         if remote_exist:
@@ -1,5 +1,4 @@
 import unittest
-from time import sleep
 from sync.utility import *
 from sync.mysql_handler import MySqlHandler
 from sync.setting import (mysql_setting, CTA_SETTING_FILENAME, CTA_DATA_FILENAME, Content, MYSQL_SETTING_FILENAME)
@@ -21,10 +20,6 @@ init()
 mysql = MySqlHandler()
 mysql.connect(**mysql_setting)
 
-print("数据库连接等待时间...")
-sleep(3)
-print("数据库连接等待结束")
-
 
 class TestUtility(unittest.TestCase):
     def setUp(self) -> None:
@@ -0,0 +1,203 @@
+"""
+Tests not requiring database server, run in the folder of sync:
+
+python -m unittest test_offline
+"""
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pymysql
+
+from sync.setting import Content
+from sync.mysql_handler import MySqlHandler
+from sync.mysql_pool import MySqlPool
+from sync import sync_script
+from sync.sync_script import get_row_hash, sync
+
+
+class TestSql(unittest.TestCase):
+    def test_gen_upsert_sql(self):
+        record = {'follow_id': 'CTP.1', 'order_id': 'RPC.1', 'last_modified_time': None}
+        sql = MySqlHandler.gen_upsert_sql('follow_data_trade_ids', record, ('follow_id', 'order_id'))
+        self.assertEqual(
+            sql,
+            "INSERT INTO `follow_data_trade_ids` (`follow_id`, `order_id`, `last_modified_time`) "
+            "VALUES (%(follow_id)s, %(order_id)s, %(last_modified_time)s) "
+            "ON DUPLICATE KEY UPDATE `last_modified_time` = VALUES(`last_modified_time`);"
+        )
+
+    def test_gen_upsert_sql_key_only(self):
+        # Row of key fields only is still valid sql
+        sql = MySqlHandler.gen_upsert_sql('t', {'a': 1, 'b': 2}, ('a', 'b'))
+        self.assertTrue(sql.endswith("ON DUPLICATE KEY UPDATE `a` = VALUES(`a`);"))
+
+    def test_group_records(self):
+        records = [{'a': i, 'b': i} for i in range(5)] + [{'a': 0}] + [{'a': i, 'b': i} for i in range(5, 7)]
+        chunks = list(MySqlHandler.group_records(records, 3))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1, 1])
+        for chunk in chunks:
+            self.assertEqual(len({tuple(record.keys()) for record in chunk}), 1)
+
+        # Order of records with same fields is kept
+        self.assertEqual([record['a'] for chunk in chunks[:3] for record in chunk], [0, 1, 2, 3, 4, 5, 6])
+        self.assertEqual(chunks[3], [{'a': 0}])
+
+
+class TestRowHash(unittest.TestCase):
+    def test_modified_time_ignored(self):
+        row = {'strategy_name': 'a', 'pos': 1, 'last_modified_time': datetime(2020, 6, 1)}
+        other = dict(row, last_modified_time=datetime(2020, 6, 2))
+        self.assertEqual(get_row_hash(row), get_row_hash(other))
+
+    def test_content_changed(self):
+        row = {'strategy_name': 'a', 'pos': 1}
+        self.assertNotEqual(get_row_hash(row), get_row_hash(dict(row, pos=2)))
+
+        # Order of fields doesn't matter
+        self.assertEqual(get_row_hash({'pos': 1, 'strategy_name': 'a'}), get_row_hash(row))
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.open = True
+        self.ping_error = False
+
+    def ping(self, reconnect: bool = True):
+        if self.ping_error:
+            raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def close(self):
+        self.open = False
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.connections = []
+        self.errors = 0
+        patcher = mock.patch("sync.mysql_pool.pymysql.connect", side_effect=self.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pool = MySqlPool({}, size=2, ping_interval=30, retry_count=3, retry_interval=0)
+
+    def connect(self, **kwargs):
+        if self.errors:
+            self.errors -= 1
+            raise pymysql.err.OperationalError(2003, "Can't connect to MySQL server")
+
+        db = FakeConnection()
+        self.connections.append(db)
+        return db
+
+    def test_reuse(self):
+        db = self.pool.acquire()
+        self.pool.release(db)
+        self.assertIs(self.pool.acquire(), db)
+        self.assertEqual(self.pool.created, 1)
+        self.assertEqual(len(self.connections), 1)
+
+    def test_size(self):
+        db1 = self.pool.acquire()
+        db2 = self.pool.acquire()
+        self.assertEqual(self.pool.created, 2)
+
+        # Pool is full, wait for released one
+        self.assertRaises(Exception, self.pool.acquire, 0.01)
+        self.assertEqual(self.pool.created, 2)
+
+        self.pool.release(db2)
+        self.assertIs(self.pool.acquire(), db2)
+        self.pool.release(db1)
+
+    def test_discard_broken(self):
+        with self.assertRaises(pymysql.err.OperationalError):
+            with self.pool.connection():
+                raise pymysql.err.OperationalError(2013, "Lost connection")
+
+        self.assertEqual(self.pool.created, 0)
+        self.assertFalse(self.connections[0].open)
+
+        # Closed connection in idle queue is replaced
+        db = self.pool.acquire()
+        db.close()
+        self.pool.release(db)
+        self.assertIsNot(self.pool.acquire(), db)
+        self.assertEqual(self.pool.created, 1)
+
+    def test_ping_failed(self):
+        db = self.pool.acquire()
+        db.ping_error = True
+        self.pool.idle.put((db, 0))
+
+        self.assertIsNot(self.pool.acquire(), db)
+        self.assertEqual(self.pool.created, 1)
+        self.assertEqual(len(self.connections), 2)
+
+    def test_retry(self):
+        self.errors = 2
+        self.pool.acquire()
+        self.assertEqual(self.pool.created, 1)
+
+        self.errors = 3
+        self.assertRaises(pymysql.err.OperationalError, self.pool.acquire)
+        self.assertEqual(self.pool.created, 1)
+
+    def test_close(self):
+        db1 = self.pool.acquire()
+        db2 = self.pool.acquire()
+        self.pool.release(db1)
+        self.pool.close()
+        self.assertEqual(self.pool.created, 1)
+
+        # Connection released after closed is discarded
+        self.pool.release(db2)
+        self.assertEqual(self.pool.created, 0)
+        self.assertFalse(db1.open or db2.open)
+
+
+class TestSync(unittest.TestCase):
+    def run_sync(self, uploaded: bool):
+        funcs = {
+            'filename': 'follow_trading_data.json',
+            'to_server_func': mock.Mock(return_value=uploaded),
+            'from_server_func': mock.Mock()
+        }
+        now = datetime.now()
+        with mock.patch.dict(sync_script.content_map, {Content.FOLLOW_DATA: funcs}), \
+                mock.patch.object(sync_script, 'is_local_exist', return_value=True), \
+                mock.patch.object(sync_script, 'is_remote_exist', return_value=True), \
+                mock.patch.object(sync_script, 'get_local_modified_time', return_value=now), \
+                mock.patch.object(sync_script, 'get_server_modified_time', return_value=now - timedelta(1)), \
+                mock.patch.object(sync_script, 'prepare_tables'), \
+                self.assertLogs('sync_logger', level='INFO') as logs:
+            sync(mock.Mock(), Content.FOLLOW_DATA)
+
+        funcs['to_server_func'].assert_called_once()
+        return [record.getMessage() for record in logs.records]
+
+    def test_upload_success(self):
+        messages = self.run_sync(True)
+        self.assertIn("上传数据成功", messages)
+
+    def test_upload_failed(self):
+        messages = self.run_sync(False)
+        self.assertIn("上传数据失败", messages)
+        self.assertNotIn("上传数据成功", messages)
+
+    def test_to_server_result(self):
+        with mock.patch.dict(sync_script.cta_data, {'a': {'pos': 1}}), \
+                mock.patch.dict(sync_script.strategy_to_class_name_map, {'a': 'atr_rsi_strategy'}), \
+                mock.patch.object(sync_script, 'get_file_modified_time', return_value=datetime.now()):
+            with mock.patch.object(sync_script, 'diff_sync_content', return_value=False):
+                self.assertFalse(sync_script.cta_data_to_server(mock.Mock()))
+            with mock.patch.object(sync_script, 'diff_sync_content', return_value=True) as diff_sync_content:
+                self.assertTrue(sync_script.cta_data_to_server(mock.Mock()))
+
+        table_rows = diff_sync_content.call_args[0][2]
+        self.assertEqual([row['pos'] for rows in table_rows.values() for row in rows], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()